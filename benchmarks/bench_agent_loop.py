@@ -0,0 +1,218 @@
+"""
+Benchmark the agent loop itself.
+
+Drives `Agent.invoke` through scripted multi-step episodes with a fake desktop (canned desktop states),
+no-op tools behind the real registry and a deterministic fake chat model. The time spent in the model is
+subtracted, so what is left is the framework overhead per step: prompt building, parsing, registry
+dispatch and message bookkeeping.
+
+Results can be saved as a JSON baseline and later runs checked against it, so regressions in the loop
+show up separately from LLM and UI Automation latency.
+
+Usage:
+    python benchmarks/bench_agent_loop.py [--elements 300] [--steps 10] [--repeat 20] [--latency 0]
+    python benchmarks/bench_agent_loop.py --save benchmarks/baselines/agent_loop.json
+    python benchmarks/bench_agent_loop.py --check benchmarks/baselines/agent_loop.json [--tolerance 0.25]
+"""
+from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.service import Agent, logger
+from darbot_windows_agent.agent.registry.service import Registry
+from darbot_windows_agent.agent.tools.views import Click, Type
+from darbot_windows_agent.agent.tools.service import done_tool
+from darbot_windows_agent.agent import service
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.desktop import Desktop
+from darbot_windows_agent.tracing import Tracer
+from langchain.tools import tool
+from contextlib import contextmanager
+from time import perf_counter
+from pathlib import Path
+import statistics
+import platform
+import argparse
+import logging
+import json
+import sys
+
+@tool('Click Tool', args_schema=Click)
+def click_tool(loc: tuple[int, int], button: str = 'left', clicks: int = 1, desktop: Desktop = None) -> str:
+    'Click on UI elements at specific coordinates.'
+    return f'Single {button} Clicked on Button Element with ControlType Button at {loc}.'
+
+@tool('Type Tool', args_schema=Type)
+def type_tool(loc: tuple[int, int], text: str, clear: str = 'false', caret_position: str = 'idle', press_enter: str = 'false', desktop: Desktop = None) -> str:
+    'Type text into input fields.'
+    return f'Typed {text} on Edit Element with ControlType Edit at {loc}.'
+
+class FakeDesktop:
+    '''A desktop that cycles through canned states and never touches the screen.'''
+    def __init__(self, states: list[DesktopState]):
+        self.states = states
+        self.calls = 0
+        self.desktop_state = None
+        self.recorder = None
+        self.tracer = Tracer(enabled=False)
+
+    def get_state(self, use_vision: bool = False) -> DesktopState:
+        self.desktop_state = self.states[self.calls % len(self.states)]
+        self.calls += 1
+        return self.desktop_state
+
+    def get_foreground_window(self) -> tuple[int, str]:
+        return (1, 'Benchmark')
+
+    def start_recorder(self):
+        pass
+
+    def stop_recorder(self):
+        pass
+
+class FakeWatchCursor:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+def make_desktop_state(elements: int, variant: int) -> DesktopState:
+    box = BoundingBox(left=10, top=10, right=110, bottom=40, width=100, height=30)
+    tree_state = TreeState(
+        interactive_nodes=[TreeElementNode(f'Button {i}', 'Button', "''", box, Center(60 + variant, 25), 'Benchmark') for i in range(elements)],
+        informative_nodes=[TextElementNode(f'Some informative text number {i} in state {variant}', 'Benchmark') for i in range(elements)],
+        scrollable_nodes=[ScrollElementNode(f'Pane {i}', 'Pane', 'Benchmark', box, Center(60, 25), False, True) for i in range(elements // 10)],
+    )
+    apps = [App(name=f'App {i}', depth=i, status='Normal', size=Size(800, 600), handle=i) for i in range(5)]
+    return DesktopState(apps=apps[1:], active_app=apps[0], screenshot=None, tree_state=tree_state)
+
+def action_response(step: int, actions: int) -> str:
+    pairs = []
+    for index in range(actions):
+        if (step + index) % 2:
+            pairs.append(f"<action_name>Type Tool</action_name><action_input>{{'loc': [60, 25], 'text': 'step {step}'}}</action_input>")
+        else:
+            pairs.append("<action_name>Click Tool</action_name><action_input>{'loc': [60, 25]}</action_input>")
+    return f"<evaluate>Success</evaluate><memory>Finished step {step}.</memory><thought>Continue with step {step + 1}.</thought>{''.join(pairs)}"
+
+def done_response() -> str:
+    return "<evaluate>Success</evaluate><memory>All steps finished.</memory><thought>The task is complete.</thought><action_name>Done Tool</action_name><action_input>{'answer': 'Done.'}</action_input>"
+
+EPISODES = {
+    'single_action': {'actions': 1, 'agent': {}},
+    'batched_actions': {'actions': 3, 'agent': {'max_actions': 3}},
+    'stable_layout': {'actions': 1, 'agent': {'message_layout': 'stable'}},
+}
+
+class Timings:
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+
+    def wrap(self, name: str, function):
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[name] = self.seconds.get(name, 0.0) + perf_counter() - started
+        return timed
+
+@contextmanager
+def instrument(agent: Agent, timings: Timings):
+    # Wraps the stages of the loop in place, the originals are restored afterwards
+    originals = {name: getattr(Prompt, name) for name in ('observation_prompt', 'action_prompt', 'system_prompt')}
+    extract_agent_data = service.extract_agent_data
+    for name, function in originals.items():
+        setattr(Prompt, name, staticmethod(timings.wrap('prompt', function)))
+    service.extract_agent_data = timings.wrap('parse', extract_agent_data)
+    agent.registry.execute = timings.wrap('dispatch', agent.registry.execute)
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(Prompt, name, staticmethod(function))
+        service.extract_agent_data = extract_agent_data
+
+def run_episode(name: str, steps: int, elements: int, latency: float) -> dict:
+    episode = EPISODES[name]
+    llm = ScriptedChatModel(responses=[action_response(step, episode['actions']) for step in range(steps)] + [done_response()], latency=latency)
+    agent = Agent(llm=llm, max_steps=steps + 5, **episode['agent'])
+    agent.desktop = FakeDesktop([make_desktop_state(elements, variant) for variant in range(3)])
+    agent.registry = Registry([click_tool, type_tool, done_tool])
+    agent.watch_cursor = FakeWatchCursor()
+    timings = Timings()
+    with instrument(agent, timings):
+        started = perf_counter()
+        result = agent.invoke(f'Run the {name} episode')
+        wall = perf_counter() - started
+    if not result.is_done:
+        raise RuntimeError(f'Episode {name} did not finish: {result.error}')
+    llm_steps = llm.calls
+    overhead = wall - llm.elapsed
+    measured = sum(timings.seconds.values())
+    stages = {stage: timings.seconds.get(stage, 0.0) for stage in ('prompt', 'parse', 'dispatch')}
+    stages['bookkeeping'] = max(overhead - measured, 0.0)
+    return {'llm_steps': llm_steps, 'overhead': overhead / llm_steps, 'stages': {stage: seconds / llm_steps for stage, seconds in stages.items()}}
+
+def bench(name: str, steps: int, elements: int, latency: float, repeat: int) -> dict:
+    runs = [run_episode(name, steps, elements, latency) for _ in range(repeat)]
+    return {
+        'llm_steps': runs[0]['llm_steps'],
+        'overhead_ms_per_step': round(statistics.median(run['overhead'] for run in runs) * 1000, 3),
+        'stages_ms_per_step': {stage: round(statistics.median(run['stages'][stage] for run in runs) * 1000, 3) for stage in runs[0]['stages']},
+    }
+
+def check(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results['episodes'].items():
+        expected = baseline['episodes'].get(name)
+        if expected is None:
+            continue
+        limit = expected['overhead_ms_per_step'] * (1 + tolerance)
+        if result['overhead_ms_per_step'] > limit:
+            regressions.append(f"{name}: {result['overhead_ms_per_step']:.3f}ms per step, baseline {expected['overhead_ms_per_step']:.3f}ms (+{tolerance:.0%} allowed)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the agent loop overhead per step')
+    parser.add_argument('--elements', type=int, default=300)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the fake model takes per response, excluded from the overhead')
+    parser.add_argument('--episodes', nargs='+', choices=list(EPISODES), default=list(EPISODES))
+    parser.add_argument('--save', type=Path, help='Write the results as a JSON baseline')
+    parser.add_argument('--check', type=Path, help='Compare against a JSON baseline, exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown against the baseline')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    results = {
+        'config': {'elements': args.elements, 'steps': args.steps, 'repeat': args.repeat, 'latency': args.latency},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine()},
+        'episodes': {name: bench(name, args.steps, args.elements, args.latency, args.repeat) for name in args.episodes},
+    }
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'Agent loop overhead with {args.elements} elements over {args.steps} steps (median of {args.repeat} runs, model time excluded)')
+        print(f"{'episode':>16} {'overhead':>10} {'prompt':>9} {'parse':>9} {'dispatch':>9} {'bookkeeping':>12}")
+        for name, result in results['episodes'].items():
+            stages = result['stages_ms_per_step']
+            print(f"{name:>16} {result['overhead_ms_per_step']:>8.3f}ms {stages['prompt']:>7.3f}ms {stages['parse']:>7.3f}ms {stages['dispatch']:>7.3f}ms {stages['bookkeeping']:>10.3f}ms")
+    if args.check:
+        baseline = json.loads(args.check.read_text(encoding='utf-8'))
+        if baseline['config'] != results['config']:
+            print(f"Baseline was recorded with {baseline['config']}, the comparison may not be meaningful.")
+        regressions = check(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline.')
+
+if __name__ == '__main__':
+    main()
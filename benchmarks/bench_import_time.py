@@ -0,0 +1,89 @@
+"""
+Benchmark the cold import of the agent.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, reports the cumulative import time of
+the module (best of the runs) and the heaviest imports, and fails if the time exceeds a budget (2500ms unless
+`--budget-ms` says otherwise) or if any provider SDK is imported on the way, since providers are only meant to
+load when a model of theirs is created.
+
+Usage:
+    python benchmarks/bench_import_time.py [--module darbot_windows_agent.agent] [--repeat 5] [--top 15]
+    python benchmarks/bench_import_time.py --budget-ms 1500
+"""
+from dataclasses import dataclass
+import subprocess
+import argparse
+import json
+import sys
+
+# Provider SDKs are resolved lazily by darbot_windows_agent.github.providers
+FORBIDDEN = ('langchain_openai', 'langchain_google_genai', 'langchain_groq', 'langchain_ollama', 'openai', 'groq', 'ollama', 'google.ai.generativelanguage')
+# Leaves headroom over the ~1.5s cold import of darbot_windows_agent.agent, so only a real regression trips it
+DEFAULT_BUDGET_MS = 2500.0
+
+@dataclass
+class ImportTime:
+    name: str
+    self_us: int
+    cumulative_us: int
+
+def parse_importtime(stderr: str) -> list[ImportTime]:
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix('import time:').split('|')
+        imports.append(ImportTime(name=name.strip(), self_us=int(self_us), cumulative_us=int(cumulative_us)))
+    return imports
+
+def measure(module: str) -> list[ImportTime]:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+    return parse_importtime(result.stderr)
+
+def forbidden_imports(imports: list[ImportTime]) -> list[str]:
+    names = {item.name for item in imports}
+    return [name for name in FORBIDDEN if any(imported == name or imported.startswith(f'{name}.') for imported in names)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold import time of the agent')
+    parser.add_argument('--module', default='darbot_windows_agent.agent')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Number of heaviest imports to list')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='Fail if the best cumulative import time exceeds this many milliseconds')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda imports: max(item.cumulative_us for item in imports))
+    total_ms = max(item.cumulative_us for item in best) / 1000
+    heaviest = sorted(best, key=lambda item: item.self_us, reverse=True)[:args.top]
+    forbidden = forbidden_imports(best)
+    results = {
+        'module': args.module,
+        'total_ms': round(total_ms, 1),
+        'budget_ms': args.budget_ms,
+        'modules': len(best),
+        'heaviest': [{'name': item.name, 'self_ms': round(item.self_us / 1000, 1), 'cumulative_ms': round(item.cumulative_us / 1000, 1)} for item in heaviest],
+        'forbidden': forbidden,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'import {args.module}: {total_ms:.1f}ms for {len(best)} modules (best of {args.repeat} runs)')
+        print(f"{'self':>10} {'cumulative':>12}  module")
+        for item in heaviest:
+            print(f'{item.self_us / 1000:>8.1f}ms {item.cumulative_us / 1000:>10.1f}ms  {item.name}')
+    failed = False
+    if forbidden:
+        print(f"Provider SDKs imported eagerly: {', '.join(forbidden)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f'Import time {total_ms:.1f}ms exceeds the budget of {args.budget_ms:.1f}ms')
+        failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
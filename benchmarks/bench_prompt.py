@@ -0,0 +1,80 @@
+"""
+Benchmark per-step prompt building.
+
+Times the system prompt (cold and cached) and the observation prompt for a synthetic desktop state,
+against the previous approach of loading a PromptTemplate from disk and joining every section.
+
+Usage:
+    python benchmarks/bench_prompt.py [--elements 300] [--repeat 200]
+"""
+from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.agent.views import AgentStep
+from langchain.prompts import PromptTemplate
+from importlib.resources import files
+from time import perf_counter
+import statistics
+import argparse
+
+def make_desktop_state(elements: int) -> DesktopState:
+    box = BoundingBox(left=10, top=10, right=110, bottom=40, width=100, height=30)
+    tree_state = TreeState(
+        interactive_nodes=[TreeElementNode(f'Button {i}', 'Button', "''", box, Center(60, 25), 'Benchmark') for i in range(elements)],
+        informative_nodes=[TextElementNode(f'Some informative text number {i}', 'Benchmark') for i in range(elements)],
+        scrollable_nodes=[ScrollElementNode(f'Pane {i}', 'Pane', 'Benchmark', box, Center(60, 25), False, True) for i in range(elements // 10)],
+    )
+    apps = [App(name=f'App {i}', depth=i, status='Normal', size=Size(800, 600), handle=i) for i in range(5)]
+    return DesktopState(apps=apps[1:], active_app=apps[0], screenshot=None, tree_state=tree_state)
+
+def legacy_observation_prompt(query: str, agent_step: AgentStep, tool_result: ToolResult, desktop_state: DesktopState) -> str:
+    tree_state = desktop_state.tree_state
+    template = PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath('observation.md'))
+    return template.format(**{
+        'steps': agent_step.step_number,
+        'max_steps': agent_step.max_steps,
+        'observation': tool_result.content,
+        'active_app': desktop_state.active_app_to_string(),
+        'cursor_location': '(0,0)',
+        'apps': desktop_state.apps_to_string(),
+        'interactive_elements': tree_state.interactive_elements_to_string() or 'No interactive elements found',
+        'informative_elements': tree_state.informative_elements_to_string() or 'No informative elements found',
+        'scrollable_elements': tree_state.scrollable_elements_to_string() or 'No scrollable elements found',
+        'query': query
+    })
+
+def bench(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-step prompt building')
+    parser.add_argument('--elements', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    desktop_state = make_desktop_state(args.elements)
+    agent_step = AgentStep(step_number=10, max_steps=100)
+    tool_result = ToolResult(is_success=True, content='Clicked Button 1')
+
+    def cold_system_prompt():
+        Prompt.cached_system_prompt.cache_clear()
+        Prompt.system_prompt('edge', 'tools', 100, ['instruction'])
+
+    results = {
+        'system prompt (cold)': bench(cold_system_prompt, args.repeat),
+        'system prompt (cached)': bench(lambda: Prompt.system_prompt('edge', 'tools', 100, ['instruction']), args.repeat),
+        'observation prompt (legacy)': bench(lambda: legacy_observation_prompt('query', agent_step, tool_result, desktop_state), args.repeat),
+        'observation prompt': bench(lambda: Prompt.observation_prompt('query', agent_step, tool_result, desktop_state), args.repeat),
+    }
+    print(f'Prompt build time with {args.elements} elements (median of {args.repeat} runs)')
+    for name, ms in results.items():
+        print(f'{name:>30}: {ms:8.3f}ms')
+
+if __name__ == '__main__':
+    main()
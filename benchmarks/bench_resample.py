@@ -0,0 +1,55 @@
+"""
+Benchmark the screenshot resampling tiers.
+
+Times `resample_image` for every tier against a synthetic 4K frame at several scale factors.
+
+Usage:
+    python benchmarks/bench_resample.py [--width 3840] [--height 2160] [--repeat 10] [--json]
+"""
+from darbot_windows_agent.desktop.utils import resample_image
+from time import perf_counter
+from PIL import Image
+import statistics
+import argparse
+import random
+import json
+
+TIERS = ['fast', 'balanced', 'best']
+SCALES = [0.25, 0.5, 0.7, 1/3]
+
+def make_image(width: int, height: int) -> Image.Image:
+    # Random noise is the worst case for the filters, a flat image would be too kind
+    return Image.frombytes('RGB', (width, height), random.randbytes(width * height * 3))
+
+def bench(image: Image.Image, scale: float, tier: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        resample_image(image, scale=scale, tier=tier)
+        timings.append(perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark screenshot resampling tiers')
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    image = make_image(args.width, args.height)
+    results = [
+        {'scale': round(scale, 3), 'tier': tier, 'median_ms': round(bench(image, scale, tier, args.repeat), 2)}
+        for scale in SCALES for tier in TIERS
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Resampling a {args.width}x{args.height} frame (median of {args.repeat} runs)")
+    print(f"{'scale':>8} " + ' '.join(f'{tier:>10}' for tier in TIERS))
+    for scale in SCALES:
+        row = [result['median_ms'] for result in results if result['scale'] == round(scale, 3)]
+        print(f'{scale:>8.3f} ' + ' '.join(f'{ms:>8.2f}ms' for ms in row))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+from darbot_windows_agent.agent.checkpoint.views import Checkpoint
+from darbot_windows_agent.agent.views import AgentState, AgentStep
+from darbot_windows_agent.agent.history.service import History
+from darbot_windows_agent.desktop.views import DesktopState
+from langchain_core.messages import BaseMessage, messages_to_dict, messages_from_dict
+from pathlib import Path
+from time import time
+import hashlib
+import json
+import gzip
+
+SCREENSHOT_PLACEHOLDER='[Screenshot not kept in the checkpoint]'
+
+def observation_digest(desktop_state:DesktopState|None)->str:
+    '''A short hash of the foreground app and its interactive elements, to tell whether the desktop moved on since a checkpoint.'''
+    if desktop_state is None:
+        return ''
+    digest=hashlib.sha256(desktop_state.active_app_to_string().encode('utf-8'))
+    for node in desktop_state.tree_state.interactive_nodes:
+        digest.update(f'\n{node.name}|{node.control_type}|{node.app_name}'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def strip_images(message:BaseMessage)->BaseMessage:
+    # The last observation is taken again on resume, older screenshots are not worth the disk space
+    if isinstance(message.content,str) or not any(isinstance(part,dict) and part.get('type')=='image_url' for part in message.content):
+        return message
+    content=[{'type':'text','text':SCREENSHOT_PLACEHOLDER} if isinstance(part,dict) and part.get('type')=='image_url' else part for part in message.content]
+    return message.model_copy(update={'content':content})
+
+class CheckpointStore:
+    '''
+    Keeps the state of running tasks on disk so a run can be resumed after the process dies.
+
+    Every `every` steps the messages, summary memory, step counter and a digest of the last observation
+    are written as gzipped JSON, one file per run. Screenshots are left out, the desktop is observed again
+    on resume. The checkpoint of a run is removed once the run finishes successfully.
+
+    Args:
+        directory (str | Path): Directory the checkpoints are written to.
+        every (int, optional): Number of steps between checkpoints. Defaults to 5.
+    '''
+    def __init__(self,directory:str|Path,every:int=5):
+        self.directory=Path(directory)
+        self.every=every
+
+    def path(self,run_id:str)->Path:
+        return self.directory.joinpath(f'{run_id}.json.gz')
+
+    def is_due(self,step_number:int)->bool:
+        return step_number>0 and step_number%self.every==0
+
+    def capture(self,agent_state:AgentState,agent_step:AgentStep,history:History,desktop_state:DesktopState|None)->Checkpoint:
+        return Checkpoint(
+            run_id=agent_state.id,
+            query=agent_state.query,
+            step_number=agent_step.step_number,
+            consecutive_failures=agent_state.consecutive_failures,
+            error=agent_state.error or '',
+            previous_observation=agent_state.previous_observation,
+            summary_memory=agent_state.summary_memory,
+            summary_steps=list(agent_state.summary_steps),
+            folded_steps=history.folded_steps,
+            compactions=history.compactions,
+            messages=messages_to_dict([strip_images(message) for message in agent_state.messages]),
+            observation_digest=observation_digest(desktop_state),
+            created_at=time()
+        )
+
+    def save(self,checkpoint:Checkpoint)->Path:
+        self.directory.mkdir(parents=True,exist_ok=True)
+        path=self.path(checkpoint.run_id)
+        data=json.dumps(checkpoint.model_dump(mode='json'),separators=(',',':')).encode('utf-8')
+        # Written to a temporary file first so a crash never leaves a truncated checkpoint behind
+        temporary=path.with_suffix('.tmp')
+        temporary.write_bytes(gzip.compress(data,mtime=0))
+        temporary.replace(path)
+        return path
+
+    def load(self,run_id:str=None)->Checkpoint|None:
+        '''Loads the checkpoint of a run, or the latest checkpoint if no run is given.'''
+        if run_id is not None:
+            path=self.path(run_id)
+            if not path.exists():
+                return None
+        else:
+            paths=sorted(self.directory.glob('*.json.gz'),key=lambda path:path.stat().st_mtime) if self.directory.exists() else []
+            if not paths:
+                return None
+            path=paths[-1]
+        return Checkpoint.model_validate_json(gzip.decompress(path.read_bytes()))
+
+    def delete(self,run_id:str):
+        self.path(run_id).unlink(missing_ok=True)
+
+    def restore(self,checkpoint:Checkpoint,agent_state:AgentState,agent_step:AgentStep,history:History):
+        '''Puts the state of a checkpoint back into the agent, the step budget stays the one of the resuming agent.'''
+        agent_state.init_state(query=checkpoint.query,messages=messages_from_dict(checkpoint.messages))
+        agent_state.id=checkpoint.run_id
+        agent_state.consecutive_failures=checkpoint.consecutive_failures
+        agent_state.error=checkpoint.error
+        agent_state.agent_data=None
+        agent_state.previous_observation=checkpoint.previous_observation
+        agent_state.summary_memory=checkpoint.summary_memory
+        agent_state.summary_steps=list(checkpoint.summary_steps)
+        agent_step.step_number=checkpoint.step_number
+        history.reset()
+        history.folded_steps=checkpoint.folded_steps
+        history.compactions=checkpoint.compactions
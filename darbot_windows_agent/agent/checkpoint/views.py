@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class Checkpoint(BaseModel):
+    run_id: str
+    query: str
+    step_number: int
+    consecutive_failures: int=0
+    error: str=''
+    previous_observation: Optional[str]=None
+    summary_memory: str=''
+    summary_steps: list[str]=Field(default_factory=list)
+    folded_steps: int=0
+    compactions: int=0
+    messages: list[dict]=Field(default_factory=list)
+    observation_digest: str=''
+    created_at: float=0.0
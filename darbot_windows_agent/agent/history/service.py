@@ -0,0 +1,205 @@
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from darbot_windows_agent.agent.history.views import HistoryStats, ImageStats
+from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.utils import extract_agent_data, message_text
+from darbot_windows_agent.agent.views import AgentState
+from typing import Callable, Literal
+from textwrap import shorten
+from io import BytesIO
+from PIL import Image
+import base64
+import re
+
+# Rough cost of an image part, providers bill images by tiles rather than by the size of the data URI
+IMAGE_TOKENS=1000
+OMITTED_STEPS='... earlier steps omitted'
+
+def message_images(message:BaseMessage)->list[str]:
+    if isinstance(message.content,str):
+        return []
+    return [part['image_url'] for part in message.content if isinstance(part,dict) and part.get('type')=='image_url']
+
+def estimate_tokens(message:BaseMessage)->int:
+    # ~4 characters per token is close enough for budgeting and needs no tokenizer
+    images=0 if isinstance(message.content,str) else sum(1 for part in message.content if isinstance(part,dict) and part.get('type')=='image_url')
+    tool_calls=getattr(message,'tool_calls',None) or []
+    return (len(message_text(message))+sum(len(call['name'])+len(str(call['args'])) for call in tool_calls))//4+images*IMAGE_TOKENS+4
+
+class History:
+    '''
+    Keeps the conversation within a token budget.
+
+    The system prompt and the last turns stay verbatim, older turns are folded into a rolling summary
+    of the memory, the actions and their outcomes.
+
+    Args:
+        max_tokens (int, optional): Token budget for the messages sent to the LLM. Defaults to 32000.
+        keep_last (int, optional): Number of recent turns that are never folded. Defaults to 5.
+        max_summary_steps (int, optional): Number of folded steps listed in the summary. Defaults to 50.
+        token_counter (Callable[[BaseMessage],int], optional): Counts the tokens of a message. Defaults to estimate_tokens.
+    '''
+    def __init__(self,max_tokens:int=32000,keep_last:int=5,max_summary_steps:int=50,token_counter:Callable[[BaseMessage],int]=estimate_tokens):
+        self.max_tokens=max_tokens
+        self.keep_last=keep_last
+        self.max_summary_steps=max_summary_steps
+        self.token_counter=token_counter
+        self.token_counts:dict[int,tuple[BaseMessage,int]]={}
+        self.folded_steps=0
+        self.compactions=0
+
+    def count_tokens(self,message:BaseMessage)->int:
+        # Messages are not hashable, so the count is cached by identity and the message is kept alongside it
+        cached=self.token_counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        count=self.token_counter(message)
+        self.token_counts[id(message)]=(message,count)
+        return count
+
+    def total_tokens(self,messages:list[BaseMessage])->int:
+        return sum(self.count_tokens(message) for message in messages)
+
+    def compact(self,agent_state:AgentState,target_tokens:int=None,head:int=1)->bool:
+        '''
+        Folds the oldest turns into the summary once the messages exceed the budget. Returns True if anything was folded.
+
+        Folding stops at target_tokens (the budget by default), a lower target leaves headroom so the history is rewritten less often.
+        The first `head` messages stay as they are: the system prompt, and the task prompt in the stable layout.
+        '''
+        messages=agent_state.messages
+        total=self.total_tokens(messages)
+        if total<=self.max_tokens:
+            return False
+        target=self.max_tokens if target_tokens is None else target_tokens
+        # Layout: the head, the first observation or the summary, then turns of an AI action, its tool results and the observation
+        start=next((index for index in range(head,len(messages)) if isinstance(messages[index],AIMessage)),len(messages))
+        turns=[]
+        for message in messages[start:]:
+            if isinstance(message,AIMessage):
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        # The last turn ends with the current observation, so it is never folded
+        foldable=max(len(turns)-max(self.keep_last,1),0)
+        folded,folded_messages=0,0
+        while folded<foldable and total>target:
+            turn=turns[folded]
+            agent_state.summary_steps.append(self.summarize_turn(turn[0],turn[-1],agent_state,number=self.folded_steps+folded+1))
+            total-=sum(self.count_tokens(message) for message in turn)
+            folded+=1
+            folded_messages+=len(turn)
+        if folded==0:
+            return False
+        if len(agent_state.summary_steps)>self.max_summary_steps:
+            # The steps are numbered, so the marker does not need to count what was dropped
+            steps=[step for step in agent_state.summary_steps if step!=OMITTED_STEPS]
+            agent_state.summary_steps=[OMITTED_STEPS]+steps[-(self.max_summary_steps-1):]
+        summary_message=HumanMessage(content=Prompt.summary_prompt(memory=agent_state.summary_memory,steps=agent_state.summary_steps))
+        # The summary takes the place of the first observation or of the previous summary
+        agent_state.messages=messages[:head]+[summary_message]+messages[start+folded_messages:]
+        kept_ids={id(message) for message in agent_state.messages}
+        self.token_counts={key:value for key,value in self.token_counts.items() if key in kept_ids}
+        self.folded_steps+=folded
+        self.compactions+=1
+        return True
+
+    def summarize_turn(self,ai_message:AIMessage,human_message:HumanMessage,agent_state:AgentState,number:int)->str:
+        try:
+            agent_data=extract_agent_data(ai_message)
+        except ValueError:
+            return f'Step {number}: {shorten(message_text(ai_message),200,placeholder="...")}'
+        if agent_data.memory:
+            agent_state.summary_memory=agent_data.memory
+        action=agent_data.action
+        name=action.name if action else 'No action'
+        params=action.params if action and isinstance(action.params,dict) else {}
+        outcome_match=re.search(r"<output>(.*?)</output>",message_text(human_message),re.DOTALL)
+        outcome=outcome_match.group(1).strip() if outcome_match else message_text(human_message)
+        return f"Step {number}: {name}({', '.join(f'{k}={v}' for k, v in params.items())}) -> {shorten(outcome,200,placeholder='...')}"
+
+    def reset(self):
+        self.token_counts={}
+        self.folded_steps=0
+        self.compactions=0
+
+    def stats(self,messages:list[BaseMessage])->HistoryStats:
+        return HistoryStats(messages=len(messages),tokens=self.total_tokens(messages),folded_steps=self.folded_steps,compactions=self.compactions)
+
+class ImageRetention:
+    '''
+    Keeps full screenshots only for the latest observations.
+
+    Older screenshots are replaced with a text placeholder or a tiny thumbnail, so long vision runs
+    neither hold every screenshot in memory nor upload them again on every LLM call.
+
+    Args:
+        keep_last (int, optional): Number of latest observations that keep their full screenshots. Defaults to 1.
+        mode (Literal['placeholder','thumbnail'], optional): What replaces an evicted screenshot. Defaults to 'placeholder'.
+        thumbnail_size (int, optional): Longest side of the thumbnail in pixels. Defaults to 128.
+    '''
+    def __init__(self,keep_last:int=1,mode:Literal['placeholder','thumbnail']='placeholder',thumbnail_size:int=128):
+        self.keep_last=keep_last
+        self.mode=mode
+        self.thumbnail_size=thumbnail_size
+        self.evicted_images=0
+        self.evicted_bytes=0
+        self.thumbnails:set[str]=set()
+
+    def previous_observation(self,message:HumanMessage,prompt:str)->HumanMessage:
+        '''Replaces the text of the previous observation, its screenshots stay if more than one observation is retained.'''
+        images=message_images(message)
+        if self.keep_last>1 and images:
+            return HumanMessage(content=[{'type':'text','text':prompt}]+[{'type':'image_url','image_url':image} for image in images])
+        self.record_eviction(images)
+        return HumanMessage(content=prompt)
+
+    def evict(self,messages:list[BaseMessage])->int:
+        '''Evicts the screenshots of every observation but the latest keep_last ones. Returns the number of evicted images.'''
+        evicted=0
+        retained=0
+        for index in range(len(messages)-1,-1,-1):
+            message=messages[index]
+            images=message_images(message)
+            if not images or all(self.is_evicted(image) for image in images):
+                continue
+            if retained<self.keep_last:
+                retained+=1
+                continue
+            messages[index]=HumanMessage(content=[self.evict_part(part) for part in message.content])
+            evicted+=len(images)
+        return evicted
+
+    def evict_part(self,part):
+        if not isinstance(part,dict) or part.get('type')!='image_url' or self.is_evicted(part['image_url']):
+            return part
+        image=part['image_url']
+        self.record_eviction([image])
+        if self.mode=='thumbnail':
+            return {'type':'image_url','image_url':self.thumbnail(image)}
+        return {'type':'text','text':'[Screenshot removed to save context]'}
+
+    def is_evicted(self,image)->bool:
+        return isinstance(image,str) and image in self.thumbnails
+
+    def thumbnail(self,image:str)->str:
+        _,data=image.split(',',1)
+        screenshot=Image.open(BytesIO(base64.b64decode(data))).convert('RGB')
+        screenshot.thumbnail((self.thumbnail_size,self.thumbnail_size))
+        buffer=BytesIO()
+        screenshot.save(buffer,format='JPEG',quality=60)
+        thumbnail=f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+        self.thumbnails.add(thumbnail)
+        return thumbnail
+
+    def record_eviction(self,images:list[str]):
+        self.evicted_images+=len(images)
+        self.evicted_bytes+=sum(len(image) for image in images if isinstance(image,str))
+
+    def stats(self,messages:list[BaseMessage])->ImageStats:
+        images=[image for message in messages for image in message_images(message) if not self.is_evicted(image)]
+        return ImageStats(retained_images=len(images),retained_bytes=sum(len(image) for image in images if isinstance(image,str)),evicted_images=self.evicted_images,evicted_bytes=self.evicted_bytes)
+
+    def reset(self):
+        self.evicted_images=0
+        self.evicted_bytes=0
+        self.thumbnails=set()
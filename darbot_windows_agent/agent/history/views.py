@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+class HistoryStats(BaseModel):
+    messages: int
+    tokens: int
+    folded_steps: int
+    compactions: int
+
+class ImageStats(BaseModel):
+    retained_images: int
+    retained_bytes: int
+    evicted_images: int
+    evicted_bytes: int
@@ -0,0 +1,105 @@
+from darbot_windows_agent.agent.observation.views import BudgetedObservation
+from darbot_windows_agent.desktop.views import DesktopState
+
+# Same ratio as the history token estimate, so both agree on what fits
+CHARS_PER_TOKEN=4
+# Room reserved for the note that replaces what was elided from a section
+NOTE_CHARS=100
+
+class ObservationBudget:
+    '''
+    Keeps the observation within a token budget.
+
+    Sections are trimmed in priority order until the observation fits: informative text first, then the
+    background apps, then the low ranked elements (unnamed or outside the foreground app, last in the tree
+    first). After that a long action response is truncated and only then the remaining elements are dropped,
+    so the observation always fits as long as the budget covers the template and the query. Kept elements
+    keep their labels and every trimmed section notes what was elided.
+
+    Args:
+        max_tokens (int, optional): Token budget for the observation message. Defaults to 8000.
+    '''
+    def __init__(self,max_tokens:int=8000):
+        self.max_tokens=max_tokens
+        self.last:BudgetedObservation|None=None
+
+    def fit(self,desktop_state:DesktopState,observation:str,fixed_chars:int)->BudgetedObservation:
+        '''Selects what fits next to the fixed part of the prompt (template, query, active app and cursor).'''
+        limit=self.max_tokens*CHARS_PER_TOKEN
+        tree_state=desktop_state.tree_state
+        apps=[app.to_string() for app in desktop_state.apps]
+        interactive=[tree_state.interactive_element_line(index,node) for index,node in enumerate(tree_state.interactive_nodes)]
+        scrollable=[tree_state.scrollable_element_line(index,node) for index,node in enumerate(tree_state.scrollable_nodes)]
+        informative=[tree_state.informative_element_line(node) for node in tree_state.informative_nodes]
+        total=fixed_chars+len(observation)+sum(len(line)+1 for lines in (apps,interactive,scrollable,informative) for line in lines)
+        elided=[]
+        kept_informative=len(informative)
+        if total>limit and informative:
+            total+=NOTE_CHARS
+            while kept_informative and total>limit:
+                kept_informative-=1
+                total-=len(informative[kept_informative])+1
+            elided.append(f'{len(informative)-kept_informative} informative elements')
+        kept_apps=len(apps)
+        if total>limit and apps:
+            total+=NOTE_CHARS
+            while kept_apps and total>limit:
+                kept_apps-=1
+                total-=len(apps[kept_apps])+1
+            elided.append(f'{len(apps)-kept_apps} background apps')
+        dropped_interactive,dropped_scrollable=set(),set()
+        ranked=self.rank_elements(desktop_state)
+        def drop_elements(low_ranked_only:bool):
+            nonlocal total
+            for kind,index,is_low_ranked in ranked:
+                if total<=limit or (low_ranked_only and not is_low_ranked):
+                    break
+                dropped=dropped_interactive if kind=='interactive' else dropped_scrollable
+                if index in dropped:
+                    continue
+                dropped.add(index)
+                total-=len((interactive if kind=='interactive' else scrollable)[index])+1
+        if total>limit and ranked:
+            total+=2*NOTE_CHARS
+            drop_elements(low_ranked_only=True)
+        if total>limit and len(observation)>NOTE_CHARS:
+            # Named elements of the foreground app are what the agent acts on, a long action response is cut before them
+            keep=max(len(observation)-(total-limit)-NOTE_CHARS,0)
+            if keep<len(observation):
+                elided.append(f'{len(observation)-keep} characters of the action response')
+                total-=len(observation)-keep
+                observation=f'{observation[:keep]}\n... [{len(observation)-keep} characters omitted to fit the context budget]'
+        if total>limit:
+            drop_elements(low_ranked_only=False)
+        if dropped_interactive or dropped_scrollable:
+            elided.append(f'{len(dropped_interactive)+len(dropped_scrollable)} elements')
+        self.last=BudgetedObservation(
+            observation=observation,
+            apps=self.section(apps[:kept_apps],len(apps)-kept_apps,'background apps','No apps opened'),
+            interactive_elements=self.section([line for index,line in enumerate(interactive) if index not in dropped_interactive],len(dropped_interactive),'low ranked interactive elements','No interactive elements found'),
+            scrollable_elements=self.section([line for index,line in enumerate(scrollable) if index not in dropped_scrollable],len(dropped_scrollable),'low ranked scrollable elements','No scrollable elements found'),
+            informative_elements=self.section(informative[:kept_informative],len(informative)-kept_informative,'informative elements','No informative elements found'),
+            tokens=total//CHARS_PER_TOKEN,
+            elided=elided
+        )
+        return self.last
+
+    def rank_elements(self,desktop_state:DesktopState)->list[tuple[str,int,bool]]:
+        '''
+        Elements in the order they are dropped: unnamed before named, background apps before the foreground app, later before earlier.
+
+        Each element comes as (kind, index, is_low_ranked), named elements of the foreground app are the only ones not low ranked.
+        '''
+        active_app=desktop_state.active_app.name if desktop_state.active_app is not None else None
+        tree_state=desktop_state.tree_state
+        elements=[('interactive',index,node) for index,node in enumerate(tree_state.interactive_nodes)]
+        elements+=[('scrollable',index,node) for index,node in enumerate(tree_state.scrollable_nodes)]
+        def rank(element):
+            kind,index,node=element
+            return (node.name not in ("''",''),node.app_name==active_app,-index)
+        return [(kind,index,rank((kind,index,node))[:2]!=(True,True)) for kind,index,node in sorted(elements,key=rank)]
+
+    def section(self,lines:list[str],elided:int,label:str,fallback:str)->str:
+        if elided:
+            lines=lines+[f'... {elided} {label} omitted to fit the context budget']
+        return '\n'.join(lines) if lines else fallback
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+class BudgetedObservation(BaseModel):
+    observation: str
+    apps: str
+    interactive_elements: str
+    scrollable_elements: str
+    informative_elements: str
+    tokens: int
+    elided: list[str]=Field(default_factory=list)
@@ -1,79 +1,182 @@
 from darbot_windows_agent.agent.registry.views import ToolResult
 from darbot_windows_agent.agent.views import AgentStep, AgentData
 from darbot_windows_agent.desktop.views import DesktopState
-from langchain.prompts import PromptTemplate
+from darbot_windows_agent.agent.observation.service import ObservationBudget
 from importlib.resources import files
+from functools import cache, lru_cache
+from typing import Callable, TextIO, Literal
+from string import Formatter
 from datetime import datetime
 from getpass import getuser
 from textwrap import dedent
 from pathlib import Path
+from io import StringIO
 import pyautogui as pg
 import platform
 
+class Template:
+    '''
+    A prompt template parsed once into literal text and fields.
+
+    Rendering writes the segments straight into a buffer, a field value can also be a callable
+    that writes itself into the buffer, so large sections are never built as separate strings.
+    '''
+    def __init__(self,text:str):
+        self.segments=[(literal,field) for literal,field,_,_ in Formatter().parse(text)]
+        self.literal_length=sum(len(literal) for literal,_ in self.segments)
+
+    def format(self,**values)->str:
+        buffer=StringIO()
+        self.write(buffer,values)
+        return buffer.getvalue()
+
+    def write(self,buffer:TextIO,values:dict):
+        for literal,field in self.segments:
+            buffer.write(literal)
+            if field is None:
+                continue
+            value=values[field]
+            if callable(value):
+                value(buffer)
+            else:
+                buffer.write(str(value))
+
+@cache
+def load_text(name:str)->str:
+    return files('darbot_windows_agent.agent.prompt').joinpath(name).read_text(encoding='utf-8')
+
+@cache
+def load_template(name:str)->Template:
+    return Template(load_text(name))
+
+@cache
+def system_info()->dict[str,str]:
+    width, height = pg.size()
+    return {
+        'download_directory': Path.home().joinpath('Downloads').as_posix(),
+        'os':platform.system(),
+        'home_dir':Path.home().as_posix(),
+        'user':getuser(),
+        'resolution':f'{width}x{height}'
+    }
+
+def section(writer:Callable[[TextIO],None],is_empty:bool,fallback:str)->Callable[[TextIO],None]|str:
+    return fallback if is_empty else writer
+
+PREVIOUS_OBSERVATION_TEMPLATE=Template(dedent('''
+        ```xml
+        <output>{observation}</output>
+        ```
+        '''))
+
+TASK_TEMPLATE=Template(dedent('''
+        ```xml
+        <user_query>{query}</user_query>
+        ```
+        '''))
+
+DATE_FORMAT='%A, %B %d, %Y'
+
+TOOLS_CALLING_PROMPT='The tools are given to you for function calling, their names, descriptions and parameters come with every request.'
+
+TOOL_RESULT_PROMPT='The outcome is in the observation that follows.'
+
 class Prompt:
     @staticmethod
-    def system_prompt(browser: str,tools_prompt:str,max_steps:int,instructions: list[str]=[]) -> str:
-        width, height = pg.size()
-        template =PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath('system.md'))
+    def system_prompt(browser: str,tools_prompt:str,max_steps:int,instructions: list[str]=[],stable:bool=False,action_mode:Literal['xml','tools']='xml') -> str:
+        # A stable system prompt leaves the date to the observation so it stays byte-identical across days
+        current_datetime='given with each observation' if stable else datetime.now().strftime(DATE_FORMAT)
+        return Prompt.cached_system_prompt(browser,tools_prompt,max_steps,tuple(instructions),current_datetime,action_mode)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def cached_system_prompt(browser: str,tools_prompt:str,max_steps:int,instructions:tuple[str,...],current_datetime:str,action_mode:Literal['xml','tools']='xml') -> str:
+        template = load_template('system.md')
         return template.format(**{
-            'current_datetime': datetime.now().strftime('%A, %B %d, %Y'),
+            'current_datetime': current_datetime,
             'instructions': '\n'.join(instructions),
             'tools_prompt': tools_prompt,
-            'download_directory': Path.home().joinpath('Downloads').as_posix(),
-            'os':platform.system(),
+            'output_format': load_text(f'output_{action_mode}.md'),
             'browser':browser,
-            'home_dir':Path.home().as_posix(),
-            'user':getuser(),
-            'resolution':f'{width}x{height}',
             'max_steps': max_steps
-        })
-    
+        }|system_info())
+
     @staticmethod
     def action_prompt(agent_data:AgentData) -> str:
-        template = PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath('action.md'))
+        template = load_template('action.md')
+        actions=agent_data.actions or [agent_data.action]
         return template.format(**{
             'evaluate': agent_data.evaluate,
             'memory':  agent_data.memory,
             'thought': agent_data.thought,
-            'action_name': agent_data.action.name,
-            'action_input': agent_data.action.params
+            # Native tool calls travel on the message itself, only actions parsed from the text are written back
+            'actions': '\n    '.join(f'<action_name>{action.name}</action_name>\n    <action_input>{action.params}</action_input>' for action in actions if action.id is None)
         })
-    
+
+    @staticmethod
+    def batch_instructions(max_actions:int,action_mode:Literal['xml','tools']='xml')->str:
+        batch='tool calls in a step' if action_mode=='tools' else 'actions in a step as consecutive <action_name>/<action_input> pairs'
+        return (f'You may output up to {max_actions} {batch}, '
+            'only for elements already listed in <desktop_state> (e.g. click a field, type the text, press enter). '
+            'They run in order and the rest of the batch is skipped once an action fails or the foreground window changes. '
+            '`Done Tool` must always be the only action of its step.')
+
+    @staticmethod
+    def task_prompt(query:str)->str:
+        return TASK_TEMPLATE.format(**{'query': query})
+
+    @staticmethod
+    def current_date_prompt()->str:
+        return f'The current date is {datetime.now().strftime(DATE_FORMAT)}.'
+
     @staticmethod
     def previous_observation_prompt(observation: str)-> str:
-        template=PromptTemplate.from_template(dedent('''
-        ```xml
-        <output>{observation}</output>
-        ```
-        '''))
-        return template.format(**{'observation': observation})
-         
+        return PREVIOUS_OBSERVATION_TEMPLATE.format(**{'observation': observation})
+
     @staticmethod
-    def observation_prompt(query:str,agent_step: AgentStep, tool_result:ToolResult,desktop_state: DesktopState) -> str:
+    def observation_prompt(query:str,agent_step: AgentStep, tool_result:ToolResult,desktop_state: DesktopState,budget:ObservationBudget=None) -> str:
         cursor_location = pg.position()
         tree_state = desktop_state.tree_state
-        template = PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath('observation.md'))
-        return template.format(**{
+        template = load_template('observation.md')
+        values={
             'steps': agent_step.step_number,
             'max_steps': agent_step.max_steps,
             'observation': tool_result.content if tool_result.is_success else tool_result.error,
             'active_app': desktop_state.active_app_to_string(),
             'cursor_location': f'({cursor_location.x},{cursor_location.y})',
-            'apps': desktop_state.apps_to_string(),
-            'interactive_elements': tree_state.interactive_elements_to_string() or 'No interactive elements found',
-            'informative_elements': tree_state.informative_elements_to_string() or 'No informative elements found',
-            'scrollable_elements': tree_state.scrollable_elements_to_string() or 'No scrollable elements found',
             'query':query
+        }
+        if budget is None:
+            return template.format(**values|{
+                'apps': desktop_state.apps_to_string(),
+                'interactive_elements': section(tree_state.write_interactive_elements,not tree_state.interactive_nodes,'No interactive elements found'),
+                'informative_elements': section(tree_state.write_informative_elements,not tree_state.informative_nodes,'No informative elements found'),
+                'scrollable_elements': section(tree_state.write_scrollable_elements,not tree_state.scrollable_nodes,'No scrollable elements found'),
+            })
+        fixed_chars=template.literal_length+sum(len(str(value)) for key,value in values.items() if key!='observation')
+        fitted=budget.fit(desktop_state=desktop_state,observation=str(values['observation']),fixed_chars=fixed_chars)
+        return template.format(**values|{
+            'observation': fitted.observation,
+            'apps': fitted.apps,
+            'interactive_elements': fitted.interactive_elements,
+            'informative_elements': fitted.informative_elements,
+            'scrollable_elements': fitted.scrollable_elements,
+        })
+
+    @staticmethod
+    def summary_prompt(memory: str, steps: list[str]) -> str:
+        template = load_template('summary.md')
+        return template.format(**{
+            'memory': memory or 'No memory yet',
+            'steps': '\n'.join(steps)
         })
-    
+
     @staticmethod
     def answer_prompt(agent_data: AgentData, tool_result: ToolResult):
-        template = PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath('answer.md'))
+        template = load_template('answer.md')
         return template.format(**{
             'evaluate': agent_data.evaluate,
             'memory':  agent_data.memory,
             'thought': agent_data.thought,
             'final_answer': tool_result.content
         })
-
-    
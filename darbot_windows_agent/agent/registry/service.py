@@ -1,7 +1,11 @@
 from darbot_windows_agent.agent.registry.views import Tool as ToolData, ToolResult
+from darbot_windows_agent.agent.views import AgentData
 from darbot_windows_agent.desktop import Desktop
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain.tools import Tool
 from textwrap import dedent
+import asyncio
+import re
 
 class Registry:
     def __init__(self,tools:list[Tool]):
@@ -29,6 +33,27 @@ class Registry:
     def get_tools_prompt(self) -> str:
         tools_prompt = [self.tool_prompt(tool.name) for tool in self.tools]
         return '\n\n'.join(tools_prompt)
+
+    def call_name(self, tool_name: str) -> str:
+        # Providers only accept letters, digits, underscores and dashes in function names
+        return re.sub(r'[^a-zA-Z0-9_-]+', '_', tool_name).strip('_')
+
+    def get_tool_schemas(self) -> list[dict]:
+        '''The tools as OpenAI function schemas for `bind_tools`, named with their call names.'''
+        schemas = []
+        for tool in self.tools:
+            schema = convert_to_openai_tool(tool)
+            schema['function']['name'] = self.call_name(tool.name)
+            schemas.append(schema)
+        return schemas
+
+    def resolve_tool_calls(self, agent_data: AgentData) -> AgentData:
+        '''Maps the call names of native tool calls back to the tool names.'''
+        names = {self.call_name(name): name for name in self.tools_registry}
+        for action in [agent_data.action, *agent_data.actions]:
+            if action is not None and action.id is not None:
+                action.name = names.get(action.name, action.name)
+        return agent_data
     
     def execute(self, tool_name: str, desktop: Desktop, **kwargs) -> ToolResult:
         tool = self.tools_registry.get(tool_name)
@@ -38,4 +63,8 @@ class Registry:
             content = tool.function(tool_input={'desktop':desktop}|kwargs)
             return ToolResult(is_success=True, content=content)
         except Exception as error:
-            return ToolResult(is_success=False, error=str(error))
\ No newline at end of file
+            return ToolResult(is_success=False, error=str(error))
+    
+    async def aexecute(self, tool_name: str, desktop: Desktop, **kwargs) -> ToolResult:
+        # Tools drive the mouse, keyboard and shell synchronously, so they run on the default executor
+        return await asyncio.to_thread(self.execute, tool_name, desktop, **kwargs)
@@ -0,0 +1,82 @@
+from darbot_windows_agent.agent.router.views import RoutingDecision
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.agent.views import AgentData
+from darbot_windows_agent.desktop.views import DesktopState
+from langchain_core.language_models.chat_models import BaseChatModel
+from collections import Counter
+from typing import Literal
+
+class ModelRouter:
+    '''
+    Picks the model for each step: a small fast model for routine steps and a strong model for the rest.
+
+    The strong model takes the first step, any step after a failed action or an unparsable response, steps
+    after a low confidence response (missing evaluate or thought, or an evaluate of Failure), the first
+    step in an app not seen before in the run and the step after a batch of actions, which has run in full
+    by then and leaves the most to check. The fast model takes steps that repeat a single action already
+    done successfully in the same app.
+
+    Args:
+        fast_llm (BaseChatModel): Small, fast model for routine steps.
+        strong_llm (BaseChatModel, optional): Model for the steps that need more, the agent's llm if None. Defaults to None.
+        pattern_repeats (int, optional): Successful runs of an action in an app before repeating it is routine. Defaults to 2.
+        default_tier (Literal['fast','strong'], optional): Tier for steps without a routine or escalation signal. Defaults to 'strong'.
+    '''
+    def __init__(self,fast_llm:BaseChatModel,strong_llm:BaseChatModel=None,pattern_repeats:int=2,default_tier:Literal['fast','strong']='strong'):
+        self.fast_llm=fast_llm
+        self.strong_llm=strong_llm
+        self.pattern_repeats=pattern_repeats
+        self.default_tier=default_tier
+        self.reset()
+
+    def reset(self):
+        self.decisions:list[RoutingDecision]=[]
+        self.seen_apps:set[str]=set()
+        self.patterns:Counter[tuple[str,str]]=Counter()
+        self.current_app:str=''
+        self.last_agent_data:AgentData|None=None
+        self.last_tool_result:ToolResult|None=None
+
+    def model(self,tier:Literal['fast','strong'])->BaseChatModel|None:
+        return self.fast_llm if tier=='fast' else self.strong_llm
+
+    def decide(self,desktop_state:DesktopState|None,consecutive_failures:int=0)->RoutingDecision:
+        self.current_app=desktop_state.active_app.name if desktop_state is not None and desktop_state.active_app is not None else ''
+        decision=self.evaluate(consecutive_failures=consecutive_failures)
+        self.seen_apps.add(self.current_app)
+        self.decisions.append(decision)
+        return decision
+
+    def evaluate(self,consecutive_failures:int=0)->RoutingDecision:
+        if consecutive_failures:
+            return RoutingDecision(tier='strong',reason='previous response failed')
+        agent_data,tool_result=self.last_agent_data,self.last_tool_result
+        if agent_data is None:
+            return RoutingDecision(tier='strong',reason='first step of the task')
+        if not tool_result.is_success:
+            return RoutingDecision(tier='strong',reason='previous action failed')
+        if not agent_data.evaluate or not agent_data.thought:
+            return RoutingDecision(tier='strong',reason='low confidence response (missing evaluate or thought)')
+        if agent_data.evaluate.lstrip().lower().startswith('failure'):
+            return RoutingDecision(tier='strong',reason='previous step judged a failure')
+        if self.current_app not in self.seen_apps:
+            return RoutingDecision(tier='strong',reason=f"first contact with {self.current_app or 'the desktop'}")
+        actions=agent_data.actions or [agent_data.action]
+        if len(actions)>1:
+            return RoutingDecision(tier='strong',reason=f'checking the outcome of a batch of {len(actions)} actions')
+        action_name=actions[-1].name
+        if self.patterns[(self.current_app,action_name)]>=self.pattern_repeats:
+            return RoutingDecision(tier='fast',reason=f"repeating {action_name} in {self.current_app or 'the desktop'}")
+        return RoutingDecision(tier=self.default_tier,reason='no routine signal')
+
+    def record_step(self,agent_data:AgentData,tool_result:ToolResult):
+        '''Records the outcome of the step that was routed last.'''
+        self.last_agent_data=agent_data
+        self.last_tool_result=tool_result
+        if tool_result.is_success:
+            for action in agent_data.actions or [agent_data.action]:
+                self.patterns[(self.current_app,action.name)]+=1
+
+    def summary(self)->str:
+        fast=sum(1 for decision in self.decisions if decision.tier=='fast')
+        return f'Fast model used on {fast} of {len(self.decisions)} steps.'
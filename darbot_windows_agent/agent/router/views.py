@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import Literal
+
+class RoutingDecision(BaseModel):
+    tier: Literal['fast','strong']
+    reason: str
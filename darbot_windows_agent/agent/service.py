@@ -1,20 +1,35 @@
-from darbot_windows_agent.agent.tools.service import click_tool, type_tool, launch_tool, shell_tool, clipboard_tool, done_tool, shortcut_tool, scroll_tool, drag_tool, move_tool, key_tool, wait_tool, scrape_tool, switch_tool, resize_tool, github_cli_tool
+from darbot_windows_agent.agent.tools.service import click_tool, type_tool, launch_tool, shell_tool, clipboard_tool, done_tool, shortcut_tool, scroll_tool, drag_tool, move_tool, key_tool, wait_tool, scrape_tool, switch_tool, resize_tool, github_cli_tool, screenshot_tool
 from darbot_windows_agent.github.models import ModelSelector
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from darbot_windows_agent.agent.views import AgentState, AgentStep, AgentResult
-from darbot_windows_agent.agent.utils import extract_agent_data, image_message
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from darbot_windows_agent.agent.views import AgentState, AgentStep, AgentResult, Action
+from darbot_windows_agent.agent.utils import extract_agent_data, image_message, AgentDataParser
 from langchain_core.language_models.chat_models import BaseChatModel
 from darbot_windows_agent.agent.registry.views import ToolResult
 from darbot_windows_agent.agent.registry.service import Registry
-from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.prompt.service import Prompt, TOOLS_CALLING_PROMPT, TOOL_RESULT_PROMPT
+from darbot_windows_agent.agent.vision.service import VisionPolicy
+from darbot_windows_agent.agent.history.service import History, ImageRetention
+from darbot_windows_agent.agent.trajectory.service import TrajectoryStore, describe_step, resolve_step, app_name
+from darbot_windows_agent.agent.trajectory.views import Trajectory
+from darbot_windows_agent.agent.observation.service import ObservationBudget
+from darbot_windows_agent.agent.router.service import ModelRouter
+from darbot_windows_agent.agent.checkpoint.service import CheckpointStore, observation_digest
+from darbot_windows_agent.agent.checkpoint.views import Checkpoint
+from darbot_windows_agent.llm.prefix import PrefixCacheStats, supports_cache_hints, with_cache_hints
+from darbot_windows_agent.tracing import Tracer
 from live_inspect.watch_cursor import WatchCursor
 from langchain_core.tools import BaseTool
+from langchain_core.runnables import Runnable
+from darbot_windows_agent.desktop.views import VisionConfig, RecorderConfig, DesktopState
 from darbot_windows_agent.desktop import Desktop
 from rich.markdown import Markdown
 from rich.console import Console
 from termcolor import colored
 from textwrap import shorten
-from typing import Literal
+from typing import Callable, Literal
+from time import monotonic
+import threading
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,13 +52,28 @@ class Agent:
         llm (BaseChatModel): Language model for the agent. Defaults to None.
         consecutive_failures (int, optional): Maximum number of consecutive failures for the agent. Defaults to 3.
         max_steps (int, optional): Maximum number of steps for the agent. Defaults to 100.
-        use_vision (bool, optional): Whether to use vision for the agent. Defaults to False.
+        use_vision (bool | Literal['auto'], optional): Whether to use vision for the agent, 'auto' lets the vision policy decide per step. Defaults to False.
         model_selector (ModelSelector, optional): Model selector for GitHub Copilot integration. Defaults to None.
+        vision_config (VisionConfig, optional): Capture settings for the screenshot when vision is used. Defaults to None.
+        recorder_config (RecorderConfig, optional): Enables the background frame recorder with these settings. Defaults to None.
+        vision_policy (VisionPolicy, optional): Policy deciding when to attach a screenshot if use_vision is 'auto'. Defaults to None.
+        history (History, optional): Keeps the conversation within a token budget by folding old turns into a summary. Defaults to None.
+        image_retention (ImageRetention, optional): How many observations keep their full screenshots in vision mode. Defaults to None.
+        streaming (bool, optional): Stream the response, log the thought as soon as it arrives and stop the stream once the action is parsed. Defaults to False.
+        max_actions (int, optional): Maximum number of actions the agent may batch in one step before the next observation. Defaults to 1.
+        trajectory_store (TrajectoryStore, optional): Records successful runs and replays them for matching queries without the LLM. Defaults to None.
+        message_layout (Literal['default','stable'], optional): 'stable' keeps the system prompt and past turns byte-identical across steps for provider prompt caching. Defaults to 'default'.
+        observation_budget (ObservationBudget, optional): Trims the observation to a token budget, elements and apps are elided in priority order. Defaults to None.
+        action_mode (Literal['xml','tools'], optional): 'tools' binds the tools with `bind_tools` and reads native tool calls, only evaluate, memory and thought stay in the text. Defaults to 'xml'.
+        tracer (Tracer, optional): Records timed spans of each run (LLM, tools, tree walk, waits, capture) and logs their percentiles, a Chrome trace is written per run if it has an output directory. Defaults to None.
+        router (ModelRouter, optional): Sends routine steps to a small fast model and escalates the rest to the strong model (the llm unless the router has its own). Defaults to None.
+        checkpoint_store (CheckpointStore, optional): Writes the state of the run to disk every few steps so `resume` can continue it after the process dies. Defaults to None.
+        event_handler (Callable[[str,dict],None], optional): Called with the kind and data of every step event (thought, observation, answer, error). Defaults to None.
     
     Returns:
         Agent
     '''
-    def __init__(self,instructions:list[str]=[],additional_tools:list[BaseTool]=[],browser:Literal['edge','chrome','firefox']='edge', llm: BaseChatModel=None,consecutive_failures:int=3,max_steps:int=100,use_vision:bool=False, model_selector: ModelSelector=None):
+    def __init__(self,instructions:list[str]=[],additional_tools:list[BaseTool]=[],browser:Literal['edge','chrome','firefox']='edge', llm: BaseChatModel=None,consecutive_failures:int=3,max_steps:int=100,use_vision:bool|Literal['auto']=False, model_selector: ModelSelector=None,vision_config:VisionConfig=None,recorder_config:RecorderConfig=None,vision_policy:VisionPolicy=None,history:History=None,image_retention:ImageRetention=None,streaming:bool=False,max_actions:int=1,trajectory_store:TrajectoryStore=None,message_layout:Literal['default','stable']='default',observation_budget:ObservationBudget=None,action_mode:Literal['xml','tools']='xml',tracer:Tracer=None,router:ModelRouter=None,checkpoint_store:CheckpointStore=None,event_handler:Callable[[str,dict],None]=None):
         self.name='Darbot Windows Agent'
         self.description='An agent that can interact with GUI elements on Windows' 
         self.registry = Registry([
@@ -51,92 +81,580 @@ class Agent:
             done_tool, shortcut_tool, scroll_tool, drag_tool, move_tool,
             key_tool, wait_tool, scrape_tool, switch_tool, resize_tool,
             github_cli_tool
-        ] + additional_tools)
-        self.instructions=instructions
+        ] + ([screenshot_tool] if use_vision=='auto' else []) + additional_tools)
+        self.max_actions=max_actions
+        self.action_mode=action_mode
+        self.instructions=instructions+([Prompt.batch_instructions(max_actions,action_mode)] if max_actions>1 else [])
         self.browser=browser
         self.consecutive_failures=consecutive_failures
-        self.desktop = Desktop()
+        self.tracer = tracer or Tracer(enabled=False)
+        self.desktop = Desktop(vision_config=vision_config,recorder_config=recorder_config,tracer=self.tracer)
         self.agent_state = AgentState()
         self.watch_cursor = WatchCursor()
         self.agent_step = AgentStep(max_steps=max_steps)
         self.use_vision=use_vision
+        self.vision_policy = vision_policy or VisionPolicy()
+        self.history = history or History()
+        self.image_retention = image_retention or ImageRetention()
         self.llm = llm
+        self.bound_llms:list[tuple[BaseChatModel,Runnable]] = []
+        self.router = router
+        self.checkpoint_store = checkpoint_store
+        self.event_handler = event_handler
+        self.stop_event = threading.Event()
+        self.streaming = streaming
+        self.trajectory_store = trajectory_store
+        self.trajectory:Trajectory|None = None
+        self.message_layout = message_layout
+        self.prefix_cache = PrefixCacheStats()
+        self.observation_budget = observation_budget
         self.model_selector = model_selector or ModelSelector()
 
     def reason(self):
-        message=self.llm.invoke(self.agent_state.messages)
+        with self.tracer.span('reason',category='llm',step=self.agent_step.step_number,streaming=self.streaming) as span:
+            llm=self.select_llm(span)
+            if self.streaming:
+                message=self.stream(llm)
+            else:
+                message=self.chat_model(llm).invoke(self.request_messages(llm))
+            span.update(getattr(message,'usage_metadata',None) or {})
+        self.update_reasoning(message)
+
+    async def areason(self):
+        with self.tracer.span('reason',category='llm',step=self.agent_step.step_number,streaming=self.streaming) as span:
+            llm=self.select_llm(span)
+            if self.streaming:
+                message=await self.astream(llm)
+            else:
+                message=await self.chat_model(llm).ainvoke(self.request_messages(llm))
+            span.update(getattr(message,'usage_metadata',None) or {})
+        self.update_reasoning(message)
+
+    def select_llm(self,span:dict)->BaseChatModel:
+        if self.router is None:
+            return self.llm
+        decision=self.router.decide(desktop_state=self.desktop.desktop_state,consecutive_failures=self.agent_state.consecutive_failures)
+        span['tier']=decision.tier
+        logger.info(colored(f"🧭: Model: {decision.tier} ({decision.reason})",color='yellow'))
+        return self.router.model(decision.tier) or self.llm
+
+    def chat_model(self,llm:BaseChatModel=None)->BaseChatModel|Runnable:
+        llm=llm or self.llm
+        if self.action_mode=='xml':
+            return llm
+        # Bound once per model, the llm can be swapped after construction and a router switches between two
+        for model,bound in self.bound_llms:
+            if model is llm:
+                return bound
+        bound=llm.bind_tools(self.registry.get_tool_schemas())
+        self.bound_llms.append((llm,bound))
+        return bound
+
+    def request_messages(self,llm:BaseChatModel=None)->list[BaseMessage]:
+        if self.message_layout=='stable' and supports_cache_hints(llm or self.llm):
+            return with_cache_hints(self.agent_state.messages)
+        return self.agent_state.messages
+
+    def update_reasoning(self,message:AIMessage):
+        ratio=self.prefix_cache.record(message)
+        if ratio is not None:
+            logger.info(f"Prompt cache: {ratio:.0%} of the input tokens served from cache.")
         agent_data = extract_agent_data(message=message)
+        if self.action_mode=='tools':
+            self.registry.resolve_tool_calls(agent_data)
         self.agent_state.update_state(agent_data=agent_data, messages=[message])
-        logger.info(colored(f"💭: Thought: {agent_data.thought}",color='light_magenta',attrs=['bold']))
+        self.emit('thought',evaluate=agent_data.evaluate,memory=agent_data.memory,thought=agent_data.thought,
+            actions=[{'name':action.name,'params':action.params} for action in agent_data.actions or [agent_data.action]])
+        if not self.streaming:
+            logger.info(colored(f"💭: Thought: {agent_data.thought}",color='light_magenta',attrs=['bold']))
+
+    def stream(self,llm:BaseChatModel=None)->AIMessage:
+        parser=AgentDataParser(max_actions=self.max_actions)
+        started=monotonic()
+        chunks=self.chat_model(llm).stream(self.request_messages(llm))
+        tool_calls=None
+        try:
+            for chunk in chunks:
+                tool_calls=self.merge_tool_call_chunks(tool_calls,chunk)
+                if self.feed_chunk(parser,chunk,started):
+                    break
+        finally:
+            # Closing the generator cancels the underlying request
+            if hasattr(chunks,'close'):
+                chunks.close()
+        return self.streamed_message(parser,tool_calls)
+
+    async def astream(self,llm:BaseChatModel=None)->AIMessage:
+        parser=AgentDataParser(max_actions=self.max_actions)
+        started=monotonic()
+        chunks=self.chat_model(llm).astream(self.request_messages(llm))
+        tool_calls=None
+        try:
+            async for chunk in chunks:
+                tool_calls=self.merge_tool_call_chunks(tool_calls,chunk)
+                if self.feed_chunk(parser,chunk,started):
+                    break
+        finally:
+            if hasattr(chunks,'aclose'):
+                await chunks.aclose()
+        return self.streamed_message(parser,tool_calls)
+
+    def merge_tool_call_chunks(self,merged:AIMessageChunk|None,chunk:AIMessageChunk)->AIMessageChunk|None:
+        # Tool call arguments arrive in pieces, adding the chunks joins them, the stream then runs to its end
+        if self.action_mode=='xml':
+            return None
+        return chunk if merged is None else merged+chunk
+
+    def streamed_message(self,parser:AgentDataParser,merged:AIMessageChunk|None)->AIMessage:
+        if merged is None:
+            return AIMessage(content=parser.text)
+        return AIMessage(content=parser.text,tool_calls=merged.tool_calls,invalid_tool_calls=merged.invalid_tool_calls)
+
+    def feed_chunk(self,parser:AgentDataParser,chunk:AIMessage,started:float)->bool:
+        '''Feeds a streamed chunk to the parser, returns True once the action is parsed.'''
+        content=chunk.content if isinstance(chunk.content,str) else ''
+        if 'thought' in parser.feed(content):
+            logger.info(colored(f"💭: Thought: {parser.get('thought')}",color='light_magenta',attrs=['bold']))
+        if parser.is_action_ready():
+            # The action is the last part the agent needs, the rest of the response is not awaited
+            logger.info(f"Action parsed after {monotonic()-started:.2f}s, stopped the stream.")
+            return True
+        return False
 
     def action(self):
-        self.agent_state.messages.pop() # Remove the last message to avoid duplication
-        last_message = self.agent_state.messages[-1]
-        if isinstance(last_message, HumanMessage):
-            self.agent_state.messages[-1]=HumanMessage(content=Prompt.previous_observation_prompt(self.agent_state.previous_observation))
-        ai_message = AIMessage(content=Prompt.action_prompt(agent_data=self.agent_state.agent_data))
-        name = self.agent_state.agent_data.action.name
-        params = self.agent_state.agent_data.action.params
-        logger.info(colored(f"🔧: Action: {name}({', '.join(f'{k}={v}' for k, v in params.items())})",color='blue',attrs=['bold']))
-        tool_result = self.registry.execute(tool_name=name, desktop=self.desktop, **params)
+        ai_message=self.start_action()
+        actions=self.agent_state.agent_data.actions or [self.agent_state.agent_data.action]
+        action_started=monotonic()
+        tool_result = self.execute_actions(actions)
+        self.log_observation(tool_result)
+        desktop_state = self.observe(tool_result=tool_result, action_names=[action.name for action in actions])
+        self.finish_action(ai_message,tool_result,desktop_state,action_started)
+
+    async def aaction(self):
+        ai_message=self.start_action()
+        actions=self.agent_state.agent_data.actions or [self.agent_state.agent_data.action]
+        action_started=monotonic()
+        # The whole batch goes to one worker thread, see Registry.aexecute for why tools leave the event loop
+        tool_result = await asyncio.to_thread(self.execute_actions,actions)
+        self.log_observation(tool_result)
+        desktop_state = await self.aobserve(tool_result=tool_result, action_names=[action.name for action in actions])
+        self.finish_action(ai_message,tool_result,desktop_state,action_started)
+
+    def start_action(self)->AIMessage:
+        self.close_turn()
+        agent_data=self.agent_state.agent_data
+        return AIMessage(content=Prompt.action_prompt(agent_data=agent_data),tool_calls=self.tool_calls(agent_data.actions or [agent_data.action]))
+
+    def tool_calls(self,actions:list[Action])->list[dict]:
+        # Native tool calls are kept on the action message, each one is answered by a tool message
+        if self.action_mode=='xml':
+            return []
+        return [{'name':self.registry.call_name(action.name),'args':action.params,'id':action.id,'type':'tool_call'} for action in actions if action.id is not None]
+
+    def execute_actions(self,actions:list[Action])->ToolResult:
+        if len(actions)==1:
+            return self.execute_action(actions[0])
+        actions,note=self.validate_actions(actions)
+        if not actions:
+            return ToolResult(is_success=False,error=note)
+        outcomes=[]
+        for index,action in enumerate(actions,start=1):
+            window=self.desktop.get_foreground_window()
+            tool_result=self.execute_action(action)
+            outcomes.append(f'{index}. {action.name}: {tool_result.content if tool_result.is_success else tool_result.error}')
+            remaining=len(actions)-index
+            if not tool_result.is_success:
+                if remaining:
+                    outcomes.append(f'Skipped the remaining {remaining} actions because action {index} failed.')
+                return ToolResult(is_success=False,error='\n'.join(outcomes))
+            # The rest of the batch was planned against this window, its elements are stale once it changes
+            if remaining and self.desktop.get_foreground_window()!=window:
+                outcomes.append(f'Skipped the remaining {remaining} actions because the foreground window changed.')
+                break
+        if note:
+            outcomes.append(note)
+        return ToolResult(is_success=True,content='\n'.join(outcomes))
+
+    def execute_action(self,action:Action)->ToolResult:
+        logger.info(colored(f"🔧: Action: {action.name}({', '.join(f'{k}={v}' for k, v in action.params.items())})",color='blue',attrs=['bold']))
+        # The step is described against the observation the action was planned on
+        step=describe_step(action,self.desktop.desktop_state) if self.trajectory is not None else None
+        with self.tracer.span('tool',category='tool',tool=action.name) as span:
+            tool_result=self.registry.execute(tool_name=action.name, desktop=self.desktop, **action.params)
+            span['is_success']=tool_result.is_success
+        if step is not None and tool_result.is_success:
+            self.trajectory.steps.append(step)
+        return tool_result
+
+    def validate_actions(self,actions:list[Action])->tuple[list[Action],str|None]:
+        '''Cuts a batch before the first action that cannot be batched, returns the batch and a note about what was dropped.'''
+        for index,action in enumerate(actions):
+            if index==self.max_actions:
+                return actions[:index],f'Dropped {len(actions)-index} actions beyond the limit of {self.max_actions} per step.'
+            if action.name=='Done Tool':
+                return actions[:index],'Dropped `Done Tool` from the batch, it has to be the only action of a step.'
+            if action.name not in self.registry.tools_registry:
+                return actions[:index],f"Dropped the batch from action {index+1}, tool '{action.name}' not found."
+        return actions,None
+
+    def log_observation(self,tool_result:ToolResult):
         observation=tool_result.content if tool_result.is_success else tool_result.error
+        self.emit('observation',is_success=tool_result.is_success,content=observation)
         logger.info(colored(f"🔭: Observation: {shorten(observation,500,placeholder='...')}",color='green',attrs=['bold']))
-        desktop_state = self.desktop.get_state(use_vision=self.use_vision)
-        prompt=Prompt.observation_prompt(query=self.agent_state.query,agent_step=self.agent_step, tool_result=tool_result, desktop_state=desktop_state)
-        human_message=image_message(prompt=prompt,image=desktop_state.screenshot) if self.use_vision and desktop_state.screenshot else HumanMessage(content=prompt)
-        self.agent_state.update_state(agent_data=None,observation=observation,messages=[ai_message, human_message])
+
+    def finish_action(self,ai_message:AIMessage,tool_result:ToolResult,desktop_state:DesktopState,action_started:float):
+        observation=tool_result.content if tool_result.is_success else tool_result.error
+        prompt=self.observation_prompt(query=self.agent_state.query,tool_result=tool_result,desktop_state=desktop_state)
+        if self.use_vision and desktop_state.screenshot:
+            frames=self.failure_frames(since=action_started) if not tool_result.is_success else []
+            human_message=image_message(prompt,desktop_state.screenshot,*frames)
+        else:
+            human_message=HumanMessage(content=prompt)
+        # The observation follows as usual, the tool messages only close the calls
+        tool_messages=[ToolMessage(content=TOOL_RESULT_PROMPT,tool_call_id=tool_call['id']) for tool_call in ai_message.tool_calls]
+        if self.message_layout=='stable':
+            messages=[ai_message,*tool_messages,HumanMessage(content=Prompt.previous_observation_prompt(observation)),human_message]
+        else:
+            messages=[ai_message,*tool_messages,human_message]
+        if self.router is not None:
+            self.router.record_step(self.agent_state.agent_data,tool_result)
+        self.agent_state.update_state(agent_data=None,observation=observation,messages=messages)
+        self.image_retention.evict(self.agent_state.messages)
+        # Every compaction rewrites the start of the conversation, the stable layout folds down to half the budget to do it rarely
+        target_tokens=self.history.max_tokens//2 if self.message_layout=='stable' else None
+        # The stable layout keeps its task prompt after the system prompt
+        head=2 if self.message_layout=='stable' else 1
+        if self.history.compact(self.agent_state,target_tokens=target_tokens,head=head):
+            stats=self.history.stats(self.agent_state.messages)
+            logger.info(f"History compacted: {stats.folded_steps} steps folded, {stats.tokens} tokens in {stats.messages} messages.")
+
+    def observation_prompt(self,query:str,tool_result:ToolResult,desktop_state:DesktopState)->str:
+        prompt=Prompt.observation_prompt(query=query,agent_step=self.agent_step, tool_result=tool_result, desktop_state=desktop_state, budget=self.observation_budget)
+        if self.observation_budget is not None and self.observation_budget.last.elided:
+            logger.info(f"Observation trimmed to {self.observation_budget.last.tokens} tokens: elided {', '.join(self.observation_budget.last.elided)}.")
+        if self.message_layout=='stable':
+            return f'{prompt}\n{Prompt.current_date_prompt()}'
+        return prompt
+
+    def observe(self,tool_result:ToolResult,action_names:list[str]=[])->DesktopState:
+        with self.tracer.span('observe',category='agent',step=self.agent_step.step_number):
+            return self.observe_desktop(tool_result,action_names)
+
+    def observe_desktop(self,tool_result:ToolResult,action_names:list[str]=[])->DesktopState:
+        if self.use_vision!='auto':
+            return self.desktop.get_state(use_vision=self.use_vision)
+        desktop_state=self.desktop.get_state(use_vision=False)
+        decision=self.vision_policy.decide(desktop_state=desktop_state,tool_result=tool_result,action_names=action_names)
+        logger.info(colored(f"👁️: Vision: {'attached' if decision.use_vision else 'skipped'} ({decision.reason})",color='yellow'))
+        if decision.use_vision:
+            self.desktop.attach_screenshot(desktop_state)
+        return desktop_state
+
+    async def aobserve(self,tool_result:ToolResult,action_names:list[str]=[])->DesktopState:
+        # Walking the UI tree and capturing the screen block, so they run on the default executor
+        return await asyncio.to_thread(self.observe,tool_result,action_names)
+
+    def failure_frames(self,since:float)->list[str]:
+        # Pre-action and post-action frames from the recorder, to show the model what the failed action did
+        recorder=self.desktop.recorder
+        if recorder is None or not recorder.is_running():
+            return []
+        frames=[frame for frame in recorder.frame_pair(since) if frame is not None]
+        if frames:
+            logger.info(f"Attached {len(frames)} recorded frames to the failed action.")
+        return [self.desktop.screenshot_in_bytes(frame.image) for frame in frames]
 
     def answer(self):
-        self.agent_state.messages.pop()  # Remove the last message to avoid duplication
-        last_message = self.agent_state.messages[-1]
-        if isinstance(last_message, HumanMessage):
-            self.agent_state.messages[-1]=HumanMessage(content=Prompt.previous_observation_prompt(self.agent_state.previous_observation))
+        self.start_answer()
         name = self.agent_state.agent_data.action.name
         params = self.agent_state.agent_data.action.params
         tool_result = self.registry.execute(tool_name=name, desktop=None, **params)
+        self.finish_answer(tool_result)
+
+    async def aanswer(self):
+        self.start_answer()
+        name = self.agent_state.agent_data.action.name
+        params = self.agent_state.agent_data.action.params
+        tool_result = await self.registry.aexecute(tool_name=name, desktop=None, **params)
+        self.finish_answer(tool_result)
+
+    def start_answer(self):
+        self.close_turn()
+
+    def close_turn(self):
+        self.agent_state.messages.pop() # Remove the last message to avoid duplication
+        if self.message_layout=='stable':
+            # The full observation is the volatile tail, its short form was already appended after the previous action
+            self.agent_state.messages.pop()
+            return
+        last_message = self.agent_state.messages[-1]
+        if isinstance(last_message, HumanMessage):
+            self.agent_state.messages[-1]=self.image_retention.previous_observation(last_message,Prompt.previous_observation_prompt(self.agent_state.previous_observation))
+
+    def finish_answer(self,tool_result:ToolResult):
         ai_message = AIMessage(content=Prompt.answer_prompt(agent_data=self.agent_state.agent_data, tool_result=tool_result))
         logger.info(colored(f"📜: Final Answer: {tool_result.content}",color='cyan',attrs=['bold']))
+        self.emit('answer',content=tool_result.content)
         self.agent_state.update_state(agent_data=None,observation=None,result=tool_result.content,messages=[ai_message])
 
-    def invoke(self,query: str):
+    def start_trajectory(self,query:str,desktop_state:DesktopState)->Trajectory|None:
+        '''Starts recording the run and returns a cached trajectory for the query, if there is one.'''
+        if self.trajectory_store is None:
+            self.trajectory=None
+            return None
+        self.trajectory=Trajectory(query=query,app_name=app_name(desktop_state))
+        return self.trajectory_store.find(query,self.trajectory.app_name)
+
+    def replay(self,trajectory:Trajectory)->tuple[bool,str]:
+        '''Replays a cached trajectory, checking each step against a fresh observation. Returns whether it completed and a report for the LLM if it did not.'''
+        logger.info(f"Replaying a cached trajectory of {len(trajectory.steps)} steps.")
+        for number,step in enumerate(trajectory.steps,start=1):
+            try:
+                desktop_state=self.desktop.get_state(use_vision=False)
+                action,reason=resolve_step(step,desktop_state)
+                if action is not None:
+                    tool_result=self.execute_action(action)
+                    if tool_result.is_success:
+                        continue
+                    reason=tool_result.error
+            except Exception as error:
+                reason=str(error)
+            logger.info(f"Replay stopped at step {number}: {reason}, falling back to reasoning.")
+            self.trajectory_store.record_failure(trajectory)
+            return False,f'Replayed {number-1} of {len(trajectory.steps)} steps of a previous run of this task, step {number} ({step.action.name}) failed: {reason}. Continue the task from the current state.'
+        self.trajectory_store.record_hit(trajectory)
+        logger.info(colored(f"📜: Final Answer: {trajectory.answer}",color='cyan',attrs=['bold']))
+        return True,''
+
+    def run_replay(self,trajectory:Trajectory)->tuple[AgentResult|None,str]:
+        '''Replays a cached trajectory as a session of its own, ended like `run` ends one unless reasoning takes over from a failed replay.'''
+        fallback=False
+        try:
+            replayed,report=self.replay(trajectory)
+            if replayed:
+                return AgentResult(is_done=True, content=trajectory.answer, error=None),''
+            fallback=True
+            return None,report
+        except Exception as error:
+            return AgentResult(is_done=False, content=None, error=str(error)),''
+        finally:
+            if not fallback:
+                self.end_session()
+
+    def save_trajectory(self):
+        if self.trajectory is None:
+            return
+        self.trajectory.answer=self.agent_state.result
+        self.trajectory_store.save(self.trajectory)
+
+    def start_session(self,query:str,desktop_state:DesktopState,tool_result:ToolResult):
         max_steps = self.agent_step.max_steps
-        tools_prompt = self.registry.get_tools_prompt()
-        desktop_state = self.desktop.get_state(use_vision=self.use_vision)
-        prompt=Prompt.observation_prompt(query=query,agent_step=self.agent_step, tool_result=ToolResult(is_success=True, content="No Action"), desktop_state=desktop_state)
-        system_message=SystemMessage(content=Prompt.system_prompt(browser=self.browser,instructions=self.instructions,tools_prompt=tools_prompt,max_steps=max_steps))
+        # Bound tools carry their own schemas, so the system prompt does not repeat them
+        tools_prompt = TOOLS_CALLING_PROMPT if self.action_mode=='tools' else self.registry.get_tools_prompt()
+        stable=self.message_layout=='stable'
+        prompt=self.observation_prompt(query=query,tool_result=tool_result,desktop_state=desktop_state)
+        system_message=SystemMessage(content=Prompt.system_prompt(browser=self.browser,instructions=self.instructions,tools_prompt=tools_prompt,max_steps=max_steps,stable=stable,action_mode=self.action_mode))
         human_message=image_message(prompt=prompt,image=desktop_state.screenshot) if self.use_vision and desktop_state.screenshot else HumanMessage(content=prompt)
-        messages=[system_message,human_message]
+        if stable:
+            # The task opens the stable part of the conversation, the full observation is always the last message
+            messages=[system_message,HumanMessage(content=Prompt.task_prompt(query)),human_message]
+        else:
+            messages=[system_message,human_message]
         self.agent_state.init_state(query=query,messages=messages)
+        self.agent_step.reset()
+        self.history.reset()
+        self.image_retention.reset()
+        self.prefix_cache.reset()
+        # The observation the session starts from was decided on before, it is the first step of this run
+        self.vision_policy.reset(keep=1)
+        if self.router is not None:
+            self.router.reset()
+
+    def check_limits(self)->AgentResult|None:
+        if self.stop_event.is_set():
+            self.watch_cursor.stop()
+            logger.info("Run cancelled, stopping execution.")
+            return AgentResult(is_done=False, content=None, error="Cancelled.")
+        elif self.agent_step.is_last_step():
+            self.watch_cursor.stop()
+            logger.info("Reached maximum number of steps, stopping execution.")
+            return AgentResult(is_done=False, content=None, error="Maximum steps reached.")
+        elif self.agent_state.consecutive_failures==self.consecutive_failures:
+            self.watch_cursor.stop()
+            logger.info("Consecutive failures exceeded limit, stopping execution.")
+            return AgentResult(is_done=False, content=None, error=self.agent_state.error)
+        return None
+
+    def record_failure(self,err:Exception):
+        self.agent_state.consecutive_failures += 1
+        self.agent_state.error = str(err)
+        logger.error(f"Error: {self.agent_state.error}")
+        self.emit('error',error=self.agent_state.error)
+
+    def emit(self,kind:str,**data):
+        if self.event_handler is not None:
+            self.event_handler(kind,{'step':self.agent_step.step_number}|data)
+
+    def cancel(self):
+        '''Stops the current run before its next step, a step already under way finishes first.'''
+        self.stop_event.set()
+
+    def end_session(self):
+        self.stop_event.clear()
+        self.watch_cursor.stop()
+        self.desktop.stop_recorder()
+        if self.use_vision=='auto':
+            logger.info(self.vision_policy.summary())
+        if self.prefix_cache.requests:
+            logger.info(self.prefix_cache.summary())
+        if self.router is not None:
+            logger.info(self.router.summary())
+        if self.use_vision:
+            stats=self.image_retention.stats(self.agent_state.messages)
+            logger.info(f"Screenshots: {stats.retained_images} retained ({stats.retained_bytes} bytes), {stats.evicted_images} evicted ({stats.evicted_bytes} bytes).")
+        if self.tracer.enabled and self.tracer.spans:
+            logger.info(f"Timings:\n{self.tracer.summary_to_string()}")
+            if self.tracer.output_dir is not None:
+                logger.info(f"Trace written to {self.tracer.export()}.")
+
+    def invoke(self,query: str):
+        self.tracer.reset()
+        tool_result=ToolResult(is_success=True, content="No Action")
+        desktop_state = self.observe(tool_result=tool_result)
+        trajectory=self.start_trajectory(query,desktop_state)
+        if trajectory is not None:
+            result,report=self.run_replay(trajectory)
+            if result is not None:
+                return result
+            tool_result=ToolResult(is_success=True, content=report)
+            desktop_state = self.observe(tool_result=tool_result)
+        self.start_session(query,desktop_state,tool_result)
+        return self.run()
+
+    async def ainvoke(self,query: str):
+        '''
+        Runs the agent on the event loop: the LLM is awaited through `ainvoke`/`astream`, observations and
+        tools run on the default executor, so several agents can share one loop without a thread each.
+        '''
+        self.tracer.reset()
+        tool_result=ToolResult(is_success=True, content="No Action")
+        desktop_state = await self.aobserve(tool_result=tool_result)
+        trajectory=self.start_trajectory(query,desktop_state)
+        if trajectory is not None:
+            result,report=await asyncio.to_thread(self.run_replay,trajectory)
+            if result is not None:
+                return result
+            tool_result=ToolResult(is_success=True, content=report)
+            desktop_state = await self.aobserve(tool_result=tool_result)
+        self.start_session(query,desktop_state,tool_result)
+        return await self.arun()
+
+    def resume(self,run_id:str=None):
+        '''Continues a run from its last checkpoint, the latest one if no run is given, after observing the desktop again.'''
+        self.tracer.reset()
+        checkpoint=self.load_checkpoint(run_id)
+        if checkpoint is None:
+            return AgentResult(is_done=False, content=None, error="No checkpoint to resume from.")
+        tool_result=ToolResult(is_success=True, content="Resumed")
+        desktop_state = self.observe(tool_result=tool_result)
+        self.restore_session(checkpoint,desktop_state)
+        return self.run()
+
+    async def aresume(self,run_id:str=None):
+        self.tracer.reset()
+        checkpoint=await asyncio.to_thread(self.load_checkpoint,run_id)
+        if checkpoint is None:
+            return AgentResult(is_done=False, content=None, error="No checkpoint to resume from.")
+        tool_result=ToolResult(is_success=True, content="Resumed")
+        desktop_state = await self.aobserve(tool_result=tool_result)
+        self.restore_session(checkpoint,desktop_state)
+        return await self.arun()
+
+    def load_checkpoint(self,run_id:str=None)->Checkpoint|None:
+        if self.checkpoint_store is None:
+            raise ValueError("Resuming needs a checkpoint_store.")
+        return self.checkpoint_store.load(run_id)
+
+    def restore_session(self,checkpoint:Checkpoint,desktop_state:DesktopState):
+        self.checkpoint_store.restore(checkpoint,self.agent_state,self.agent_step,self.history)
+        self.trajectory=None
+        self.image_retention.reset()
+        self.prefix_cache.reset()
+        self.vision_policy.reset(keep=1)
+        if self.router is not None:
+            self.router.reset()
+        changed=observation_digest(desktop_state)!=checkpoint.observation_digest
+        logger.info(f"Resumed run {checkpoint.run_id} at step {checkpoint.step_number}, the desktop {'changed' if changed else 'is unchanged'} since the checkpoint.")
+        tool_result=ToolResult(is_success=True, content=f"Resumed from a checkpoint at step {checkpoint.step_number} after a restart, "
+            +("the desktop changed since then, check the current state before continuing." if changed else "the desktop is unchanged."))
+        prompt=self.observation_prompt(query=checkpoint.query,tool_result=tool_result,desktop_state=desktop_state)
+        # The checkpoint ends with the observation it was taken with, the fresh one takes its place
+        self.agent_state.messages[-1]=image_message(prompt=prompt,image=desktop_state.screenshot) if self.use_vision and desktop_state.screenshot else HumanMessage(content=prompt)
+
+    def save_checkpoint(self):
+        if self.checkpoint_store is None or not self.checkpoint_store.is_due(self.agent_step.step_number):
+            return
+        checkpoint=self.checkpoint_store.capture(self.agent_state,self.agent_step,self.history,self.desktop.desktop_state)
+        path=self.checkpoint_store.save(checkpoint)
+        logger.info(f"Checkpoint of step {checkpoint.step_number} written to {path}.")
+
+    def complete_run(self):
+        self.save_trajectory()
+        if self.checkpoint_store is not None:
+            self.checkpoint_store.delete(self.agent_state.id)
+        self.watch_cursor.stop()
+
+    def run(self)->AgentResult:
         try:
             self.watch_cursor.start()
+            self.desktop.start_recorder()
             while True:
-                if self.agent_step.is_last_step():
-                    self.watch_cursor.stop()
-                    logger.info("Reached maximum number of steps, stopping execution.")
-                    return AgentResult(is_done=False, content=None, error="Maximum steps reached.")
-                elif self.agent_state.consecutive_failures==self.consecutive_failures:
-                    self.watch_cursor.stop()
-                    logger.info("Consecutive failures exceeded limit, stopping execution.")
-                    return AgentResult(is_done=False, content=None, error=self.agent_state.error)
+                if (result:=self.check_limits()) is not None:
+                    return result
                 try:
                     self.reason()
                 except Exception as err:
-                    self.agent_state.consecutive_failures += 1
-                    self.agent_state.error = str(err)
-                    logger.error(f"Error: {self.agent_state.error}")
+                    self.record_failure(err)
                     continue
                 if self.agent_state.is_done():
                     self.answer()
-                    self.watch_cursor.stop()
+                    self.complete_run()
                     return AgentResult(is_done=True, content=self.agent_state.result, error=None)
                 else:
                     self.action()
                     self.agent_state.consecutive_failures = 0
                     self.agent_step.increment_step()
+                    self.save_checkpoint()
         except Exception as error:
             return AgentResult(is_done=False, content=None, error=str(error))
         finally:
-            self.watch_cursor.stop()
+            self.end_session()
+
+    async def arun(self)->AgentResult:
+        try:
+            self.watch_cursor.start()
+            self.desktop.start_recorder()
+            while True:
+                if (result:=self.check_limits()) is not None:
+                    return result
+                try:
+                    await self.areason()
+                except Exception as err:
+                    self.record_failure(err)
+                    continue
+                if self.agent_state.is_done():
+                    await self.aanswer()
+                    self.complete_run()
+                    return AgentResult(is_done=True, content=self.agent_state.result, error=None)
+                else:
+                    await self.aaction()
+                    self.agent_state.consecutive_failures = 0
+                    self.agent_step.increment_step()
+                    await asyncio.to_thread(self.save_checkpoint)
+        except Exception as error:
+            return AgentResult(is_done=False, content=None, error=str(error))
+        finally:
+            self.end_session()
 
     def print_response(self,query: str):
         console=Console()
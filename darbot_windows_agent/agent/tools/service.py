@@ -1,4 +1,4 @@
-from darbot_windows_agent.agent.tools.views import Click, Type, Launch, Scroll, Drag, Move, Shortcut, Key, Wait, Scrape,Done, Clipboard, Shell, Switch, Resize, GitHubCLI
+from darbot_windows_agent.agent.tools.views import Click, Type, Launch, Scroll, Drag, Move, Shortcut, Key, Wait, Scrape,Done, Clipboard, Shell, Switch, Resize, GitHubCLI, Screenshot
 from darbot_windows_agent.desktop import Desktop
 from humancursor import SystemCursor
 from markdownify import markdownify
@@ -170,6 +170,11 @@ def wait_tool(duration:int,desktop:Desktop=None)->str:
     pg.sleep(duration)
     return f'Waited for {duration} seconds.'
 
+@tool('Screenshot Tool',args_schema=Screenshot)
+def screenshot_tool(reason:str,desktop:Desktop=None)->str:
+    'Request a screenshot of the desktop with the next observation. Use when the listed elements are not enough to understand the screen.'
+    return 'A screenshot of the desktop is attached to this observation.'
+
 @tool('Scrape Tool',args_schema=Scrape)
 def scrape_tool(url:str,desktop:Desktop=None)->str:
     'Fetch and convert webpage content to markdown format. Provide full URL including protocol (http/https). Returns structured text content suitable for analysis.'
@@ -60,6 +60,9 @@ class Key(SharedBaseModel):
 class Wait(SharedBaseModel):
     duration:int=Field(...,description="The duration to wait in seconds.",examples=[5])
 
+class Screenshot(SharedBaseModel):
+    reason:str=Field(...,description="Why the screenshot is needed.",examples=['The canvas content is not in the accessibility tree'])
+
 class Scrape(SharedBaseModel):
     url:str=Field(...,description="The url of the webpage to scrape.",examples=['https://google.com'])
 
@@ -0,0 +1,102 @@
+from darbot_windows_agent.agent.trajectory.views import Trajectory, TrajectoryStep, ElementDescriptor
+from darbot_windows_agent.desktop.views import DesktopState
+from darbot_windows_agent.tree.views import TreeElementNode
+from darbot_windows_agent.agent.views import Action
+from pathlib import Path
+import threading
+import json
+import re
+
+def normalize_query(query:str)->str:
+    return re.sub(r'\s+',' ',query.strip().lower())
+
+def app_name(desktop_state:DesktopState)->str|None:
+    return desktop_state.active_app.name if desktop_state.active_app is not None else None
+
+def element_at(desktop_state:DesktopState,loc:tuple[int,int])->TreeElementNode|None:
+    # The element the action targeted is the interactive element whose box contains the location, nearest center first
+    x,y=loc
+    nodes=[node for node in desktop_state.tree_state.interactive_nodes
+        if node.bounding_box.left<=x<=node.bounding_box.right and node.bounding_box.top<=y<=node.bounding_box.bottom]
+    return min(nodes,key=lambda node:(node.center.x-x)**2+(node.center.y-y)**2,default=None)
+
+def describe_step(action:Action,desktop_state:DesktopState|None)->TrajectoryStep:
+    if desktop_state is None:
+        return TrajectoryStep(action=action)
+    node=element_at(desktop_state,action.params['loc']) if 'loc' in action.params else None
+    element=ElementDescriptor(name=node.name,control_type=node.control_type,app_name=node.app_name) if node is not None else None
+    return TrajectoryStep(action=action,app_name=app_name(desktop_state),element=element)
+
+def resolve_step(step:TrajectoryStep,desktop_state:DesktopState)->tuple[Action|None,str]:
+    '''
+    Checks a cached step against the current observation.
+
+    Returns the action to execute, with its location moved to where the element is now, or None and the reason the check failed.
+    '''
+    if step.app_name is not None and app_name(desktop_state)!=step.app_name:
+        return None,f'expected {step.app_name} in the foreground, found {app_name(desktop_state)}'
+    if step.element is None:
+        return step.action,''
+    for node in desktop_state.tree_state.interactive_nodes:
+        if node.name==step.element.name and node.control_type==step.element.control_type and node.app_name==step.element.app_name:
+            params=step.action.params|{'loc':(node.center.x,node.center.y)}
+            return Action(name=step.action.name,params=params),''
+    return None,f"element '{step.element.name}' ({step.element.control_type}) not found"
+
+class TrajectoryStore:
+    '''
+    Stores the action sequences of successful runs so repeated tasks can be replayed without the LLM.
+
+    Trajectories are keyed by the normalized query and the app in the foreground when the run started,
+    each step keeps the element it targeted so its location can be resolved again on replay.
+
+    Args:
+        path (str | Path): JSON file the trajectories are persisted to.
+        max_failures (int, optional): Number of failed replays in a row before a trajectory is dropped. Defaults to 3.
+    '''
+    def __init__(self,path:str|Path,max_failures:int=3):
+        self.path=Path(path)
+        self.max_failures=max_failures
+        self.lock=threading.Lock()
+        self.trajectories:dict[str,Trajectory]=self.load()
+
+    def load(self)->dict[str,Trajectory]:
+        if not self.path.exists():
+            return {}
+        data=json.loads(self.path.read_text(encoding='utf-8'))
+        return {key:Trajectory.model_validate(value) for key,value in data.items()}
+
+    def persist(self):
+        self.path.parent.mkdir(parents=True,exist_ok=True)
+        data={key:trajectory.model_dump(mode='json') for key,trajectory in self.trajectories.items()}
+        # Written to a temporary file first so a crash never leaves a truncated store behind
+        temporary=self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(data,indent=2),encoding='utf-8')
+        temporary.replace(self.path)
+
+    def key(self,query:str,app_name:str|None)->str:
+        return f'{app_name or ""}\n{normalize_query(query)}'
+
+    def find(self,query:str,app_name:str|None)->Trajectory|None:
+        with self.lock:
+            return self.trajectories.get(self.key(query,app_name)) or self.trajectories.get(self.key(query,None))
+
+    def save(self,trajectory:Trajectory):
+        if not trajectory.steps:
+            return
+        with self.lock:
+            self.trajectories[self.key(trajectory.query,trajectory.app_name)]=trajectory
+            self.persist()
+
+    def record_hit(self,trajectory:Trajectory):
+        with self.lock:
+            trajectory.hits+=1
+            trajectory.failures=0
+            self.persist()
+
+    def record_failure(self,trajectory:Trajectory):
+        with self.lock:
+            trajectory.failures+=1
+            if trajectory.failures>=self.max_failures:
+                self.trajectories.pop(self.key(trajectory.query,trajectory.app_name),None)
+            self.persist()
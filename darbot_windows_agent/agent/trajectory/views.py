@@ -0,0 +1,21 @@
+from darbot_windows_agent.agent.views import Action
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ElementDescriptor(BaseModel):
+    name: str
+    control_type: str
+    app_name: Optional[str]=None
+
+class TrajectoryStep(BaseModel):
+    action: Action
+    app_name: Optional[str]=None
+    element: Optional[ElementDescriptor]=None
+
+class Trajectory(BaseModel):
+    query: str
+    app_name: Optional[str]=None
+    steps: list[TrajectoryStep]=Field(default_factory=list)
+    answer: Optional[str]=None
+    hits: int=0
+    failures: int=0
@@ -1,5 +1,6 @@
 from langchain_core.messages import BaseMessage,HumanMessage
 from darbot_windows_agent.agent.views import AgentData
+from textwrap import shorten
 import ast
 import re
 
@@ -7,48 +8,199 @@ def read_file(file_path: str) -> str:
     with open(file_path, 'r') as file:
         return file.read()
     
-def extract_agent_data(message: BaseMessage) -> AgentData:
-    text = message.content
-    # Dictionary to store extracted values
-    result = {}
-    # Extract Memory
-    memory_match = re.search(r"<memory>(.*?)<\/memory>", text, re.DOTALL)
-    if memory_match:
-        result['memory'] = memory_match.group(1).strip()
-    # Extract Evaluate
-    evaluate_match = re.search(r"<evaluate>(.*?)<\/evaluate>", text, re.DOTALL)
-    if evaluate_match:
-        result['evaluate'] = evaluate_match.group(1).strip()
-    # Extract Thought
-    thought_match = re.search(r"<thought>(.*?)<\/thought>", text, re.DOTALL)
-    if thought_match:
-        result['thought'] = thought_match.group(1).strip()
-    # Extract Action-Name
-    action = {}
-    action_name_match = re.search(r"<action_name>(.*?)<\/action_name>", text, re.DOTALL)
-    if action_name_match:
-        action['name'] = action_name_match.group(1).strip()
-    # Extract and convert Action-Input to a dictionary
-    action_input_match = re.search(r"<action_input>(.*?)<\/action_input>", text, re.DOTALL)
-    if action_input_match:
-        action_input_str = action_input_match.group(1).strip()
+TAG_PATTERN=re.compile(r'<(/?)(output|evaluate|memory|thought|action_name|action_input)>')
+FENCE_PATTERN=re.compile(r'^```[\w-]*[ \t]*\n?(.*?)\n?[ \t]*```$',re.DOTALL)
+LITERALS={'true':'True','false':'False','null':'None'}
+CLOSERS={'{':'}','[':']','(':')'}
+
+class ParseError(ValueError):
+    '''Raised when the agent output cannot be parsed or repaired, the message names the part that is wrong.'''
+
+def scan_tags(text:str)->list[tuple[str,str]]:
+    '''
+    Splits the output into (tag, value) pairs in one pass.
+
+    A tag ends at its closing tag, tag-like text inside the value is kept. A tag left open, one whose closing
+    tag does not come before the next occurrence of the same tag, ends at the next opening tag, at
+    `<output>`/`</output>` or at the end of the text, closing tags of other tags are ignored.
+    '''
+    tags=[]
+    open_tag,start=None,0
+    match=TAG_PATTERN.search(text)
+    while match is not None:
+        closing,tag=match.group(1)=='/',match.group(2)
+        if open_tag is not None and (not closing or tag in (open_tag,'output')):
+            tags.append((open_tag,text[start:match.start()].strip()))
+            open_tag=None
+        if not closing and tag!='output':
+            open_tag,start=tag,match.end()
+            end,following=text.find(f'</{tag}>',start),text.find(f'<{tag}>',start)
+            if end!=-1 and (following==-1 or end<following):
+                tags.append((tag,text[start:end].strip()))
+                open_tag=None
+                match=TAG_PATTERN.search(text,end+len(tag)+3)
+                continue
+        match=TAG_PATTERN.search(text,match.end())
+    if open_tag is not None:
+        tags.append((open_tag,strip_fence(text[start:].strip().removesuffix('```').strip())))
+    return tags
+
+def strip_fence(text:str)->str:
+    match=FENCE_PATTERN.match(text)
+    return match.group(1).strip() if match else text
+
+def repair_literal(text:str)->str:
+    '''Maps JSON literals to Python outside of strings, adds missing outer braces and closes unbalanced brackets and quotes.'''
+    repaired,stack=[],[]
+    quote,index=None,0
+    while index<len(text):
+        char=text[index]
+        if quote is not None:
+            repaired.append(char)
+            if char=='\\':
+                repaired.append(text[index+1:index+2])
+                index+=1
+            elif char==quote:
+                quote=None
+        elif char in '"\'':
+            quote=char
+            repaired.append(char)
+        elif char.isalpha():
+            end=index
+            while end<len(text) and (text[end].isalnum() or text[end]=='_'):
+                end+=1
+            word=text[index:end]
+            repaired.append(LITERALS.get(word,word))
+            index=end
+            continue
+        else:
+            if char in CLOSERS:
+                stack.append(CLOSERS[char])
+            elif stack and char==stack[-1]:
+                stack.pop()
+            repaired.append(char)
+        index+=1
+    if quote is not None:
+        repaired.append(quote)
+    repaired.extend(reversed(stack))
+    repaired=''.join(repaired).strip()
+    if not repaired.startswith('{'):
+        repaired=f'{{{repaired}}}'
+    return repaired
+
+def parse_action_input(action_input: str, action_name: str = None) -> dict:
+    '''
+    Parses the action input as a Python or JSON dictionary literal.
+
+    Code fences, JSON literals (true/false/null), missing outer braces and unclosed brackets or quotes are
+    repaired locally. Raises ParseError with the position of the problem if the input is still not a dictionary.
+    '''
+    action_input_str = strip_fence(action_input.strip())
+    if action_input_str in ('','null','None'):
+        return {}
+    try:
+        value=ast.literal_eval(action_input_str)
+    except (ValueError, SyntaxError) as error:
         try:
-            # Convert string to dictionary safely using ast.literal_eval
-            action['params'] = ast.literal_eval(action_input_str)
+            value=ast.literal_eval(repair_literal(action_input_str))
         except (ValueError, SyntaxError):
-            # If there's an issue with conversion, store it as raw string
-            action['params'] = action_input_str
-    result['action'] = action
-    return  AgentData.model_validate(result)
+            # literal_eval raises ValueError for names and expressions, usually an unquoted string
+            reason=f'{error.msg} at line {error.lineno}, column {error.offset}' if isinstance(error,SyntaxError) else 'only literal values are allowed, quote every string'
+            raise ParseError(f"<action_input> of {action_name or 'the action'} is not a valid dictionary literal ({reason}): {shorten(action_input_str,200,placeholder='...')}") from error
+    if value is None:
+        return {}
+    if not isinstance(value,dict):
+        raise ParseError(f"<action_input> of {action_name or 'the action'} must be a dictionary of parameters, got {type(value).__name__}: {shorten(action_input_str,200,placeholder='...')}")
+    return value
 
-def image_message(prompt,image)->HumanMessage:
+def message_text(message: BaseMessage) -> str:
+    if isinstance(message.content,str):
+        return message.content
+    return '\n'.join(part.get('text','') for part in message.content if isinstance(part,dict) and part.get('type')=='text')
+
+def extract_agent_data(message: BaseMessage) -> AgentData:
+    '''
+    Parses the agent output in a single pass over its tags.
+
+    Tags may be left unclosed or wrapped in code fences. Every action_name is paired with the action_input
+    that follows it, a batch is several pairs in order and the first one is also the action. Native tool
+    calls on the message take the place of the action tags, their arguments are repaired the same way
+    when the provider could not parse them.
+    '''
+    result = {}
+    names, inputs = [], []
+    for tag, value in scan_tags(message_text(message)):
+        if tag == 'action_name':
+            names.append(value)
+            inputs.append('')
+        elif tag == 'action_input':
+            if not names or inputs[-1]:
+                raise ParseError('Found an <action_input> without an <action_name> before it.')
+            inputs[-1] = value
+        elif tag not in result:
+            result[tag] = value
+    tool_calls = getattr(message, 'tool_calls', None) or []
+    invalid_tool_calls = getattr(message, 'invalid_tool_calls', None) or []
+    if tool_calls or invalid_tool_calls:
+        actions = [{'name': call['name'], 'params': call['args'] or {}, 'id': call.get('id')} for call in tool_calls]
+        actions += [{'name': call['name'], 'params': parse_action_input(call['args'] or '', call['name']), 'id': call.get('id')} for call in invalid_tool_calls]
+        result['action'] = actions[0]
+        if len(actions) > 1:
+            result['actions'] = actions
+        return AgentData.model_validate(result)
+    if not names:
+        raise ParseError('The response has no <action_name>, every response has to end with <action_name> and <action_input>.')
+    if not all(names):
+        raise ParseError('The response has an empty <action_name>.')
+    actions = [{'name': name, 'params': parse_action_input(params, name)} for name, params in zip(names, inputs)]
+    result['action'] = actions[0]
+    if len(actions) > 1:
+        result['actions'] = actions
+    return AgentData.model_validate(result)
+
+class AgentDataParser:
+    '''
+    Incrementally parses a streamed response, each tag becomes available as soon as its closing tag arrives.
+    '''
+    TAGS=('evaluate','memory','thought','action_name','action_input')
+
+    def __init__(self,max_actions:int=1):
+        self.max_actions=max_actions
+        self.text=''
+        self.values:dict[str,str]={}
+
+    def feed(self,chunk:str)->list[str]:
+        '''Appends a chunk and returns the tags that were closed by it.'''
+        # Only the tail that could contain a closing tag split across chunks has to be rescanned
+        start=max(len(self.text)-len('</action_input>'),0)
+        self.text+=chunk
+        closed=[]
+        for tag in self.TAGS:
+            if tag in self.values or self.text.find(f'</{tag}>',start)==-1:
+                continue
+            match=re.search(rf"<{tag}>(.*?)<\/{tag}>",self.text,re.DOTALL)
+            if match:
+                self.values[tag]=match.group(1).strip()
+                closed.append(tag)
+        return closed
+
+    def get(self,tag:str)->str|None:
+        return self.values.get(tag)
+
+    def is_action_ready(self)->bool:
+        if 'action_name' not in self.values or 'action_input' not in self.values:
+            return False
+        # A batch is complete once the output closes or the maximum number of actions arrived
+        return self.max_actions==1 or '</output>' in self.text or self.text.count('</action_input>')>=self.max_actions
+
+def image_message(prompt,image,*images)->HumanMessage:
     return HumanMessage(content=[
         {
             "type": "text",
             "text": prompt,
         },
-        {
+        *[{
             "type": "image_url", 
             "image_url": image
-        },
+        } for image in (image,*images)],
     ])
\ No newline at end of file
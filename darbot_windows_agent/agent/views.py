@@ -12,15 +12,24 @@ class AgentState(BaseModel):
     messages: list[BaseMessage] =  Field(default_factory=list)
     previous_observation: str = None
     query:str=None
+    summary_memory: str = ''
+    summary_steps: list[str] = Field(default_factory=list)
 
     def is_done(self):
         return self.agent_data is not None and self.agent_data.action.name == 'Done Tool'
 
     def init_state(self,query: str, messages: list[BaseMessage]):
+        # Every run gets its own id, a resumed run takes the id of its checkpoint back afterwards
+        self.id=str(uuid4())
         self.query=query
         self.consecutive_failures = 0
         self.result = ""
+        self.error = ''
+        self.agent_data = None
+        self.previous_observation = None
         self.messages = messages
+        self.summary_memory = ''
+        self.summary_steps = []
 
     def update_state(self, agent_data: 'AgentData' = None, observation: str = None, result: str = None, messages: list[BaseMessage] = None):
         self.result = result
@@ -37,6 +46,9 @@ class AgentStep(BaseModel):
     
     def increment_step(self):
         self.step_number += 1
+
+    def reset(self):
+        self.step_number = 0
     
 class AgentResult(BaseModel):
     is_done:bool|None=False
@@ -46,9 +58,11 @@ class AgentResult(BaseModel):
 class Action(BaseModel):
     name:str
     params: dict
+    id: Optional[str]=None
 
 class AgentData(BaseModel):
     evaluate: Optional[str]=None
     memory: Optional[str]=None
     thought: Optional[str]=None
     action: Optional[Action]=None
+    actions: list[Action]=Field(default_factory=list)
@@ -0,0 +1,6 @@
+from typing import Set
+
+# Apps that draw their content on a canvas, the accessibility tree says little about what is on screen
+CANVAS_APP_NAMES:Set[str]=set([
+    'paint','photoshop','gimp','figma','blender','inkscape','whiteboard','canva','krita','unity','remote desktop','vmware','virtualbox'
+])
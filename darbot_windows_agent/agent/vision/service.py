@@ -0,0 +1,51 @@
+from darbot_windows_agent.agent.vision.config import CANVAS_APP_NAMES
+from darbot_windows_agent.agent.vision.views import VisionDecision
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.desktop.views import DesktopState
+
+class VisionPolicy:
+    '''
+    Decides per step whether a screenshot should be attached to the observation.
+
+    Args:
+        min_interactive_elements (int, optional): Below this many interactive elements the tree is considered sparse. Defaults to 5.
+        max_unnamed_ratio (float, optional): Above this share of unnamed interactive elements the tree is considered unhelpful. Defaults to 0.5.
+        canvas_apps (set[str], optional): Name fragments of canvas based apps. Defaults to CANVAS_APP_NAMES.
+    '''
+    def __init__(self,min_interactive_elements:int=5,max_unnamed_ratio:float=0.5,canvas_apps:set[str]=CANVAS_APP_NAMES):
+        self.min_interactive_elements=min_interactive_elements
+        self.max_unnamed_ratio=max_unnamed_ratio
+        self.canvas_apps=canvas_apps
+        self.decisions:list[VisionDecision]=[]
+
+    def reset(self,keep:int=0):
+        '''Forgets the decisions of earlier runs, except for the last `keep` ones.'''
+        self.decisions=self.decisions[-keep:] if keep else []
+
+    def decide(self,desktop_state:DesktopState,tool_result:ToolResult,action_names:list[str]=[])->VisionDecision:
+        decision=self.evaluate(desktop_state=desktop_state,tool_result=tool_result,action_names=action_names)
+        self.decisions.append(decision)
+        return decision
+
+    def evaluate(self,desktop_state:DesktopState,tool_result:ToolResult,action_names:list[str]=[])->VisionDecision:
+        # Any action of the batch can ask for a screenshot, not only the last one
+        if 'Screenshot Tool' in action_names:
+            return VisionDecision(use_vision=True,reason='requested by the agent')
+        if not tool_result.is_success:
+            return VisionDecision(use_vision=True,reason='previous action failed')
+        active_app=desktop_state.active_app
+        if active_app is not None:
+            app_name=active_app.name.lower()
+            if any(canvas_app in app_name for canvas_app in self.canvas_apps):
+                return VisionDecision(use_vision=True,reason=f'{active_app.name} is canvas based')
+        nodes=desktop_state.tree_state.interactive_nodes
+        if len(nodes)<self.min_interactive_elements:
+            return VisionDecision(use_vision=True,reason=f'sparse accessibility tree ({len(nodes)} interactive elements)')
+        unnamed=sum(1 for node in nodes if node.name=="''")
+        if nodes and unnamed/len(nodes)>self.max_unnamed_ratio:
+            return VisionDecision(use_vision=True,reason=f'{unnamed} of {len(nodes)} interactive elements are unnamed')
+        return VisionDecision(use_vision=False,reason='accessibility tree is sufficient')
+
+    def summary(self)->str:
+        attached=sum(1 for decision in self.decisions if decision.use_vision)
+        return f'Screenshots attached on {attached} of {len(self.decisions)} steps.'
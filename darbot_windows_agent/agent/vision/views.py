@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class VisionDecision(BaseModel):
+    use_vision: bool
+    reason: str
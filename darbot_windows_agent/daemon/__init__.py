@@ -0,0 +1,18 @@
+from importlib import import_module
+
+# The daemon side imports the agent and its providers, the client must stay cheap to import for the
+# schedulers that only submit tasks, so the names are resolved on first use
+EXPORTS = {
+    'AgentDaemon': 'darbot_windows_agent.daemon.service',
+    'Task': 'darbot_windows_agent.daemon.service',
+    'DaemonServer': 'darbot_windows_agent.daemon.server',
+    'DaemonClient': 'darbot_windows_agent.daemon.client',
+    'DaemonError': 'darbot_windows_agent.daemon.client'
+}
+
+__all__ = list(EXPORTS)
+
+def __getattr__(name: str):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(EXPORTS[name]), name)
@@ -0,0 +1,64 @@
+"""
+Run the agent as a resident daemon with a local HTTP API.
+
+Usage:
+    python -m darbot_windows_agent.daemon --model gemini-2.0-flash [--port 8765] [--browser edge] [--token SECRET]
+
+The token can also come from DARBOT_DAEMON_TOKEN, without one a token is generated and written to ~/.darbot/daemon.token,
+where DaemonClient picks it up. Tasks are then submitted with DaemonClient or any HTTP client that sends the token:
+    curl -X POST http://127.0.0.1:8765/tasks -H "Authorization: Bearer $(cat ~/.darbot/daemon.token)" -H "Content-Type: application/json" -d '{"query": "Open notepad"}'
+    curl http://127.0.0.1:8765/tasks/<id>/events -H "Authorization: Bearer $(cat ~/.darbot/daemon.token)"
+"""
+import argparse
+import os
+import sys
+
+# Handle optional dotenv import
+try:
+    from dotenv import load_dotenv
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the agent warm and accept tasks over a local HTTP API')
+    parser.add_argument('--model', default='gemini-2.0-flash', help='Model id from the model selector')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--browser', choices=['edge', 'chrome', 'firefox'], default='edge')
+    parser.add_argument('--max-steps', type=int, default=100)
+    parser.add_argument('--max-queue', type=int, default=100)
+    parser.add_argument('--token', default=os.getenv('DARBOT_DAEMON_TOKEN'), help='Shared secret the clients have to send, generated if not given')
+    args = parser.parse_args()
+
+    if DOTENV_AVAILABLE:
+        load_dotenv()
+
+    from darbot_windows_agent.agent import Agent
+    from darbot_windows_agent.github.models import ModelSelector
+    from darbot_windows_agent.daemon.service import AgentDaemon
+    from darbot_windows_agent.daemon.server import DaemonServer
+
+    # Everything a run needs is built once here, GitHub auth is probed once by the model selector
+    model_selector = ModelSelector()
+    llm = model_selector.create_llm(args.model)
+    if llm is None:
+        print(f"❌ Model '{args.model}' is not available: {model_selector.get_model_info(args.model) or 'unknown model'}")
+        sys.exit(1)
+    agent = Agent(llm=llm, browser=args.browser, max_steps=args.max_steps, model_selector=model_selector)
+    daemon = AgentDaemon(agent, max_queue=args.max_queue)
+    server = DaemonServer(daemon, host=args.host, port=args.port, token=args.token)
+    daemon.start()
+    print(f"🤖 Darbot Windows Agent daemon listening on {server.url}")
+    if server.token_file is not None:
+        print(f"🔑 Token written to {server.token_file}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping the daemon...")
+    finally:
+        server.server_close()
+        daemon.stop(timeout=5.0)
+
+if __name__ == '__main__':
+    main()
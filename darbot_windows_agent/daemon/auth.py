@@ -0,0 +1,27 @@
+from pathlib import Path
+import secrets
+import os
+
+# The daemon writes the token it generates here, the client reads it from here when it is not given one
+TOKEN_FILE=Path.home()/'.darbot'/'daemon.token'
+
+def generate_token()->str:
+    return secrets.token_urlsafe(32)
+
+def write_token(token:str,path:Path=TOKEN_FILE)->Path:
+    '''Writes the token to a file only the current user can read, on Windows the profile directory is already private to the user.'''
+    path=Path(path)
+    path.parent.mkdir(parents=True,exist_ok=True)
+    # Created with the restricted mode instead of tightened afterwards, so it is never readable by others
+    fd=os.open(path,os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o600)
+    with os.fdopen(fd,'w',encoding='utf-8') as file:
+        file.write(token)
+    # An existing file keeps its mode on open, so it is restricted again
+    os.chmod(path,0o600)
+    return path
+
+def read_token(path:Path=TOKEN_FILE)->str|None:
+    try:
+        return Path(path).read_text(encoding='utf-8').strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,69 @@
+from darbot_windows_agent.daemon.auth import TOKEN_FILE, read_token
+from typing import Iterator
+from pathlib import Path
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+import json
+
+class DaemonError(RuntimeError):
+    '''Raised when the daemon answers a request with an error.'''
+    def __init__(self,status:int,message:str):
+        super().__init__(f'{status}: {message}')
+        self.status=status
+
+class DaemonClient:
+    '''
+    A client for the local daemon API that only needs the standard library, so submitting a task stays cheap.
+
+    Args:
+        url (str, optional): Address of the daemon. Defaults to 'http://127.0.0.1:8765'.
+        token (str, optional): Shared secret of the daemon, read from `token_file` if not given. Defaults to None.
+        timeout (float, optional): Seconds to wait for a response. Defaults to 30.0.
+        token_file (Path, optional): Where the daemon wrote the token it generated. Defaults to ~/.darbot/daemon.token.
+    '''
+    def __init__(self,url:str='http://127.0.0.1:8765',token:str|None=None,timeout:float=30.0,token_file:Path|None=TOKEN_FILE):
+        self.url=url.rstrip('/')
+        self.token=token if token is not None or token_file is None else read_token(token_file)
+        self.timeout=timeout
+
+    def request(self,method:str,path:str,data:dict=None):
+        headers={'Content-Type':'application/json'}
+        if self.token is not None:
+            headers['Authorization']=f'Bearer {self.token}'
+        body=json.dumps(data).encode('utf-8') if data is not None else None
+        request=Request(f'{self.url}{path}',data=body,headers=headers,method=method)
+        try:
+            return urlopen(request,timeout=self.timeout)
+        except HTTPError as error:
+            message=json.loads(error.read() or b'{}').get('error',error.reason)
+            raise DaemonError(error.code,message) from None
+
+    def call(self,method:str,path:str,data:dict=None)->dict:
+        with self.request(method,path,data) as response:
+            return json.loads(response.read())
+
+    def health(self)->dict:
+        return self.call('GET','/health')
+
+    def submit(self,query:str)->dict:
+        return self.call('POST','/tasks',{'query':query})
+
+    def status(self,task_id:str)->dict:
+        return self.call('GET',f'/tasks/{task_id}')
+
+    def cancel(self,task_id:str)->dict:
+        return self.call('POST',f'/tasks/{task_id}/cancel')
+
+    def events(self,task_id:str,after:int=0)->Iterator[dict]:
+        '''Yields the step events of a task as they happen, ending with its final status.'''
+        with self.request('GET',f'/tasks/{task_id}/events?after={after}') as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def run(self,query:str)->dict:
+        '''Submits a task and waits for it, returns its final status.'''
+        task=self.submit(query)
+        for _ in self.events(task['id']):
+            pass
+        return self.status(task['id'])
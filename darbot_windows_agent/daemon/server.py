@@ -0,0 +1,155 @@
+from darbot_windows_agent.daemon.auth import TOKEN_FILE, generate_token, write_token
+from darbot_windows_agent.daemon.service import AgentDaemon
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from pathlib import Path
+import hmac
+import json
+import queue
+import re
+
+TASK_PATH=re.compile(r'^/tasks/([0-9a-f]+)(/events|/cancel)?$')
+
+class DaemonServer(ThreadingHTTPServer):
+    '''
+    A local HTTP API for an AgentDaemon.
+
+    `POST /tasks` with `{"query": ...}` queues a task, `GET /tasks/<id>` returns its status, `GET /tasks/<id>/events`
+    streams its step events as JSON lines until it finishes (`?after=N` skips the first N events), `POST /tasks/<id>/cancel`
+    cancels it and `GET /health` reports the queue.
+
+    Tasks drive the desktop and the shell, so every request needs an `Authorization: Bearer <token>` header. Requests from
+    browsers are refused as well: POST bodies must be sent as `application/json` (which a page can not do without a CORS
+    preflight), requests with an `Origin` header are rejected and so is any `Host` other than the bound address, which
+    keeps DNS rebinding pages from reading the API.
+
+    Args:
+        daemon (AgentDaemon): The daemon the requests are served from.
+        host (str, optional): Address to listen on, keep it local since tasks drive the desktop. Defaults to '127.0.0.1'.
+        port (int, optional): Port to listen on, 0 picks a free one. Defaults to 8765.
+        token (str, optional): Shared secret the clients have to send, one is generated and written to `token_file` if not given. Defaults to None.
+        token_file (Path, optional): Where a generated token is written for the clients. Defaults to ~/.darbot/daemon.token.
+    '''
+    daemon_threads=True
+
+    def __init__(self,daemon:AgentDaemon,host:str='127.0.0.1',port:int=8765,token:str|None=None,token_file:Path=TOKEN_FILE):
+        self.agent_daemon=daemon
+        self.token_file=None
+        if token is None:
+            token=generate_token()
+            self.token_file=write_token(token,token_file)
+        self.token=token
+        super().__init__((host,port),DaemonRequestHandler)
+        host,port=self.server_address[:2]
+        self.allowed_hosts={f'{host}:{port}'}|({f'localhost:{port}'} if host=='127.0.0.1' else set())
+
+    @property
+    def url(self)->str:
+        host,port=self.server_address[:2]
+        return f'http://{host}:{port}'
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    server:DaemonServer
+    protocol_version='HTTP/1.1'
+
+    def log_message(self,format,*args):
+        # Requests are frequent and uninteresting, the agent logs the runs themselves
+        pass
+
+    def send_json(self,status:int,data:dict):
+        body=json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reject(self,status:int,error:str)->bool:
+        # The body of a rejected request is never read, so the connection can not be reused
+        self.close_connection=True
+        self.send_json(status,{'error':error})
+        return False
+
+    def authorized(self,has_body:bool=False)->bool:
+        if self.headers.get('Host') not in self.server.allowed_hosts:
+            return self.reject(403,'Unexpected Host header.')
+        if self.headers.get('Origin') is not None:
+            return self.reject(403,'Requests from browsers are not allowed.')
+        expected=f'Bearer {self.server.token}'
+        if not hmac.compare_digest(self.headers.get('Authorization','').encode('utf-8'),expected.encode('utf-8')):
+            return self.reject(401,'Unauthorized.')
+        content_type=self.headers.get('Content-Type','').split(';')[0].strip().lower()
+        if has_body and content_type!='application/json':
+            return self.reject(415,'Expected Content-Type: application/json.')
+        return True
+
+    def read_json(self)->dict|None:
+        length=int(self.headers.get('Content-Length') or 0)
+        try:
+            data=json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            return None
+        return data if isinstance(data,dict) else None
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url=urlsplit(self.path)
+        if url.path=='/health':
+            return self.send_json(200,{'status':'ok'}|self.server.agent_daemon.stats())
+        match=TASK_PATH.match(url.path)
+        if match is None or match.group(2)=='/cancel':
+            return self.send_json(404,{'error':'Not found.'})
+        task=self.server.agent_daemon.get(match.group(1))
+        if task is None:
+            return self.send_json(404,{'error':f'Task {match.group(1)} not found.'})
+        if match.group(2) is None:
+            return self.send_json(200,task.to_dict())
+        after=int(parse_qs(url.query).get('after',['0'])[0])
+        self.stream_events(task,after)
+
+    def stream_events(self,task,after:int):
+        self.send_response(200)
+        self.send_header('Content-Type','application/x-ndjson')
+        self.send_header('Transfer-Encoding','chunked')
+        self.end_headers()
+        try:
+            while True:
+                events=task.wait_events(after,timeout=15.0)
+                # An empty line keeps idle connections alive between slow steps
+                lines=''.join(json.dumps(event)+'\n' for event in events) or '\n'
+                self.write_chunk(lines.encode('utf-8'))
+                after+=len(events)
+                if task.is_finished and after>=len(task.events):
+                    break
+            self.write_chunk(b'')
+        except (BrokenPipeError,ConnectionResetError):
+            # The client stopped following the task, the task itself goes on
+            self.close_connection=True
+
+    def write_chunk(self,data:bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii')+data+b'\r\n')
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.authorized(has_body=True):
+            return
+        url=urlsplit(self.path)
+        daemon=self.server.agent_daemon
+        if url.path=='/tasks':
+            data=self.read_json()
+            query=data.get('query') if data is not None else None
+            if not isinstance(query,str) or not query.strip():
+                return self.send_json(400,{'error':'Expected a JSON body with a non-empty "query".'})
+            try:
+                task=daemon.submit(query)
+            except queue.Full:
+                return self.send_json(503,{'error':'The task queue is full.'})
+            return self.send_json(202,task.to_dict())
+        match=TASK_PATH.match(url.path)
+        if match is None or match.group(2)!='/cancel':
+            return self.send_json(404,{'error':'Not found.'})
+        task=daemon.cancel(match.group(1))
+        if task is None:
+            return self.send_json(404,{'error':f'Task {match.group(1)} not found.'})
+        self.send_json(202,task.to_dict())
@@ -0,0 +1,172 @@
+from darbot_windows_agent.agent.service import Agent, logger
+from darbot_windows_agent.agent.views import AgentResult
+from dataclasses import dataclass, field
+from typing import Literal
+from collections import OrderedDict
+from time import time
+from uuid import uuid4
+import threading
+import queue
+
+TaskStatus=Literal['queued','running','done','failed','cancelled']
+
+@dataclass
+class Task:
+    query:str
+    id:str=field(default_factory=lambda: uuid4().hex)
+    status:TaskStatus='queued'
+    content:str|None=None
+    error:str|None=None
+    events:list[dict]=field(default_factory=list)
+    created_at:float=field(default_factory=time)
+    started_at:float|None=None
+    finished_at:float|None=None
+    condition:threading.Condition=field(default_factory=threading.Condition,repr=False)
+
+    @property
+    def is_finished(self)->bool:
+        return self.status in ('done','failed','cancelled')
+
+    def add_event(self,kind:str,data:dict):
+        with self.condition:
+            self.events.append({'seq':len(self.events),'kind':kind,'time':time()}|data)
+            self.condition.notify_all()
+
+    def start(self):
+        with self.condition:
+            self.status='running'
+            self.started_at=time()
+            self.events.append({'seq':len(self.events),'kind':'status','time':self.started_at,'status':'running'})
+            self.condition.notify_all()
+
+    def finish(self,status:TaskStatus,content:str|None=None,error:str|None=None):
+        with self.condition:
+            self.status=status
+            self.content=content
+            self.error=error
+            self.finished_at=time()
+            self.events.append({'seq':len(self.events),'kind':'status','time':self.finished_at,'status':status,'content':content,'error':error})
+            self.condition.notify_all()
+
+    def wait_events(self,after:int=0,timeout:float|None=None)->list[dict]:
+        '''Returns the events from index `after` on, waiting up to timeout seconds for one if there are none yet.'''
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events)>after or self.is_finished,timeout=timeout)
+            return self.events[after:]
+
+    def to_dict(self)->dict:
+        return {'id':self.id,'query':self.query,'status':self.status,'content':self.content,'error':self.error,
+            'events':len(self.events),'created_at':self.created_at,'started_at':self.started_at,'finished_at':self.finished_at}
+
+class AgentDaemon:
+    '''
+    Keeps one agent warm and runs the tasks submitted to it one after another.
+
+    The agent, its desktop, registry, model and cursor watcher are built once, so a task only pays for its
+    own steps. Tasks run in order on a single worker thread since they share one desktop, every step
+    event of the running task is recorded on it for the clients that follow it.
+
+    Args:
+        agent (Agent): The agent that runs the tasks.
+        max_queue (int, optional): Tasks that may wait before submitting is refused. Defaults to 100.
+        keep_finished (int, optional): Finished tasks kept for their status and events. Defaults to 100.
+    '''
+    def __init__(self,agent:Agent,max_queue:int=100,keep_finished:int=100):
+        self.agent=agent
+        self.agent.event_handler=self.on_event
+        self.keep_finished=keep_finished
+        self.queue:queue.Queue[Task|None]=queue.Queue(maxsize=max_queue)
+        self.tasks:OrderedDict[str,Task]=OrderedDict()
+        self.lock=threading.Lock()
+        self.current:Task|None=None
+        self.worker:threading.Thread|None=None
+
+    def start(self):
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.worker=threading.Thread(target=self.work,name='AgentDaemon',daemon=True)
+        self.worker.start()
+
+    def stop(self,timeout:float|None=None):
+        '''Cancels the running task, drops the queued ones and stops the worker.'''
+        with self.lock:
+            tasks=[task for task in self.tasks.values() if not task.is_finished]
+        for task in tasks:
+            self.cancel(task.id)
+        if self.worker is not None:
+            self.queue.put(None)
+            self.worker.join(timeout)
+            self.worker=None
+
+    def submit(self,query:str)->Task:
+        task=Task(query=query)
+        with self.lock:
+            self.tasks[task.id]=task
+            self.prune()
+        try:
+            self.queue.put_nowait(task)
+        except queue.Full:
+            with self.lock:
+                self.tasks.pop(task.id,None)
+            raise
+        return task
+
+    def get(self,task_id:str)->Task|None:
+        with self.lock:
+            return self.tasks.get(task_id)
+
+    def cancel(self,task_id:str)->Task|None:
+        with self.lock:
+            task=self.tasks.get(task_id)
+            if task is None or task.is_finished:
+                return task
+            if task is self.current:
+                self.agent.cancel()
+            else:
+                # A queued task is skipped by the worker once it comes up
+                task.finish('cancelled',error='Cancelled.')
+            return task
+
+    def stats(self)->dict:
+        with self.lock:
+            queued=sum(1 for task in self.tasks.values() if task.status=='queued')
+            return {'queued':queued,'running':self.current.id if self.current is not None else None,'tasks':len(self.tasks)}
+
+    def prune(self):
+        finished=[task_id for task_id,task in self.tasks.items() if task.is_finished]
+        for task_id in finished[:max(len(finished)-self.keep_finished,0)]:
+            del self.tasks[task_id]
+
+    def on_event(self,kind:str,data:dict):
+        task=self.current
+        if task is not None:
+            task.add_event(kind,data)
+
+    def work(self):
+        while True:
+            task=self.queue.get()
+            if task is None:
+                break
+            with self.lock:
+                if task.is_finished:
+                    continue
+                task.start()
+                self.current=task
+            self.run(task)
+
+    def run(self,task:Task):
+        try:
+            result=self.agent.invoke(task.query)
+        except Exception as error:
+            logger.error(f"Task {task.id} failed: {error}")
+            result=AgentResult(is_done=False,content=None,error=str(error))
+        with self.lock:
+            self.current=None
+            # A cancel that arrived as the run was ending must not stop the next task
+            self.agent.stop_event.clear()
+        if result.is_done:
+            task.finish('done',content=result.content)
+        elif result.error=='Cancelled.':
+            task.finish('cancelled',error=result.error)
+        else:
+            task.finish('failed',error=result.error)
@@ -1,6 +1,11 @@
-from uiautomation import Control, GetRootControl, IsIconic, IsZoomed, IsWindowVisible, ControlType, ControlFromCursor, SetWindowTopmost, IsTopLevelWindow, ShowWindow, ControlFromHandle
+from uiautomation import Control, GetRootControl, IsIconic, IsZoomed, IsWindowVisible, ControlType, ControlFromCursor, SetWindowTopmost, IsTopLevelWindow, ShowWindow, ControlFromHandle, GetForegroundControl
 from darbot_windows_agent.desktop.config import EXCLUDED_APPS, BROWSER_NAMES
-from darbot_windows_agent.desktop.views import DesktopState,App,Size
+from darbot_windows_agent.desktop.views import DesktopState,App,Size,VisionConfig,RecorderConfig
+from darbot_windows_agent.desktop.capture import get_capture_backend
+from darbot_windows_agent.desktop.utils import resample_image, pad_image
+from darbot_windows_agent.desktop.recorder import FrameRecorder
+from darbot_windows_agent.tracing import Tracer
+from darbot_windows_agent.tree.views import BoundingBox, TreeState
 from PIL.Image import Image as PILImage
 from darbot_windows_agent.tree import Tree
 from fuzzywuzzy import process
@@ -15,21 +20,52 @@ import csv
 import io
 
 class Desktop:
-    def __init__(self):
+    def __init__(self,vision_config:VisionConfig=None,recorder_config:RecorderConfig=None,tracer:Tracer=None):
         self.desktop_state=None
+        self.tracer=tracer or Tracer(enabled=False)
+        self.vision_config=vision_config or VisionConfig()
+        self.capture_backend=get_capture_backend(self.vision_config.backend)
+        self.recorder=FrameRecorder(self,recorder_config) if recorder_config else None
+
+    def start_recorder(self):
+        if self.recorder is not None:
+            self.recorder.start()
+
+    def stop_recorder(self):
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def settle(self,timeout:float=0.5):
+        # Waits for the screen to stop changing when recording, otherwise a fixed sleep
+        if self.recorder is not None and self.recorder.is_running():
+            with self.tracer.span('settle',category='wait',timeout=timeout,mode='recorder'):
+                self.recorder.wait_until_settled(timeout=timeout)
+        else:
+            with self.tracer.span('settle',category='wait',timeout=timeout,mode='sleep'):
+                sleep(timeout)
         
     def get_state(self,use_vision:bool=False)->DesktopState:
-        tree=Tree(self)
-        apps=self.get_apps()
-        tree_state=tree.get_state()
-        active_app,apps=(apps[0],apps[1:]) if len(apps)>0 else (None,[])
-        if use_vision:
-            annotated_screenshot=tree.annotated_screenshot(tree_state.interactive_nodes,scale=0.5)
-            screenshot=self.screenshot_in_bytes(annotated_screenshot)
-        else:
-            screenshot=None
-        self.desktop_state=DesktopState(apps=apps,active_app=active_app,screenshot=screenshot,tree_state=tree_state)
+        with self.tracer.span('get_state',category='desktop',use_vision=use_vision):
+            tree=Tree(self)
+            with self.tracer.span('get_apps',category='desktop') as span:
+                apps=self.get_apps()
+                span['apps']=len(apps)
+            tree_state=tree.get_state()
+            active_app,apps=(apps[0],apps[1:]) if len(apps)>0 else (None,[])
+            screenshot=self.get_annotated_screenshot(tree,tree_state,active_app) if use_vision else None
+            self.desktop_state=DesktopState(apps=apps,active_app=active_app,screenshot=screenshot,tree_state=tree_state)
         return self.desktop_state
+
+    def get_annotated_screenshot(self,tree:Tree,tree_state:TreeState,active_app:App|None)->str:
+        region=self.get_capture_region(active_app)
+        with self.tracer.span('annotate',category='vision',nodes=len(tree_state.interactive_nodes)):
+            annotated_screenshot=tree.annotated_screenshot(tree_state.interactive_nodes,scale=self.vision_config.scale,region=region)
+        return self.screenshot_in_bytes(annotated_screenshot)
+
+    def attach_screenshot(self,desktop_state:DesktopState)->DesktopState:
+        # Adds the annotated screenshot to a state that was observed without vision
+        desktop_state.screenshot=self.get_annotated_screenshot(Tree(self),desktop_state.tree_state,desktop_state.active_app)
+        return desktop_state
     
     def get_window_element_from_element(self,element:Control)->Control|None:
         while element is not None:
@@ -48,6 +84,13 @@ class Desktop:
         else:
             return 'Hidden'
     
+    def get_foreground_window(self)->tuple[int,str]:
+        # Handle and title of the foreground window, a cheap check for whether the screen moved on
+        control=GetForegroundControl()
+        if control is None:
+            return (0,'')
+        return (control.NativeWindowHandle,control.Name)
+
     def get_cursor_location(self)->tuple[int,int]:
         position=pyautogui.position()
         return (position.x,position.y)
@@ -123,6 +166,25 @@ class Desktop:
         else:
             return (f'Failed to switch to {app_name.title()}.',1)
     
+    def get_app_region(self,app:App)->BoundingBox|None:
+        if app is None or app.status=='Minimized':
+            return None
+        window=ControlFromHandle(app.handle).BoundingRectangle
+        if window.isempty():
+            return None
+        # Maximized windows overhang the screen by a few pixels, so clip to the screen
+        screen_width,screen_height=pyautogui.size()
+        left,top=max(window.left,0),max(window.top,0)
+        right,bottom=min(window.right,screen_width),min(window.bottom,screen_height)
+        if right<=left or bottom<=top:
+            return None
+        return BoundingBox(left=left,top=top,right=right,bottom=bottom,width=right-left,height=bottom-top)
+
+    def get_capture_region(self,active_app:App|None)->BoundingBox|None:
+        if self.vision_config.capture_mode=='foreground':
+            return self.get_app_region(active_app)
+        return None
+    
     def get_app_size(self,control:Control):
         window=control.BoundingRectangle
         if window.isempty():
@@ -143,7 +205,7 @@ class Desktop:
         
     def get_apps(self) -> list[App]:
         try:
-            sleep(0.5)
+            self.settle(0.5)
             desktop = GetRootControl()  # Get the desktop control
             elements = desktop.GetChildren()
             apps = []
@@ -160,14 +222,35 @@ class Desktop:
         return apps
     
     def screenshot_in_bytes(self,screenshot:PILImage)->bytes:
-        buffer=BytesIO()
-        screenshot.save(buffer,format='PNG')
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        data_uri = f"data:image/png;base64,{img_base64}"
+        with self.tracer.span('encode',category='vision') as span:
+            buffer=BytesIO()
+            screenshot.save(buffer,format='PNG')
+            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            data_uri = f"data:image/png;base64,{img_base64}"
+            span['bytes']=len(data_uri)
         return data_uri
 
-    def get_screenshot(self,scale:float=0.7)->Image.Image:
-        screenshot=pyautogui.screenshot()
-        size=(screenshot.width*scale, screenshot.height*scale)
-        screenshot.thumbnail(size=size, resample=Image.Resampling.LANCZOS)
-        return screenshot
\ No newline at end of file
+    def get_screenshot(self,scale:float=0.7,region:BoundingBox=None,padding:int=0)->Image.Image:
+        # A full screen frame at the recorder's scale is already in the ring buffer
+        if self.recorder is not None and self.recorder.is_running() and region is None and self.recorder.config.scale==scale:
+            frame=self.recorder.latest()
+            if frame is not None:
+                return pad_image(frame.image,padding)
+        return self.capture_screenshot(scale=scale,region=region,padding=padding)
+
+    def capture_screenshot(self,scale:float=0.7,region:BoundingBox=None,padding:int=0)->Image.Image:
+        # The recorder thread captures too, its spans land on their own track
+        with self.tracer.span('capture',category='vision',scale=scale,region=region is not None):
+            return self.grab_screenshot(scale=scale,region=region,padding=padding)
+
+    def grab_screenshot(self,scale:float=0.7,region:BoundingBox=None,padding:int=0)->Image.Image:
+        tier=self.vision_config.resample
+        if self.capture_backend is not None:
+            # mss grabs only the region, the frame is converted once and every tier filters it through PIL (Image.reduce for 'fast')
+            screenshot=self.capture_backend.grab(region).to_image()
+        elif region is None:
+            screenshot=pyautogui.screenshot()
+        else:
+            screenshot=pyautogui.screenshot(region=(region.left,region.top,region.width,region.height))
+        screenshot=resample_image(screenshot,scale=scale,tier=tier)
+        return pad_image(screenshot,padding)
\ No newline at end of file
@@ -0,0 +1,75 @@
+from darbot_windows_agent.tree.views import BoundingBox
+from dataclasses import dataclass
+from typing import Literal
+from PIL import Image
+import threading
+
+# numpy and mss are optional, they are only needed for the raw capture backend
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import mss
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+@dataclass
+class Frame:
+    '''
+    A captured frame backed by the raw pixel buffer of shape (height, width, channels) returned by mss.
+
+    `to_image` converts it to a PIL image in one pass, scaling and padding then happen in PIL like for
+    every other backend.
+    '''
+    pixels:'np.ndarray'
+    left:int=0
+    top:int=0
+    raw_mode:Literal['BGRX','RGB']='BGRX'
+
+    @property
+    def width(self)->int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self)->int:
+        return self.pixels.shape[0]
+
+    def to_image(self)->Image.Image:
+        pixels=np.ascontiguousarray(self.pixels)
+        return Image.frombuffer('RGB',(self.width,self.height),pixels,'raw',self.raw_mode,pixels.strides[0],1)
+
+class MSSCapture:
+    '''
+    Captures the screen through mss, exposing the raw BGRA buffer as a NumPy array without copying it.
+    '''
+    def __init__(self):
+        if not (MSS_AVAILABLE and NUMPY_AVAILABLE):
+            raise ImportError("The 'mss' capture backend requires mss and numpy: pip install darbot-windows-agent[vision]")
+        # mss handles are bound to the thread that created them
+        self.local=threading.local()
+
+    def get_handle(self):
+        if not hasattr(self.local,'handle'):
+            self.local.handle=mss.mss()
+        return self.local.handle
+
+    def grab(self,region:BoundingBox=None)->Frame:
+        handle=self.get_handle()
+        if region is None:
+            primary=handle.monitors[1]
+            monitor={'left':primary['left'],'top':primary['top'],'width':primary['width'],'height':primary['height']}
+        else:
+            monitor={'left':region.left,'top':region.top,'width':region.width,'height':region.height}
+        shot=handle.grab(monitor)
+        pixels=np.frombuffer(shot.raw,dtype=np.uint8).reshape(shot.height,shot.width,4)
+        return Frame(pixels=pixels,left=monitor['left'],top=monitor['top'],raw_mode='BGRX')
+
+def get_capture_backend(name:Literal['pyautogui','mss'])->MSSCapture|None:
+    '''Returns the raw capture backend, None means the default pyautogui/PIL pipeline.'''
+    if name=='mss':
+        return MSSCapture()
+    return None
@@ -0,0 +1,109 @@
+from darbot_windows_agent.desktop.views import RecorderConfig, RecordedFrame
+from PIL import ImageChops, ImageStat
+from collections import deque
+from typing import TYPE_CHECKING
+from time import monotonic
+import threading
+
+if TYPE_CHECKING:
+    from darbot_windows_agent.desktop import Desktop
+
+class FrameRecorder:
+    '''
+    Captures low resolution frames in a background thread into a fixed size ring buffer.
+
+    The latest frame can be read without waiting for a capture, and the motion between consecutive
+    frames is used to tell when the screen has settled after an action.
+    '''
+    def __init__(self,desktop:'Desktop',config:RecorderConfig=None):
+        self.desktop=desktop
+        self.config=config or RecorderConfig()
+        self.buffer:deque[RecordedFrame]=deque(maxlen=self.config.size)
+        self.condition=threading.Condition()
+        self.stop_event=threading.Event()
+        self.thread:threading.Thread|None=None
+
+    def start(self):
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.thread=threading.Thread(target=self.run,name='FrameRecorder',daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def is_running(self)->bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        interval=1/self.config.fps
+        while not self.stop_event.is_set():
+            started=monotonic()
+            try:
+                self.record()
+            except Exception as ex:
+                print(f"Error capturing frame: {ex}")
+            self.stop_event.wait(max(interval-(monotonic()-started),0))
+
+    def record(self)->RecordedFrame:
+        image=self.desktop.capture_screenshot(scale=self.config.scale)
+        previous=self.latest()
+        motion=self.get_motion(previous.image,image) if previous is not None else 1.0
+        frame=RecordedFrame(image=image,timestamp=monotonic(),motion=motion)
+        with self.condition:
+            self.buffer.append(frame)
+            self.condition.notify_all()
+        return frame
+
+    def get_motion(self,previous,current)->float:
+        # Mean absolute difference of the grayscale frames, normalized to [0,1]
+        if previous.size!=current.size:
+            return 1.0
+        difference=ImageChops.difference(previous.convert('L'),current.convert('L'))
+        return ImageStat.Stat(difference).mean[0]/255
+
+    def latest(self)->RecordedFrame|None:
+        with self.condition:
+            return self.buffer[-1] if self.buffer else None
+
+    def frames(self)->list[RecordedFrame]:
+        with self.condition:
+            return list(self.buffer)
+
+    def frame_before(self,timestamp:float)->RecordedFrame|None:
+        with self.condition:
+            for frame in reversed(self.buffer):
+                if frame.timestamp<=timestamp:
+                    return frame
+        return None
+
+    def frame_pair(self,timestamp:float)->tuple[RecordedFrame|None,RecordedFrame|None]:
+        # The last frame before the timestamp and the latest frame, e.g. around an action
+        return self.frame_before(timestamp),self.latest()
+
+    def is_settled(self,since:float=None)->bool:
+        # Settled when the frames of the quiet period (at least the latest one) are below the motion threshold
+        frames=self.frames()
+        if not frames or (since is not None and frames[-1].timestamp<since):
+            return False
+        now=monotonic()
+        recent=[frame for frame in frames if now-frame.timestamp<=self.config.quiet_period] or frames[-1:]
+        covered=frames[0].timestamp<=now-self.config.quiet_period
+        return covered and all(frame.motion<self.config.motion_threshold for frame in recent)
+
+    def wait_until_settled(self,timeout:float)->bool:
+        # Only frames captured after the call count, so an action that just happened is not missed
+        since=monotonic()
+        deadline=since+timeout
+        with self.condition:
+            while True:
+                if self.is_settled(since=since):
+                    return True
+                remaining=deadline-monotonic()
+                if remaining<=0 or not self.is_running():
+                    return False
+                self.condition.wait(remaining)
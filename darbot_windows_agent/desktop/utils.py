@@ -0,0 +1,42 @@
+from typing import Literal
+from PIL import Image
+
+ResampleTier=Literal['fast','balanced','best']
+
+def resample_image(image:Image.Image,scale:float,tier:ResampleTier='best')->Image.Image:
+    """
+    Downscale an image by a factor using the given quality tier.
+
+    Args:
+        image (Image.Image): The image to downscale
+        scale (float): The scale factor, between 0 and 1
+        tier (ResampleTier, optional): 'fast' uses Image.reduce (box averaging) for integer factors and a box filter otherwise,
+            'balanced' uses a bilinear filter and 'best' uses LANCZOS. Defaults to 'best'.
+
+    Returns:
+        Image.Image: The downscaled image
+    """
+    if scale>=1.0:
+        return image
+    size=(max(int(image.width*scale),1),max(int(image.height*scale),1))
+    match tier:
+        case 'fast':
+            factor=int(1/scale)
+            if factor>1:
+                image=image.reduce(factor)
+            if image.size==size:
+                return image
+            return image.resize(size,resample=Image.Resampling.BOX)
+        case 'balanced':
+            return image.resize(size,resample=Image.Resampling.BILINEAR,reducing_gap=2.0)
+        case 'best':
+            return image.resize(size,resample=Image.Resampling.LANCZOS)
+        case _:
+            raise ValueError(f"Unknown resample tier '{tier}'. Use 'fast', 'balanced' or 'best'.")
+
+def pad_image(image:Image.Image,padding:int,color:tuple[int,int,int]=(255,255,255))->Image.Image:
+    if padding==0:
+        return image
+    padded_image=Image.new("RGB", (image.width+2*padding, image.height+2*padding), color=color)
+    padded_image.paste(image, (padding, padding))
+    return padded_image
@@ -1,6 +1,41 @@
+from darbot_windows_agent.desktop.utils import ResampleTier
 from darbot_windows_agent.tree.views import TreeState
 from typing import Literal,Optional
 from dataclasses import dataclass
+from PIL.Image import Image
+
+@dataclass
+class VisionConfig:
+    '''
+    Settings for the screenshot attached to the desktop state.
+
+    capture_mode 'screen' grabs the whole screen, 'foreground' grabs only the rectangle of the foreground app.
+    backend 'mss' captures into a raw BGRA buffer (requires the `vision` extra), 'pyautogui' goes through PIL.
+    resample picks the downscaling filter: 'fast' (box/reduce), 'balanced' (bilinear) or 'best' (LANCZOS, the default).
+    '''
+    capture_mode:Literal['screen','foreground']='screen'
+    scale:float=0.5
+    backend:Literal['pyautogui','mss']='pyautogui'
+    resample:ResampleTier='best'
+
+@dataclass
+class RecorderConfig:
+    '''
+    Settings for the background frame recorder.
+
+    When scale matches VisionConfig.scale, vision screenshots are served from the latest recorded frame.
+    '''
+    fps:float=4.0
+    size:int=16
+    scale:float=0.25
+    motion_threshold:float=0.002
+    quiet_period:float=0.3
+
+@dataclass
+class RecordedFrame:
+    image:Image
+    timestamp:float
+    motion:float
 
 
 @dataclass
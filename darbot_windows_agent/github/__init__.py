@@ -1,9 +1,16 @@
-from darbot_windows_agent.github.cli import github_cli_tool
-from darbot_windows_agent.github.models import ModelSelector
-from darbot_windows_agent.github.auth import GitHubAuth
+from importlib import import_module
 
-__all__ = [
-    'github_cli_tool',
-    'ModelSelector', 
-    'GitHubAuth'
-]
\ No newline at end of file
+# The credentials module only needs the standard library and is imported before the agent to probe `gh` early,
+# importing this package must not pull in the desktop and langchain, so the names are resolved on first use
+EXPORTS = {
+    'github_cli_tool': 'darbot_windows_agent.github.cli',
+    'ModelSelector': 'darbot_windows_agent.github.models',
+    'GitHubAuth': 'darbot_windows_agent.github.auth'
+}
+
+__all__ = list(EXPORTS)
+
+def __getattr__(name: str):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(EXPORTS[name]), name)
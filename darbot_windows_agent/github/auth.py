@@ -2,26 +2,29 @@ import subprocess
 import json
 import os
 from typing import Tuple
+from darbot_windows_agent.github.credentials import CREDENTIALS
 from darbot_windows_agent.github.views import GitHubCLI
 from darbot_windows_agent.desktop import Desktop
 from langchain.tools import tool
 
 class GitHubAuth:
-    """GitHub authentication management"""
+    """GitHub authentication management
+    
+    The status and token are read from a credential cache shared by all instances, `gh` is probed
+    at most once per TTL and refreshed in the background when the cached result gets old.
+    """
+    
+    cache = CREDENTIALS
+    
+    @staticmethod
+    def prefetch():
+        """Start checking the GitHub CLI credentials in the background"""
+        GitHubAuth.cache.prefetch()
     
     @staticmethod
     def is_authenticated() -> bool:
         """Check if user is authenticated with GitHub CLI"""
-        try:
-            result = subprocess.run(
-                ["gh", "auth", "status"], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return False
+        return GitHubAuth.cache.get().authenticated
     
     @staticmethod
     def login() -> Tuple[str, bool]:
@@ -41,34 +44,19 @@ class GitHubAuth:
             return "Authentication timed out", False
         except FileNotFoundError:
             return "GitHub CLI not found. Please install it from https://cli.github.com/", False
+        finally:
+            # Whatever happened, the cached credentials may no longer be right
+            GitHubAuth.cache.invalidate()
     
     @staticmethod 
     def status() -> str:
         """Get GitHub authentication status"""
-        try:
-            result = subprocess.run(
-                ["gh", "auth", "status"], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            return result.stdout if result.returncode == 0 else result.stderr
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return "GitHub CLI not available or not authenticated"
+        return GitHubAuth.cache.get().status
     
     @staticmethod
     def get_token() -> str:
         """Get GitHub token if available"""
-        try:
-            result = subprocess.run(
-                ["gh", "auth", "token"], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            return result.stdout.strip() if result.returncode == 0 else ""
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return ""
+        return GitHubAuth.cache.get().token
 
 @tool('GitHub CLI Tool', args_schema=GitHubCLI)
 def github_cli_tool(command: str, flags: str = "", desktop: Desktop = None) -> str:
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from time import monotonic
+from typing import Callable, Optional
+import subprocess
+import threading
+
+# Only the standard library is imported here, so the credentials can be probed before the agent is imported
+
+@dataclass
+class GitHubCredentials:
+    """Result of probing the GitHub CLI"""
+    authenticated: bool
+    token: str
+    status: str
+    checked_at: float
+
+def run_gh(*args: str, timeout: float = 30) -> Optional[subprocess.CompletedProcess]:
+    try:
+        return subprocess.run(["gh", *args], capture_output=True, text=True, timeout=timeout)
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+
+def probe_credentials() -> GitHubCredentials:
+    """Run `gh auth status` and `gh auth token` side by side"""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        status_future = executor.submit(run_gh, "auth", "status")
+        token_future = executor.submit(run_gh, "auth", "token")
+        status, token = status_future.result(), token_future.result()
+    authenticated = status is not None and status.returncode == 0
+    return GitHubCredentials(
+        authenticated=authenticated,
+        token=token.stdout.strip() if token is not None and token.returncode == 0 else "",
+        status=(status.stdout if authenticated else status.stderr) if status is not None else "GitHub CLI not available or not authenticated",
+        checked_at=monotonic()
+    )
+
+class CredentialCache:
+    """Caches the GitHub CLI credentials so callers never wait on `gh` more than once per TTL.
+
+    A fresh entry is returned as is. A stale entry is still returned while a background thread probes
+    again, only the very first call waits for the probe. Concurrent callers share one probe.
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0, probe: Callable[[], GitHubCredentials] = probe_credentials, clock: Callable[[], float] = monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl  # Not being logged in is rechecked sooner, a login may happen in another terminal
+        self.probe = probe
+        self.clock = clock
+        self.credentials: Optional[GitHubCredentials] = None
+        self.lock = threading.Lock()
+        self.refreshing: Optional[threading.Thread] = None
+        self.generation = 0
+        self.probes = 0
+
+    def is_fresh(self, credentials: GitHubCredentials) -> bool:
+        ttl = self.ttl if credentials.authenticated else self.negative_ttl
+        return self.clock() - credentials.checked_at < ttl
+
+    def get(self) -> GitHubCredentials:
+        """Get the cached credentials, probing only if there are none yet"""
+        with self.lock:
+            credentials = self.credentials
+            if credentials is not None and not self.is_fresh(credentials):
+                self.start_refresh()
+        if credentials is not None:
+            return credentials
+        return self.refresh()
+
+    def refresh(self) -> GitHubCredentials:
+        """Probe now, or wait for the probe that is already running"""
+        while True:
+            with self.lock:
+                thread = self.start_refresh()
+            thread.join()
+            with self.lock:
+                # A probe that started before an invalidation is discarded, then it is probed again
+                if self.credentials is not None:
+                    return self.credentials
+
+    def prefetch(self):
+        """Start probing in the background so the first caller does not wait"""
+        with self.lock:
+            if self.credentials is None or not self.is_fresh(self.credentials):
+                self.start_refresh()
+
+    def invalidate(self):
+        with self.lock:
+            self.credentials = None
+            self.generation += 1
+
+    def start_refresh(self) -> threading.Thread:
+        # Called with the lock held, a running probe is shared instead of starting another
+        if self.refreshing is None or not self.refreshing.is_alive():
+            self.refreshing = threading.Thread(target=self.run_probe, name="GitHubCredentialRefresh", daemon=True)
+            self.refreshing.start()
+        return self.refreshing
+
+    def run_probe(self):
+        with self.lock:
+            generation = self.generation
+        self.probes += 1
+        try:
+            credentials = self.probe()
+        except Exception as e:
+            credentials = GitHubCredentials(authenticated=False, token="", status=f"GitHub CLI check failed: {e}", checked_at=0.0)
+        with self.lock:
+            if generation == self.generation:
+                self.credentials = replace(credentials, checked_at=self.clock())
+
+# Shared by every GitHubAuth and ModelSelector of the process
+CREDENTIALS = CredentialCache()
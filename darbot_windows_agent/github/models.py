@@ -1,13 +1,12 @@
 import os
 import json
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
 from darbot_windows_agent.github.auth import GitHubAuth
+from darbot_windows_agent.github.providers import PROVIDERS
+from darbot_windows_agent.llm.hedge import HedgedChatModel
 
 @dataclass
 class ModelConfig:
@@ -114,6 +113,11 @@ class ModelSelector:
         ),
     }
     
+    @classmethod
+    def register_model(cls, model_id: str, config: ModelConfig):
+        """Add a model, its provider is resolved by name when the model is created"""
+        cls.AVAILABLE_MODELS[model_id] = config
+    
     def __init__(self):
         self.selected_model: Optional[str] = None
         self.github_auth = GitHubAuth()
@@ -121,13 +125,14 @@ class ModelSelector:
     def list_available_models(self) -> List[Dict[str, Any]]:
         """List all available models with their status"""
         models = []
+        availability = self.check_availability(list(self.AVAILABLE_MODELS.values()))
         
         for model_id, config in self.AVAILABLE_MODELS.items():
             model_info = {
                 "id": model_id,
                 "name": config.display_name,
                 "provider": config.provider,
-                "available": self._is_model_available(config)
+                "available": availability[self._availability_key(config)]
             }
             
             if not model_info["available"]:
@@ -137,6 +142,21 @@ class ModelSelector:
         
         return models
     
+    def _availability_key(self, config: ModelConfig) -> Tuple[str, Optional[str]]:
+        """Models with the same key share one availability check"""
+        if config.provider == "github_copilot":
+            return (config.provider, None)
+        return (config.provider, config.api_key_env if config.requires_api_key else None)
+    
+    def check_availability(self, configs: List[ModelConfig]) -> Dict[Tuple[str, Optional[str]], bool]:
+        """Check the availability of the given models, one probe per provider, all probes at once"""
+        probes = {self._availability_key(config): config for config in configs}
+        if len(probes) <= 1:
+            return {key: self._is_model_available(config) for key, config in probes.items()}
+        with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            futures = {key: executor.submit(self._is_model_available, config) for key, config in probes.items()}
+            return {key: future.result() for key, future in futures.items()}
+    
     def _is_model_available(self, config: ModelConfig) -> bool:
         """Check if a model is available for use"""
         if config.provider == "github_copilot":
@@ -183,45 +203,39 @@ class ModelSelector:
         if not self._is_model_available(config):
             return None
         
+        factory = PROVIDERS.get(config.provider)
+        if factory is None:
+            print(f"No provider registered for {config.provider}")
+            return None
+        
+        if config.provider == "github_copilot":
+            # Use GitHub token for authentication with OpenAI
+            api_key = self.github_auth.get_token()
+            if not api_key:
+                return None
+        elif config.api_key_env:
+            api_key = os.getenv(config.api_key_env)
+            if config.requires_api_key and not api_key:
+                return None
+        else:
+            api_key = None
+        
         try:
-            if config.provider == "github_copilot":
-                # Use GitHub token for authentication with OpenAI
-                github_token = self.github_auth.get_token()
-                if not github_token:
-                    return None
-                
-                return ChatOpenAI(
-                    model=config.name,
-                    api_key=github_token,
-                    base_url="https://models.inference.ai.azure.com"  # GitHub Copilot endpoint
-                )
-            
-            elif config.provider == "openai":
-                api_key = os.getenv(config.api_key_env)
-                if not api_key:
-                    return None
-                return ChatOpenAI(model=config.name, api_key=api_key)
-            
-            elif config.provider == "google":
-                api_key = os.getenv(config.api_key_env)
-                if not api_key:
-                    return None
-                return ChatGoogleGenerativeAI(model=config.name, google_api_key=api_key)
-            
-            elif config.provider == "groq":
-                api_key = os.getenv(config.api_key_env)
-                if not api_key:
-                    return None
-                return ChatGroq(model=config.name, groq_api_key=api_key)
-            
-            elif config.provider == "ollama":
-                return ChatOllama(model=config.name)
-            
+            return factory(config, api_key)
         except Exception as e:
             print(f"Error creating LLM for {target_model}: {e}")
             return None
-        
-        return None
+    
+    def create_hedged_llm(self, model_ids: List[str], **options: Any) -> Optional[HedgedChatModel]:
+        """Create a chat model that hedges and falls back across the given models, in order of preference.
+
+        Models that are not available are skipped, the options are passed to HedgedChatModel.
+        """
+        providers = {model_id: self.create_llm(model_id) for model_id in model_ids}
+        providers = {model_id: llm for model_id, llm in providers.items() if llm is not None}
+        if not providers:
+            return None
+        return HedgedChatModel(llms=list(providers.values()), names=list(providers), **options)
     
     def get_model_info(self, model_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific model"""
@@ -0,0 +1,83 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from importlib.metadata import entry_points
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+import threading
+
+if TYPE_CHECKING:
+    from darbot_windows_agent.github.models import ModelConfig
+
+# Third-party packages register a factory for their provider name under this entry point group
+ENTRY_POINT_GROUP = "darbot_windows_agent.providers"
+
+ProviderFactory = Callable[["ModelConfig", Optional[str]], BaseChatModel]
+
+def github_copilot_provider(config: "ModelConfig", api_key: Optional[str]) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+    # The GitHub token authenticates against the GitHub Copilot endpoint
+    return ChatOpenAI(model=config.name, api_key=api_key, base_url="https://models.inference.ai.azure.com")
+
+def openai_provider(config: "ModelConfig", api_key: Optional[str]) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=config.name, api_key=api_key)
+
+def google_provider(config: "ModelConfig", api_key: Optional[str]) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=config.name, google_api_key=api_key)
+
+def groq_provider(config: "ModelConfig", api_key: Optional[str]) -> BaseChatModel:
+    from langchain_groq import ChatGroq
+    return ChatGroq(model=config.name, groq_api_key=api_key)
+
+def ollama_provider(config: "ModelConfig", api_key: Optional[str]) -> BaseChatModel:
+    from langchain_ollama import ChatOllama
+    return ChatOllama(model=config.name)
+
+class ProviderRegistry:
+    """Maps `ModelConfig.provider` to the factory that builds its chat model.
+
+    Every factory imports its SDK when it is called, so only the providers that are used get imported.
+    Providers that are not built in are looked up in the `darbot_windows_agent.providers` entry points.
+    """
+
+    def __init__(self, providers: Optional[Dict[str, ProviderFactory]] = None):
+        self.providers: Dict[str, ProviderFactory] = dict(providers or {})
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory: ProviderFactory):
+        """Register or replace the factory for a provider"""
+        with self.lock:
+            self.providers[name] = factory
+
+    def get(self, name: str) -> Optional[ProviderFactory]:
+        """Get the factory for a provider, loading it from the entry points if it is not registered"""
+        with self.lock:
+            factory = self.providers.get(name)
+        if factory is not None:
+            return factory
+        factory = self.load_entry_point(name)
+        if factory is not None:
+            self.register(name, factory)
+        return factory
+
+    def load_entry_point(self, name: str) -> Optional[ProviderFactory]:
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP, name=name):
+            return entry_point.load()
+        return None
+
+    def names(self) -> list[str]:
+        """Names of the registered providers and of the ones available as entry points"""
+        with self.lock:
+            names = list(self.providers)
+        return names + [entry_point.name for entry_point in entry_points(group=ENTRY_POINT_GROUP) if entry_point.name not in names]
+
+PROVIDERS = ProviderRegistry({
+    "github_copilot": github_copilot_provider,
+    "openai": openai_provider,
+    "google": google_provider,
+    "groq": groq_provider,
+    "ollama": ollama_provider,
+})
+
+def register_provider(name: str, factory: ProviderFactory):
+    """Register a chat model factory for the provider name used in `ModelConfig.provider`"""
+    PROVIDERS.register(name, factory)
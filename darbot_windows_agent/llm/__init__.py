@@ -0,0 +1,17 @@
+from darbot_windows_agent.llm.cache import CachedChatModel, ResponseCache, CacheMissError
+from darbot_windows_agent.llm.prefix import PrefixCacheStats, with_cache_hints
+from darbot_windows_agent.llm.fake import PrefixCheckingChatModel, ScriptedChatModel
+from darbot_windows_agent.llm.hedge import HedgedChatModel, CircuitBreaker, AllProvidersFailedError
+
+__all__ = [
+    'CachedChatModel',
+    'ResponseCache',
+    'CacheMissError',
+    'PrefixCacheStats',
+    'with_cache_hints',
+    'PrefixCheckingChatModel',
+    'ScriptedChatModel',
+    'HedgedChatModel',
+    'CircuitBreaker',
+    'AllProvidersFailedError'
+]
@@ -0,0 +1,241 @@
+from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk, message_to_dict, messages_from_dict
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from darbot_windows_agent.llm.chunks import as_chunk
+from pydantic import ConfigDict, PrivateAttr
+from typing import Any, Iterator, AsyncIterator, Literal
+from pathlib import Path
+import threading
+import hashlib
+import re
+import sqlite3
+import json
+import time
+
+CacheMode=Literal['read_through','record','replay']
+
+class CacheMissError(LookupError):
+    '''Raised in replay mode when a request was never recorded.'''
+
+# Prompt fields that change between otherwise identical runs, masked so recorded trajectories keep hitting
+VOLATILE_FIELDS=[
+    (re.compile(r'The current date is [^.\n]+\.'),'The current date is <date>.'),
+    (re.compile(r'Cursor Location: \(-?\d+,-?\d+\)'),'Cursor Location: <cursor>'),
+    (re.compile(r'Current step: \d+'),'Current step: <step>'),
+]
+
+def normalize_text(text:str)->str:
+    for pattern,mask in VOLATILE_FIELDS:
+        text=pattern.sub(mask,text)
+    return text.strip()
+
+def normalize_content(content:str|list)->str|list:
+    if isinstance(content,str):
+        return normalize_text(content)
+    parts=[]
+    for part in content:
+        if isinstance(part,dict) and part.get('type')=='image_url':
+            # Screenshots are keyed by their digest, the data URI itself would bloat every key computation
+            image=part['image_url']['url'] if isinstance(part['image_url'],dict) else part['image_url']
+            parts.append({'type':'image_url','digest':hashlib.sha256(image.encode()).hexdigest()})
+        elif isinstance(part,dict) and part.get('type')=='text':
+            parts.append({'type':'text','text':normalize_text(part['text'])})
+        else:
+            parts.append(part)
+    return parts
+
+def normalize_messages(messages:list[BaseMessage])->list[dict]:
+    # Only what the model sees is part of the key, ids and response metadata differ between runs
+    normalized=[]
+    for message in messages:
+        entry={'type':message.type,'content':normalize_content(message.content)}
+        if isinstance(message,AIMessage) and message.tool_calls:
+            entry['tool_calls']=[{'name':call['name'],'args':call['args']} for call in message.tool_calls]
+        normalized.append(entry)
+    return normalized
+
+def cache_key(messages:list[BaseMessage],params:dict)->str:
+    payload=json.dumps({'messages':normalize_messages(messages),'params':params},sort_keys=True,default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    '''
+    An on-disk store of LLM responses with LRU eviction.
+
+    Args:
+        path (str | Path): SQLite database the responses are stored in.
+        max_entries (int, optional): Maximum number of responses kept. Defaults to 10000.
+        max_bytes (int, optional): Maximum total size of the stored responses. Defaults to 256 MiB.
+    '''
+    def __init__(self,path:str|Path,max_entries:int=10000,max_bytes:int=256*1024*1024):
+        self.path=Path(path)
+        self.max_entries=max_entries
+        self.max_bytes=max_bytes
+        self.hits=0
+        self.misses=0
+        self.lock=threading.Lock()
+        self.path.parent.mkdir(parents=True,exist_ok=True)
+        self.connection=sqlite3.connect(self.path,check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.connection.commit()
+
+    def get(self,key:str)->AIMessage|None:
+        with self.lock:
+            row=self.connection.execute('SELECT value FROM responses WHERE key=?',(key,)).fetchone()
+            if row is None:
+                self.misses+=1
+                return None
+            self.hits+=1
+            self.connection.execute('UPDATE responses SET accessed=? WHERE key=?',(time.time(),key))
+            self.connection.commit()
+        return messages_from_dict([json.loads(row[0])])[0]
+
+    def put(self,key:str,message:AIMessage):
+        value=json.dumps(message_to_dict(message))
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)',(key,value,len(value),time.time()))
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        count,size=self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if count<=self.max_entries and size<=self.max_bytes:
+            return
+        expired=[]
+        for key,entry_size in self.connection.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            if count<=self.max_entries and size<=self.max_bytes:
+                break
+            expired.append((key,))
+            count-=1
+            size-=entry_size
+        self.connection.executemany('DELETE FROM responses WHERE key=?',expired)
+
+    def __len__(self)->int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM responses')
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+class CachedChatModel(BaseChatModel):
+    '''
+    Wraps a chat model with a response cache keyed by the normalized messages, the model parameters and the bound tools.
+
+    A stream is recorded when it ends or when its consumer closes it, the agent closes it once the action is parsed.
+    A response recorded from a closed stream is marked partial: streams are served from it, invoke treats it as a miss.
+
+    Args:
+        llm (BaseChatModel): The model that answers cache misses.
+        store (ResponseCache): Where responses are stored.
+        mode (CacheMode, optional): 'read_through' serves hits and records misses, 'record' always calls the model and records,
+            'replay' only serves recorded responses and raises CacheMissError otherwise. Defaults to 'read_through'.
+    '''
+    model_config=ConfigDict(arbitrary_types_allowed=True)
+    llm:BaseChatModel
+    store:ResponseCache
+    mode:CacheMode='read_through'
+    tools:list[dict]=[]
+    tool_options:dict[str,Any]={}
+    _bound:Any=PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self)->str:
+        return f'cached-{self.llm._llm_type}'
+
+    @property
+    def _identifying_params(self)->dict[str,Any]:
+        return {'llm':self.llm._llm_type,**self.llm._identifying_params}
+
+    @property
+    def runnable(self):
+        return self._bound if self._bound is not None else self.llm
+
+    def bind_tools(self,tools:list,**kwargs:Any)->'CachedChatModel':
+        # The wrapped model is bound, the schemas go into the key so answers with and without tools never mix
+        copy=self.model_copy(update={'tools':[convert_to_openai_tool(tool) for tool in tools],'tool_options':kwargs})
+        copy._bound=self.llm.bind_tools(tools,**kwargs)
+        return copy
+
+    def key(self,messages:list[BaseMessage],stop:list[str]|None,kwargs:dict)->str:
+        params={**self._identifying_params,'stop':stop,**kwargs}
+        if self.tools:
+            params|={'tools':self.tools,'tool_options':self.tool_options}
+        return cache_key(messages,params)
+
+    def lookup(self,key:str,streaming:bool=False)->AIMessage|None:
+        if self.mode=='record':
+            return None
+        message=self.store.get(key)
+        if message is not None and message.response_metadata.get('partial') and not streaming:
+            message=None
+        if message is None and self.mode=='replay':
+            raise CacheMissError(f'No recorded response for request {key[:12]}')
+        return message
+
+    def record(self,key:str,response:AIMessageChunk,partial:bool):
+        self.store.put(key,AIMessage(content=response.content,tool_calls=response.tool_calls,response_metadata={'partial':True} if partial else {}))
+
+    def _generate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        key=self.key(messages,stop,kwargs)
+        message=self.lookup(key)
+        if message is None:
+            message=self.runnable.invoke(messages,stop=stop,**kwargs)
+            self.store.put(key,message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        key=self.key(messages,stop,kwargs)
+        message=self.lookup(key)
+        if message is None:
+            message=await self.runnable.ainvoke(messages,stop=stop,**kwargs)
+            self.store.put(key,message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->Iterator[ChatGenerationChunk]:
+        key=self.key(messages,stop,kwargs)
+        message=self.lookup(key,streaming=True)
+        if message is not None:
+            yield ChatGenerationChunk(message=as_chunk(message))
+            return
+        response=None
+        complete=False
+        try:
+            for chunk in self.runnable.stream(messages,stop=stop,**kwargs):
+                response=chunk if response is None else response+chunk
+                yield ChatGenerationChunk(message=chunk)
+            complete=True
+        except Exception:
+            # A failed stream is not recorded
+            response=None
+            raise
+        finally:
+            # Closing the stream early lands here as well, what the consumer read is recorded
+            if response is not None:
+                self.record(key,response,partial=not complete)
+
+    async def _astream(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->AsyncIterator[ChatGenerationChunk]:
+        key=self.key(messages,stop,kwargs)
+        message=self.lookup(key,streaming=True)
+        if message is not None:
+            yield ChatGenerationChunk(message=as_chunk(message))
+            return
+        response=None
+        complete=False
+        try:
+            async for chunk in self.runnable.astream(messages,stop=stop,**kwargs):
+                response=chunk if response is None else response+chunk
+                yield ChatGenerationChunk(message=chunk)
+            complete=True
+        except Exception:
+            response=None
+            raise
+        finally:
+            if response is not None:
+                self.record(key,response,partial=not complete)
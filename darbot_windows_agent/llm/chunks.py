@@ -0,0 +1,10 @@
+from langchain_core.messages import BaseMessage, BaseMessageChunk, AIMessageChunk
+import json
+
+def as_chunk(message:BaseMessage)->BaseMessageChunk:
+    # Whole answers, from providers without streaming support or from a cache, become a single chunk with their tool calls
+    if isinstance(message,BaseMessageChunk):
+        return message
+    tool_call_chunks=[{'name':call['name'],'args':json.dumps(call['args']),'id':call['id'],'index':index} for index,call in enumerate(getattr(message,'tool_calls',[]))]
+    return AIMessageChunk(content=message.content,additional_kwargs=message.additional_kwargs,response_metadata=message.response_metadata,
+        usage_metadata=getattr(message,'usage_metadata',None),id=message.id,tool_call_chunks=tool_call_chunks)
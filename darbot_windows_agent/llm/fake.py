@@ -0,0 +1,103 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult, ChatGeneration
+from langchain_core.messages import BaseMessage, AIMessage
+from pydantic import Field
+from time import perf_counter, sleep
+from typing import Any
+import json
+
+def serialize_message(message:BaseMessage)->str:
+    return json.dumps({'type':message.type,'content':message.content},sort_keys=True,default=str)
+
+class PrefixCheckingChatModel(BaseChatModel):
+    '''
+    A local chat model that answers from a list of responses and simulates a provider prompt cache.
+
+    Every request is compared with the previous one, the messages it shares as an identical prefix are
+    reported as cached input tokens in `usage_metadata`, the same way providers report prompt cache hits.
+
+    Args:
+        responses (list[str]): Responses returned in order, the last one repeats once the list is exhausted.
+    '''
+    responses:list[str]
+    requests:list[list[str]]=Field(default_factory=list)
+
+    @property
+    def _llm_type(self)->str:
+        return 'prefix-checking-fake'
+
+    def shared_prefix(self,previous:list[str],current:list[str])->int:
+        shared=0
+        for before,after in zip(previous,current):
+            if before!=after:
+                break
+            shared+=1
+        return shared
+
+    def _generate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        current=[serialize_message(message) for message in messages]
+        previous=self.requests[-1] if self.requests else []
+        shared=self.shared_prefix(previous,current)
+        self.requests.append(current)
+        input_tokens=sum(len(message) for message in current)//4
+        cached=sum(len(message) for message in current[:shared])//4
+        content=self.responses[min(len(self.requests)-1,len(self.responses)-1)]
+        message=AIMessage(content=content,usage_metadata={'input_tokens':input_tokens,'output_tokens':len(content)//4,
+            'total_tokens':input_tokens+len(content)//4,'input_token_details':{'cache_read':cached}})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def unstable_requests(self,volatile_tail:int=1)->list[int]:
+        '''Indices of the requests that did not start with the previous request minus its volatile tail.'''
+        unstable=[]
+        for index in range(1,len(self.requests)):
+            previous=self.requests[index-1][:len(self.requests[index-1])-volatile_tail]
+            if self.requests[index][:len(previous)]!=previous:
+                unstable.append(index)
+        return unstable
+
+class ScriptedChatModel(BaseChatModel):
+    '''
+    A deterministic chat model that answers from a script after a fixed latency.
+
+    The time spent inside the model is accumulated in `elapsed`, so a caller can subtract it and measure
+    only its own overhead. Responses can be messages with tool calls, `bind_tools` records the tools and
+    every request is kept in `requests`.
+
+    Args:
+        responses (list[str|AIMessage]): Responses returned in order, the last one repeats once the list is exhausted.
+        latency (float, optional): Seconds every response takes. Defaults to 0.0.
+    '''
+    responses:list[str|AIMessage]
+    latency:float=0.0
+    tools:list[dict]=Field(default_factory=list)
+    requests:list[list[BaseMessage]]=Field(default_factory=list)
+    calls:int=0
+    elapsed:float=0.0
+
+    @property
+    def _llm_type(self)->str:
+        return 'scripted-fake'
+
+    def _generate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        started=perf_counter()
+        self.requests.append(list(messages))
+        if self.latency:
+            sleep(self.latency)
+        response=self.responses[min(self.calls,len(self.responses)-1)]
+        self.calls+=1
+        response=response if isinstance(response,AIMessage) else AIMessage(content=response)
+        input_tokens=sum(len(str(message.content)) for message in messages)//4
+        output_tokens=len(str(response.content))//4
+        message=response.model_copy(update={'usage_metadata':{'input_tokens':input_tokens,'output_tokens':output_tokens,'total_tokens':input_tokens+output_tokens}})
+        self.elapsed+=perf_counter()-started
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self,tools:list,**kwargs:Any)->'ScriptedChatModel':
+        # The script already holds the tool calls, binding only records what was offered
+        self.tools=list(tools)
+        return self
+
+    def reset(self):
+        self.requests=[]
+        self.calls=0
+        self.elapsed=0.0
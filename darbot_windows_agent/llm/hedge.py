@@ -0,0 +1,398 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
+from langchain_core.messages import BaseMessage, AIMessage
+from darbot_windows_agent.llm.chunks import as_chunk
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from pydantic import ConfigDict, PrivateAttr
+from typing import Any, Callable, Iterator, AsyncIterator, Literal
+from collections import deque
+from time import monotonic
+import threading
+import asyncio
+import math
+
+class AllProvidersFailedError(RuntimeError):
+    '''Raised when every provider failed, timed out or had its circuit open.'''
+
+class CircuitBreaker:
+    '''
+    Stops sending requests to a provider that keeps failing.
+
+    The circuit opens after `failure_threshold` consecutive failures, stays open for `cooldown` seconds and
+    then lets a single probe through (half open). The probe closes the circuit on success and reopens it on failure.
+
+    Args:
+        failure_threshold (int, optional): Consecutive failures that open the circuit. Defaults to 3.
+        cooldown (float, optional): Seconds the circuit stays open. Defaults to 30.0.
+        clock (Callable[[],float], optional): Time source. Defaults to time.monotonic.
+    '''
+    def __init__(self,failure_threshold:int=3,cooldown:float=30.0,clock:Callable[[],float]=monotonic):
+        self.failure_threshold=failure_threshold
+        self.cooldown=cooldown
+        self.clock=clock
+        self.failures=0
+        self.opened_at:float|None=None
+        self.probing=False
+        self.lock=threading.Lock()
+
+    @property
+    def state(self)->Literal['closed','open','half_open']:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.clock()-self.opened_at>=self.cooldown else 'open'
+
+    def allow(self)->bool:
+        with self.lock:
+            state=self.state
+            if state=='closed':
+                return True
+            if state=='half_open' and not self.probing:
+                self.probing=True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures=0
+            self.opened_at=None
+            self.probing=False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures+=1
+            if self.probing or self.failures>=self.failure_threshold:
+                self.opened_at=self.clock()
+            self.probing=False
+
+    def release(self):
+        '''Gives back the probe of a request that was abandoned before it had an outcome.'''
+        with self.lock:
+            self.probing=False
+
+class LatencyTracker:
+    '''
+    Keeps the latest latencies of a provider to hedge at a percentile of them.
+
+    Args:
+        window (int, optional): Number of latencies kept. Defaults to 100.
+    '''
+    def __init__(self,window:int=100):
+        self.latencies:deque[float]=deque(maxlen=window)
+        self.lock=threading.Lock()
+
+    def record(self,latency:float):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def percentile(self,fraction:float)->float|None:
+        with self.lock:
+            latencies=sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[max(math.ceil(fraction*len(latencies)),1)-1]
+
+class Attempt:
+    '''One request sent to one provider, its outcome is recorded once whichever of the callers sees it first.'''
+    def __init__(self,index:int):
+        self.index=index
+        self.started=monotonic()
+        self.settled=False
+        self.finished=False
+        self.lock=threading.Lock()
+
+class HedgingStats:
+    def __init__(self,names:list[str]):
+        self.requests=0
+        self.hedges=0
+        self.fallbacks=0
+        self.wins={name:0 for name in names}
+
+    def summary(self)->str:
+        wins=', '.join(f'{name}: {count}' for name,count in self.wins.items())
+        return f'Hedged model: {self.requests} requests, {self.hedges} hedged, {self.fallbacks} fell back (answered by {wins}).'
+
+class HedgedChatModel(BaseChatModel):
+    '''
+    A chat model that spreads each request over several providers.
+
+    The first provider with a closed circuit gets the request. If it has not answered within the hedge
+    percentile of its recent latencies, the next provider gets the same request and the first answer wins.
+    A provider that errors or exceeds the timeout counts as a failure of its circuit breaker and the next
+    provider is tried at once. Streaming falls back in order but does not hedge, since a stream cannot be
+    switched once chunks were emitted. The losers of a hedge are left to finish so that their latency is
+    recorded too, otherwise the percentiles would only ever see the winners and drift down.
+
+    Args:
+        llms (list[BaseChatModel]): Providers in order of preference.
+        names (list[str], optional): Names of the providers for the stats. Defaults to their position.
+        hedge_percentile (float, optional): Latency percentile of a provider after which the request is hedged. Defaults to 0.9.
+        hedge_delay (float, optional): Hedge delay in seconds until a provider has min_samples latencies. Defaults to 10.0.
+        min_samples (int, optional): Latencies needed before the percentile is used. Defaults to 5.
+        max_hedges (int, optional): Extra providers that may run a request concurrently. Defaults to 1.
+        timeout (float, optional): Seconds after which a provider counts as failed. Defaults to 120.0.
+        failure_threshold (int, optional): Consecutive failures that open a provider's circuit. Defaults to 3.
+        cooldown (float, optional): Seconds a provider's circuit stays open. Defaults to 30.0.
+    '''
+    model_config=ConfigDict(arbitrary_types_allowed=True)
+    llms:list[Any]
+    names:list[str]=[]
+    hedge_percentile:float=0.9
+    hedge_delay:float=10.0
+    min_samples:int=5
+    max_hedges:int=1
+    timeout:float=120.0
+    failure_threshold:int=3
+    cooldown:float=30.0
+    _breakers:list[CircuitBreaker]=PrivateAttr()
+    _latencies:list[LatencyTracker]=PrivateAttr()
+    _stats:HedgingStats=PrivateAttr()
+    _executor:ThreadPoolExecutor=PrivateAttr()
+    _background:set[asyncio.Task]=PrivateAttr()
+
+    def model_post_init(self,context:Any):
+        if not self.names:
+            self.names=[f'provider-{index}' for index in range(len(self.llms))]
+        self._breakers=[CircuitBreaker(self.failure_threshold,self.cooldown) for _ in self.llms]
+        self._latencies=[LatencyTracker() for _ in self.llms]
+        self._stats=HedgingStats(self.names)
+        # Abandoned slow requests keep their worker until they return, so there is room for a few of them
+        self._executor=ThreadPoolExecutor(max_workers=4*len(self.llms),thread_name_prefix='HedgedChatModel')
+        # The event loop only keeps weak references to tasks, the abandoned ones are kept here until they finish
+        self._background=set()
+
+    @property
+    def _llm_type(self)->str:
+        return 'hedged'
+
+    @property
+    def stats(self)->HedgingStats:
+        return self._stats
+
+    def breaker(self,name:str)->CircuitBreaker:
+        return self._breakers[self.names.index(name)]
+
+    def bind_tools(self,tools:list,**kwargs:Any)->'HedgedChatModel':
+        # Every provider gets the tools, the copy shares the breakers, latencies and stats with this model
+        return self.model_copy(update={'llms':[llm.bind_tools(tools,**kwargs) for llm in self.llms]})
+
+    def acquire(self,queue:list[int],first:bool)->int|None:
+        '''Takes the next provider from the queue whose circuit lets a request through.'''
+        # The circuit is only asked for the provider that is actually started, asking takes the half open probe
+        while queue:
+            index=queue.pop(0)
+            if self._breakers[index].allow():
+                return index
+        # With every circuit open the preferred provider is still tried rather than failing outright
+        return 0 if first else None
+
+    def hedge_after(self,index:int)->float:
+        tracker=self._latencies[index]
+        if len(tracker.latencies)<self.min_samples:
+            return self.hedge_delay
+        return tracker.percentile(self.hedge_percentile)
+
+    def settle(self,attempt:Attempt,error:BaseException|None,cancelled:bool=False):
+        '''Records the outcome of an attempt in its circuit breaker, once.'''
+        with attempt.lock:
+            if attempt.settled:
+                return
+            attempt.settled=True
+        breaker=self._breakers[attempt.index]
+        if cancelled:
+            breaker.release()
+        elif error is None:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def complete(self,attempt:Attempt,error:BaseException|None,cancelled:bool=False):
+        '''Records the latency and the outcome of a finished attempt.'''
+        with attempt.lock:
+            if attempt.finished:
+                return
+            attempt.finished=True
+        if error is None and not cancelled:
+            self._latencies[attempt.index].record(monotonic()-attempt.started)
+        self.settle(attempt,error,cancelled)
+
+    def on_done(self,attempt:Attempt)->Callable[[Future|asyncio.Task],None]:
+        def done(future:Future|asyncio.Task):
+            if future.cancelled():
+                self.complete(attempt,None,cancelled=True)
+            else:
+                self.complete(attempt,future.exception())
+        return done
+
+    def finish(self,index:int,message:AIMessage)->ChatResult:
+        self._stats.wins[self.names[index]]+=1
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def failed(self,errors:list[str])->AllProvidersFailedError:
+        return AllProvidersFailedError(f"All providers failed: {'; '.join(errors)}")
+
+    def _generate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        self._stats.requests+=1
+        queue=list(range(len(self.llms)))
+        pending:dict[Future,Attempt]={}
+        errors=[]
+        def launch(first:bool=False)->bool:
+            index=self.acquire(queue,first)
+            if index is None:
+                return False
+            attempt=Attempt(index)
+            future=self._executor.submit(self.llms[index].invoke,messages,stop=stop,**kwargs)
+            # A loser of the hedge is still recorded once it returns
+            future.add_done_callback(self.on_done(attempt))
+            pending[future]=attempt
+            return True
+        launch(first=True)
+        hedge_at=monotonic()+self.hedge_after(next(iter(pending.values())).index)
+        while pending:
+            now=monotonic()
+            deadline=min(attempt.started+self.timeout for attempt in pending.values())
+            wake=min(deadline,hedge_at) if queue and len(pending)<=self.max_hedges else deadline
+            done,_=wait(list(pending),timeout=max(wake-now,0),return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt=pending.pop(future)
+                error=future.exception()
+                self.complete(attempt,error)
+                if error is None:
+                    for other in pending:
+                        other.cancel()
+                    return self.finish(attempt.index,future.result())
+                errors.append(f'{self.names[attempt.index]}: {error}')
+            now=monotonic()
+            for future,attempt in list(pending.items()):
+                if now-attempt.started>=self.timeout:
+                    # The thread cannot be interrupted, its late answer only adds its latency
+                    pending.pop(future)
+                    future.cancel()
+                    self.settle(attempt,TimeoutError())
+                    errors.append(f'{self.names[attempt.index]}: timed out after {self.timeout}s')
+            if queue and not pending:
+                if launch():
+                    self._stats.fallbacks+=1
+                    hedge_at=monotonic()+self.hedge_after(pending[next(iter(pending))].index)
+            elif queue and now>=hedge_at and len(pending)<=self.max_hedges:
+                if launch():
+                    self._stats.hedges+=1
+                    hedge_at=monotonic()+self.hedge_after(pending[next(reversed(pending))].index)
+        raise self.failed(errors)
+
+    async def _agenerate(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->ChatResult:
+        self._stats.requests+=1
+        queue=list(range(len(self.llms)))
+        pending:dict[asyncio.Task,Attempt]={}
+        errors=[]
+        def launch(first:bool=False)->bool:
+            index=self.acquire(queue,first)
+            if index is None:
+                return False
+            attempt=Attempt(index)
+            task=asyncio.ensure_future(self.llms[index].ainvoke(messages,stop=stop,**kwargs))
+            task.add_done_callback(self.on_done(attempt))
+            pending[task]=attempt
+            return True
+        launch(first=True)
+        hedge_at=monotonic()+self.hedge_after(next(iter(pending.values())).index)
+        try:
+            while pending:
+                now=monotonic()
+                deadline=min(attempt.started+self.timeout for attempt in pending.values())
+                wake=min(deadline,hedge_at) if queue and len(pending)<=self.max_hedges else deadline
+                done,_=await asyncio.wait(list(pending),timeout=max(wake-now,0),return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt=pending.pop(task)
+                    error=task.exception()
+                    self.complete(attempt,error)
+                    if error is None:
+                        # The losers run to completion in the background so that their latency is recorded
+                        for other in pending:
+                            self._background.add(other)
+                            other.add_done_callback(self._background.discard)
+                        pending.clear()
+                        return self.finish(attempt.index,task.result())
+                    errors.append(f'{self.names[attempt.index]}: {error}')
+                now=monotonic()
+                for task,attempt in list(pending.items()):
+                    if now-attempt.started>=self.timeout:
+                        pending.pop(task)
+                        task.cancel()
+                        self.settle(attempt,TimeoutError())
+                        errors.append(f'{self.names[attempt.index]}: timed out after {self.timeout}s')
+                if queue and not pending:
+                    if launch():
+                        self._stats.fallbacks+=1
+                        hedge_at=monotonic()+self.hedge_after(pending[next(iter(pending))].index)
+                elif queue and now>=hedge_at and len(pending)<=self.max_hedges:
+                    if launch():
+                        self._stats.hedges+=1
+                        hedge_at=monotonic()+self.hedge_after(pending[next(reversed(pending))].index)
+        finally:
+            # Only left over when the request itself was cancelled or failed
+            for task in pending:
+                task.cancel()
+        raise self.failed(errors)
+
+    def _stream(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->Iterator[ChatGenerationChunk]:
+        self._stats.requests+=1
+        queue=list(range(len(self.llms)))
+        errors=[]
+        first=True
+        while (index:=self.acquire(queue,first)) is not None:
+            first=False
+            attempt=Attempt(index)
+            emitted=ended=False
+            error=None
+            try:
+                for chunk in self.llms[index].stream(messages,stop=stop,**kwargs):
+                    emitted=True
+                    yield ChatGenerationChunk(message=as_chunk(chunk))
+                ended=True
+            except Exception as exception:
+                error=exception
+                if emitted:
+                    raise
+                errors.append(f'{self.names[index]}: {error}')
+                self._stats.fallbacks+=1
+                continue
+            finally:
+                self.finish_stream(attempt,error,emitted,ended)
+            return
+        raise self.failed(errors)
+
+    def finish_stream(self,attempt:Attempt,error:BaseException|None,emitted:bool,ended:bool):
+        # Consumers close the stream once they have what they need, that and any stream that emitted chunks is a success
+        if error is None and not (emitted or ended):
+            self.complete(attempt,None,cancelled=True)
+            return
+        self.complete(attempt,error)
+        if error is None:
+            self._stats.wins[self.names[attempt.index]]+=1
+
+    async def _astream(self,messages:list[BaseMessage],stop:list[str]|None=None,run_manager=None,**kwargs:Any)->AsyncIterator[ChatGenerationChunk]:
+        self._stats.requests+=1
+        queue=list(range(len(self.llms)))
+        errors=[]
+        first=True
+        while (index:=self.acquire(queue,first)) is not None:
+            first=False
+            attempt=Attempt(index)
+            emitted=ended=False
+            error=None
+            try:
+                async for chunk in self.llms[index].astream(messages,stop=stop,**kwargs):
+                    emitted=True
+                    yield ChatGenerationChunk(message=as_chunk(chunk))
+                ended=True
+            except Exception as exception:
+                error=exception
+                if emitted:
+                    raise
+                errors.append(f'{self.names[index]}: {error}')
+                self._stats.fallbacks+=1
+                continue
+            finally:
+                self.finish_stream(attempt,error,emitted,ended)
+            return
+        raise self.failed(errors)
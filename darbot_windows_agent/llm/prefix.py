@@ -0,0 +1,63 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+CACHE_CONTROL={'type':'ephemeral'}
+
+def supports_cache_hints(llm:BaseChatModel)->bool:
+    # Anthropic needs explicit breakpoints, OpenAI, Gemini and Groq cache shared prefixes on their own
+    return llm is not None and 'anthropic' in getattr(llm,'_llm_type','')
+
+def with_cache_hint(message:BaseMessage)->BaseMessage:
+    content=message.content
+    if isinstance(content,str):
+        content=[{'type':'text','text':content}]
+    else:
+        content=[dict(part) if isinstance(part,dict) else {'type':'text','text':part} for part in content]
+    content[-1]['cache_control']=CACHE_CONTROL
+    return message.model_copy(update={'content':content})
+
+def with_cache_hints(messages:list[BaseMessage])->list[BaseMessage]:
+    '''Marks the system prompt and the end of the stable turns as cache breakpoints, the volatile last message is left out.'''
+    hinted=list(messages)
+    for index in {0,len(messages)-2}:
+        if 0<=index<len(messages)-1:
+            hinted[index]=with_cache_hint(messages[index])
+    return hinted
+
+def cached_input_tokens(message:BaseMessage)->tuple[int,int]|None:
+    '''Returns the cached and total input tokens reported in the response metadata, if the provider reports them.'''
+    usage=getattr(message,'usage_metadata',None)
+    if not usage or not usage.get('input_tokens'):
+        return None
+    details=usage.get('input_token_details') or {}
+    return details.get('cache_read',0),usage['input_tokens']
+
+class PrefixCacheStats:
+    '''
+    Accumulates how many input tokens the provider served from its prompt cache.
+    '''
+    def __init__(self):
+        self.reset()
+
+    def record(self,message:BaseMessage)->float|None:
+        '''Records a response, returns its prefix-hit ratio or None if the provider reports no usage.'''
+        tokens=cached_input_tokens(message)
+        if tokens is None:
+            return None
+        cached,total=tokens
+        self.requests+=1
+        self.cached_tokens+=cached
+        self.input_tokens+=total
+        return cached/total
+
+    @property
+    def ratio(self)->float:
+        return self.cached_tokens/self.input_tokens if self.input_tokens else 0.0
+
+    def summary(self)->str:
+        return f'Prompt cache: {self.cached_tokens} of {self.input_tokens} input tokens served from cache ({self.ratio:.0%}) over {self.requests} requests.'
+
+    def reset(self):
+        self.requests=0
+        self.cached_tokens=0
+        self.input_tokens=0
@@ -0,0 +1,7 @@
+from darbot_windows_agent.tracing.tracer import Tracer, Span, SpanSummary
+
+__all__ = [
+    'Tracer',
+    'Span',
+    'SpanSummary'
+]
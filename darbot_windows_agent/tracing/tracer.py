@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+from time import perf_counter_ns
+from datetime import datetime
+from pathlib import Path
+import threading
+import json
+import math
+import os
+
+@dataclass
+class Span:
+    name:str
+    category:str
+    start:int # Microseconds since the tracer was reset
+    duration:int # Microseconds
+    thread_id:int
+    thread_name:str
+    args:dict=field(default_factory=dict)
+
+@dataclass
+class SpanSummary:
+    name:str
+    count:int
+    total:float # Milliseconds, like the percentiles
+    p50:float
+    p90:float
+    p99:float
+    max:float
+
+    def to_string(self)->str:
+        return f'{self.name:<24} {self.count:>6} {self.total:>10.1f} {self.p50:>9.1f} {self.p90:>9.1f} {self.p99:>9.1f} {self.max:>9.1f}'
+
+def percentile(durations:list[float],fraction:float)->float:
+    # Nearest rank on sorted durations, exact for the small samples of a run
+    rank=max(math.ceil(fraction*len(durations)),1)
+    return durations[rank-1]
+
+class Tracer:
+    '''
+    Records timed spans of an agent run and exports them as a Chrome trace timeline.
+
+    Spans can be opened from any thread, each one keeps the thread it ran on so parallel work such as
+    the per-app tree traversal shows up as separate tracks in chrome://tracing or Perfetto.
+
+    Args:
+        enabled (bool, optional): A disabled tracer records nothing and costs one branch per span. Defaults to True.
+        output_dir (str, optional): Directory for the trace files, a trace is written per run when set. Defaults to None.
+    '''
+    def __init__(self,enabled:bool=True,output_dir:str=None):
+        self.enabled=enabled
+        self.output_dir=Path(output_dir) if output_dir else None
+        self.lock=threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans:list[Span]=[]
+            self.origin=perf_counter_ns()
+
+    @contextmanager
+    def span(self,name:str,category:str='agent',**args)->Iterator[dict]:
+        '''Times the block, the yielded dict holds the span args and can be filled in while it runs (e.g. token counts).'''
+        if not self.enabled:
+            yield args
+            return
+        started=perf_counter_ns()
+        try:
+            yield args
+        finally:
+            ended=perf_counter_ns()
+            thread=threading.current_thread()
+            span=Span(name=name,category=category,start=(started-self.origin)//1000,duration=(ended-started)//1000,thread_id=thread.ident,thread_name=thread.name,args=args)
+            with self.lock:
+                self.spans.append(span)
+
+    def to_chrome_trace(self)->dict:
+        pid=os.getpid()
+        with self.lock:
+            spans=list(self.spans)
+        events=[{'name':'thread_name','ph':'M','pid':pid,'tid':thread_id,'args':{'name':thread_name}} for thread_id,thread_name in {(span.thread_id,span.thread_name) for span in spans}]
+        events+=[{
+            'name':span.name,
+            'cat':span.category,
+            'ph':'X',
+            'ts':span.start,
+            'dur':span.duration,
+            'pid':pid,
+            'tid':span.thread_id,
+            'args':span.args
+        } for span in spans]
+        return {'traceEvents':events,'displayTimeUnit':'ms'}
+
+    def export(self,path:str|Path=None)->Path:
+        '''Writes the trace as JSON, by default to a timestamped file in the output directory.'''
+        if path is None:
+            if self.output_dir is None:
+                raise ValueError('No path given and the tracer has no output directory.')
+            path=self.output_dir.joinpath(f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.json")
+        path=Path(path)
+        path.parent.mkdir(parents=True,exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace(),default=str),encoding='utf-8')
+        return path
+
+    def summary(self)->list[SpanSummary]:
+        '''Percentiles of the span durations per name, slowest total first.'''
+        durations:dict[str,list[float]]={}
+        with self.lock:
+            for span in self.spans:
+                durations.setdefault(span.name,[]).append(span.duration/1000)
+        summaries=[]
+        for name,values in durations.items():
+            values.sort()
+            summaries.append(SpanSummary(name=name,count=len(values),total=sum(values),p50=percentile(values,0.5),p90=percentile(values,0.9),p99=percentile(values,0.99),max=values[-1]))
+        return sorted(summaries,key=lambda summary:summary.total,reverse=True)
+
+    def summary_to_string(self)->str:
+        header=f"{'Span':<24} {'Count':>6} {'Total ms':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'Max ms':>9}"
+        return '\n'.join([header]+[summary.to_string() for summary in self.summary()])
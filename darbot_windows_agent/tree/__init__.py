@@ -17,10 +17,11 @@ class Tree:
         self.desktop=desktop
 
     def get_state(self)->TreeState:
-        sleep(0.5)
-        # Get the root control of the desktop
-        root=GetRootControl()
-        interactive_nodes,informative_nodes,scrollable_nodes=self.get_appwise_nodes(node=root)
+        self.desktop.settle(0.5)
+        with self.desktop.tracer.span('tree',category='tree'):
+            # Get the root control of the desktop
+            root=GetRootControl()
+            interactive_nodes,informative_nodes,scrollable_nodes=self.get_appwise_nodes(node=root)
         return TreeState(interactive_nodes=interactive_nodes,informative_nodes=informative_nodes,scrollable_nodes=scrollable_nodes)
     
     def get_appwise_nodes(self,node:Control) -> tuple[list[TreeElementNode],list[TextElementNode]]:
@@ -38,7 +39,7 @@ class Tree:
         interactive_nodes,informative_nodes,scrollable_nodes=[],[],[]
         # Parallel traversal (using ThreadPoolExecutor) to get nodes from each app
         with ThreadPoolExecutor() as executor:
-            future_to_node = {executor.submit(self.get_nodes, app,self.desktop.is_app_browser(app)): app for app in apps}
+            future_to_node = {executor.submit(self.get_traced_nodes, app,self.desktop.is_app_browser(app)): app for app in apps}
             for future in as_completed(future_to_node):
                 try:
                     result = future.result()
@@ -51,6 +52,12 @@ class Tree:
                     print(f"Error processing node {future_to_node[future].Name}: {e}")
         return interactive_nodes,informative_nodes,scrollable_nodes
 
+    def get_traced_nodes(self, node: Control, is_browser=False) -> tuple[list[TreeElementNode],list[TextElementNode],list[ScrollElementNode]]:
+        with self.desktop.tracer.span('traverse',category='tree',app=node.Name.strip(),is_browser=is_browser) as span:
+            result=self.get_nodes(node,is_browser)
+            span['nodes']=sum(len(nodes) for nodes in result)
+        return result
+
     def get_nodes(self, node: Control, is_browser=False) -> tuple[list[TreeElementNode],list[TextElementNode],list[ScrollElementNode]]:
         interactive_nodes, informative_nodes, scrollable_nodes = [], [], []
         app_name=node.Name.strip()
@@ -233,15 +240,12 @@ class Tree:
     def get_random_color(self):
         return "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
-    def annotated_screenshot(self, nodes: list[TreeElementNode],scale:float=0.7) -> Image.Image:
-        screenshot = self.desktop.get_screenshot(scale=scale)
-        sleep(0.25)
-        # Add padding
+    def annotated_screenshot(self, nodes: list[TreeElementNode],scale:float=0.7,region:BoundingBox=None) -> Image.Image:
+        # The desktop adds the padding while capturing
         padding = 20
-        width = screenshot.width + (2 * padding)
-        height = screenshot.height + (2 * padding)
-        padded_screenshot = Image.new("RGB", (width, height), color=(255, 255, 255))
-        padded_screenshot.paste(screenshot, (padding, padding))
+        padded_screenshot = self.desktop.get_screenshot(scale=scale,region=region,padding=padding)
+        with self.desktop.tracer.span('settle',category='wait',timeout=0.25,mode='sleep'):
+            sleep(0.25)
 
         draw = ImageDraw.Draw(padded_screenshot)
         font_size = 12
@@ -253,16 +257,25 @@ class Tree:
         def get_random_color():
             return "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
+        # Coordinates are remapped into the captured region (the whole screen when no region is given)
+        offset_x,offset_y=(region.left,region.top) if region else (0,0)
+
+        def is_node_in_region(node: TreeElementNode):
+            if region is None:
+                return True
+            box = node.bounding_box
+            return box.left < region.right and box.right > region.left and box.top < region.bottom and box.bottom > region.top
+
         def draw_annotation(label, node: TreeElementNode):
             box = node.bounding_box
             color = get_random_color()
 
             # Scale and pad the bounding box also clip the bounding box
             adjusted_box = (
-                int(box.left * scale) + padding,
-                int(box.top * scale) + padding,
-                int(box.right * scale) + padding,
-                int(box.bottom * scale) + padding
+                int((box.left - offset_x) * scale) + padding,
+                int((box.top - offset_y) * scale) + padding,
+                int((box.right - offset_x) * scale) + padding,
+                int((box.bottom - offset_y) * scale) + padding
             )
             # Draw bounding box
             draw.rectangle(adjusted_box, outline=color, width=2)
@@ -283,8 +296,10 @@ class Tree:
             draw.text((label_x1 + 2, label_y1 + 2), str(label), fill=(255, 255, 255), font=font)
 
         # Draw annotations in parallel
+        # Labels keep the index of the node in the full list, even when nodes outside the region are skipped
+        labelled_nodes=[(label,node) for label,node in enumerate(nodes) if is_node_in_region(node)]
         with ThreadPoolExecutor() as executor:
-            executor.map(draw_annotation, range(len(nodes)), nodes)
+            executor.map(lambda labelled_node: draw_annotation(*labelled_node), labelled_nodes)
         return padded_screenshot
     
     def get_annotated_image_data(self)->tuple[Image.Image,list[TreeElementNode]]:
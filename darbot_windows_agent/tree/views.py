@@ -1,4 +1,6 @@
 from dataclasses import dataclass,field
+from typing import TextIO
+from io import StringIO
 
 @dataclass
 class TreeState:
@@ -7,14 +9,47 @@ class TreeState:
     scrollable_nodes:list['ScrollElementNode']=field(default_factory=list)
 
     def interactive_elements_to_string(self)->str:
-        return '\n'.join([f'Label: {index} App Name: {node.app_name} ControlType: {f'{node.control_type} Control'} Name: {node.name} Shortcut: {node.shortcut} Cordinates: {node.center.to_string()}' for index,node in enumerate(self.interactive_nodes)])
+        buffer=StringIO()
+        self.write_interactive_elements(buffer)
+        return buffer.getvalue()
     
     def informative_elements_to_string(self)->str:
-        return '\n'.join([f'App Name: {node.app_name} Name: {node.name}' for node in self.informative_nodes])
+        buffer=StringIO()
+        self.write_informative_elements(buffer)
+        return buffer.getvalue()
     
     def scrollable_elements_to_string(self)->str:
-        n=len(self.interactive_nodes)
-        return '\n'.join([f'Label: {n+index} App Name: {node.app_name} ControlType: {f'{node.control_type} Control'} Name: {node.name} Cordinates: {node.center.to_string()} Horizontal Scrollable: {node.horizontal_scrollable} Vertical Scrollable: {node.vertical_scrollable}' for index,node in enumerate(self.scrollable_nodes)])
+        buffer=StringIO()
+        self.write_scrollable_elements(buffer)
+        return buffer.getvalue()
+
+    def write_interactive_elements(self,buffer:TextIO):
+        for index,node in enumerate(self.interactive_nodes):
+            if index:
+                buffer.write('\n')
+            buffer.write(self.interactive_element_line(index,node))
+
+    def write_informative_elements(self,buffer:TextIO):
+        for index,node in enumerate(self.informative_nodes):
+            if index:
+                buffer.write('\n')
+            buffer.write(self.informative_element_line(node))
+
+    def write_scrollable_elements(self,buffer:TextIO):
+        for index,node in enumerate(self.scrollable_nodes):
+            if index:
+                buffer.write('\n')
+            buffer.write(self.scrollable_element_line(index,node))
+
+    def interactive_element_line(self,index:int,node:'TreeElementNode')->str:
+        return f'Label: {index} App Name: {node.app_name} ControlType: {node.control_type} Control Name: {node.name} Shortcut: {node.shortcut} Cordinates: {node.center.to_string()}'
+
+    def informative_element_line(self,node:'TextElementNode')->str:
+        return f'App Name: {node.app_name} Name: {node.name}'
+
+    def scrollable_element_line(self,index:int,node:'ScrollElementNode')->str:
+        # Scrollable elements are labelled after the interactive ones
+        return f'Label: {len(self.interactive_nodes)+index} App Name: {node.app_name} ControlType: {node.control_type} Control Name: {node.name} Cordinates: {node.center.to_string()} Horizontal Scrollable: {node.horizontal_scrollable} Vertical Scrollable: {node.vertical_scrollable}'
     
 @dataclass
 class BoundingBox:
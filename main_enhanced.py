@@ -172,6 +172,13 @@ def main():
     print("🤖 Darbot Windows Agent - Enhanced with GitHub Copilot Integration")
     print("=" * 60)
     
+    # Probing the GitHub CLI needs only the standard library, it runs while the dependencies are imported
+    try:
+        from darbot_windows_agent.github.credentials import CREDENTIALS
+        CREDENTIALS.prefetch()
+    except ImportError:
+        pass
+    
     # Check dependencies
     if not check_dependencies():
         sys.exit(1)
@@ -0,0 +1,74 @@
+import gzip
+import json
+
+import pytest
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+from darbot_windows_agent.agent.checkpoint.service import CheckpointStore, observation_digest, SCREENSHOT_PLACEHOLDER
+from darbot_windows_agent.agent.history.service import History
+from darbot_windows_agent.agent.views import AgentState, AgentStep
+from darbot_windows_agent.agent.utils import image_message
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, BoundingBox, Center
+
+def make_state(*names):
+    active_app = App(name="Notepad", depth=0, status="Maximized", size=Size(1920, 1080), handle=1)
+    nodes = [TreeElementNode(name, "Button", "''", BoundingBox(0, 0, 10, 10, 10, 10), Center(5, 5), "Notepad") for name in names]
+    return DesktopState(apps=[], active_app=active_app, screenshot=None, tree_state=TreeState(interactive_nodes=nodes))
+
+class TestCheckpointStore:
+    """
+    Tests for the CheckpointStore in darbot_windows_agent.agent.checkpoint.service.
+    """
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return CheckpointStore(tmp_path / "checkpoints", every=2)
+
+    @pytest.fixture
+    def agent_state(self):
+        state = AgentState()
+        state.init_state(query="write a note", messages=[
+            SystemMessage(content="system"),
+            AIMessage(content="<thought>type</thought>"),
+            image_message("observation", "data:image/png;base64,AAAA"),
+        ])
+        state.summary_memory = "Opened Notepad"
+        state.previous_observation = "Typed hello"
+        return state
+
+    def test_is_due(self, store):
+        assert [step for step in range(7) if store.is_due(step)] == [2, 4, 6]
+
+    def test_round_trip(self, store, agent_state):
+        history = History()
+        history.folded_steps = 3
+        checkpoint = store.capture(agent_state, AgentStep(step_number=4, max_steps=10), history, make_state("OK"))
+        path = store.save(checkpoint)
+
+        assert path.name == f"{agent_state.id}.json.gz"
+        data = json.loads(gzip.decompress(path.read_bytes()))
+        assert data["step_number"] == 4 and "AAAA" not in json.dumps(data)
+
+        restored_state, restored_step, restored_history = AgentState(), AgentStep(max_steps=50), History()
+        store.restore(store.load(), restored_state, restored_step, restored_history)
+
+        assert restored_state.id == agent_state.id
+        assert (restored_step.step_number, restored_step.max_steps) == (4, 50)
+        assert restored_history.folded_steps == 3
+        assert restored_state.summary_memory == "Opened Notepad"
+        assert [type(message) for message in restored_state.messages] == [SystemMessage, AIMessage, HumanMessage]
+        assert restored_state.messages[2].content[1] == {"type": "text", "text": SCREENSHOT_PLACEHOLDER}
+
+    def test_load_latest_and_delete(self, store, agent_state):
+        assert store.load() is None
+        store.save(store.capture(agent_state, AgentStep(step_number=2, max_steps=10), History(), None))
+
+        assert store.load(agent_state.id).step_number == 2
+        store.delete(agent_state.id)
+        assert store.load(agent_state.id) is None
+
+    def test_observation_digest(self):
+        assert observation_digest(make_state("OK", "Cancel")) == observation_digest(make_state("OK", "Cancel"))
+        assert observation_digest(make_state("OK")) != observation_digest(make_state("OK", "Cancel"))
+        assert observation_digest(None) == ""
@@ -0,0 +1,161 @@
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+from darbot_windows_agent.agent.history.service import History, ImageRetention, estimate_tokens, message_text, message_images
+from darbot_windows_agent.agent.views import AgentState
+from darbot_windows_agent.agent.utils import image_message
+
+def action_message(step):
+    return AIMessage(content=(
+        f"<output><evaluate>Success</evaluate><memory>memory {step}</memory><thought>thought {step}</thought>"
+        f"<action_name>Click Tool</action_name><action_input>{{'loc': ({step}, {step})}}</action_input></output>"
+    ))
+
+def observation_message(step):
+    return HumanMessage(content=f"```xml\n<output>Clicked element {step}</output>\n```")
+
+def make_state(turns):
+    messages = [SystemMessage(content="system prompt"), HumanMessage(content="first observation")]
+    for step in range(1, turns + 1):
+        messages.extend([action_message(step), observation_message(step)])
+    state = AgentState()
+    state.init_state(query="test query", messages=messages)
+    return state
+
+def history_budget(state, turns):
+    # Tokens of the first `turns` turns plus the system prompt and first observation
+    return sum(estimate_tokens(message) for message in state.messages[:2 + 2 * turns])
+
+class TestHistory:
+    """
+    Tests for the History manager in darbot_windows_agent.agent.history.service.
+    """
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens(HumanMessage(content="a" * 400)) == 104
+        assert estimate_tokens(image_message("a" * 400, "data:image/png;base64,AAAA")) == 1104
+
+    def test_message_text_of_image_message(self):
+        assert message_text(image_message("prompt", "data:image/png;base64,AAAA")) == "prompt"
+
+    def test_no_compaction_within_budget(self):
+        state = make_state(turns=10)
+        history = History(max_tokens=100000, keep_last=2)
+        assert history.compact(state) is False
+        assert len(state.messages) == 22
+
+    def test_compaction_folds_oldest_turns(self):
+        state = make_state(turns=10)
+        history = History(max_tokens=1, keep_last=3)
+        assert history.compact(state) is True
+
+        assert len(state.messages) == 2 + 2 * 3
+        assert isinstance(state.messages[0], SystemMessage)
+        summary = state.messages[1].content
+        assert "<memory>memory 7</memory>" in summary
+        assert "Step 1: Click Tool(loc=(1, 1)) -> Clicked element 1" in summary
+        assert "Step 7: Click Tool(loc=(7, 7)) -> Clicked element 7" in summary
+        # The kept turns are untouched
+        assert state.messages[2].content == action_message(8).content
+        assert state.messages[-1].content == observation_message(10).content
+
+    def test_stable_layout_keeps_task_prompt(self):
+        state = make_state(turns=6)
+        task = HumanMessage(content="<user_query>test query</user_query>")
+        state.messages.insert(1, task)
+        history = History(max_tokens=1, keep_last=2)
+
+        assert history.compact(state, head=2) is True
+
+        assert state.messages[1] is task
+        assert "<memory>memory 4</memory>" in state.messages[2].content
+        # The first observation is replaced by the summary, not summarized as a step of its own
+        assert state.summary_steps[0] == "Step 1: Click Tool(loc=(1, 1)) -> Clicked element 1"
+        assert len(state.summary_steps) == 4
+        assert state.messages[3].content == action_message(5).content
+
+    def test_compaction_folds_down_to_target(self):
+        budget = history_budget(make_state(turns=10), turns=8)
+        to_budget, to_target = History(max_tokens=budget, keep_last=1), History(max_tokens=budget, keep_last=1)
+        state, lower_state = make_state(turns=10), make_state(turns=10)
+
+        assert to_budget.compact(state) is True
+        assert to_target.compact(lower_state, target_tokens=budget // 2) is True
+        # A lower target leaves headroom, so the next turns fit without rewriting the summary again
+        assert to_target.folded_steps > to_budget.folded_steps
+        assert to_target.total_tokens(lower_state.messages) < to_budget.total_tokens(state.messages)
+
+    def test_rolling_summary_keeps_step_numbers(self):
+        state = make_state(turns=4)
+        history = History(max_tokens=1, keep_last=2)
+        history.compact(state)
+        state.messages.extend([action_message(5), observation_message(5)])
+        history.compact(state)
+        assert state.summary_steps[-1].startswith("Step 3: Click Tool(loc=(3, 3))")
+        assert history.stats(state.messages).folded_steps == 3
+        assert history.stats(state.messages).compactions == 2
+
+    def test_summary_is_capped(self):
+        state = make_state(turns=10)
+        history = History(max_tokens=1, keep_last=1, max_summary_steps=4)
+        history.compact(state)
+        assert len(state.summary_steps) == 4
+        assert state.summary_steps[0] == "... earlier steps omitted"
+        assert state.summary_steps[1].startswith("Step 7:")
+
+    def test_token_counts_are_cached(self):
+        calls = []
+        history = History(token_counter=lambda message: calls.append(message) or 10)
+        message = HumanMessage(content="hello")
+        assert history.count_tokens(message) == 10
+        assert history.count_tokens(message) == 10
+        assert len(calls) == 1
+
+def screenshot_uri(color=(255, 0, 0)):
+    from PIL import Image
+    from io import BytesIO
+    import base64
+    buffer = BytesIO()
+    Image.new("RGB", (640, 480), color=color).save(buffer, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+class TestImageRetention:
+    """
+    Tests for the ImageRetention policy in darbot_windows_agent.agent.history.service.
+    """
+
+    def test_previous_observation_drops_image_by_default(self):
+        retention = ImageRetention()
+        image = screenshot_uri()
+        message = retention.previous_observation(image_message("observation", image), "previous")
+        assert message.content == "previous"
+        assert retention.stats([message]).evicted_bytes == len(image)
+
+    def test_previous_observation_keeps_image_when_retaining_more(self):
+        retention = ImageRetention(keep_last=2)
+        image = screenshot_uri()
+        message = retention.previous_observation(image_message("observation", image), "previous")
+        assert message_images(message) == [image]
+        assert message_text(message) == "previous"
+
+    def test_evict_keeps_latest_images(self):
+        retention = ImageRetention(keep_last=2)
+        messages = [SystemMessage(content="system")] + [image_message(f"observation {i}", screenshot_uri()) for i in range(4)]
+        assert retention.evict(messages) == 2
+        assert message_images(messages[1]) == [] and message_images(messages[2]) == []
+        assert "[Screenshot removed to save context]" in str(messages[1].content)
+        assert len(message_images(messages[3])) == 1 and len(message_images(messages[4])) == 1
+        stats = retention.stats(messages)
+        assert stats.retained_images == 2
+        assert stats.evicted_images == 2
+
+    def test_evict_with_thumbnails(self):
+        retention = ImageRetention(keep_last=1, mode="thumbnail", thumbnail_size=32)
+        image = screenshot_uri()
+        messages = [image_message("old", image), image_message("new", screenshot_uri((0, 0, 255)))]
+        retention.evict(messages)
+        thumbnail = message_images(messages[0])[0]
+        assert thumbnail.startswith("data:image/jpeg;base64,")
+        assert len(thumbnail) < len(image)
+        # Thumbnails are not evicted again and do not count as retained screenshots
+        assert retention.evict(messages) == 0
+        assert retention.stats(messages).retained_images == 1
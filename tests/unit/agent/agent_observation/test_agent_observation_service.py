@@ -0,0 +1,75 @@
+from unittest.mock import patch, MagicMock
+
+from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.observation.service import ObservationBudget, CHARS_PER_TOKEN
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.agent.views import AgentStep
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
+
+
+def make_state(interactive=50, informative=200, apps=20):
+    box = BoundingBox(0, 0, 10, 10, 10, 10)
+    tree_state = TreeState(
+        interactive_nodes=[TreeElementNode(f"Button {index}" if index % 5 else "''", "Button", "''", box, Center(index, index), "Notepad" if index < 40 else "Explorer") for index in range(interactive)],
+        informative_nodes=[TextElementNode(f"Paragraph of text number {index}", "Notepad") for index in range(informative)],
+        scrollable_nodes=[ScrollElementNode("Document", "Pane", "Notepad", box, Center(5, 5), True, True)],
+    )
+    background = [App(name=f"Background {index}", depth=index + 1, status="Normal", size=Size(800, 600), handle=index + 2) for index in range(apps)]
+    active = App(name="Notepad", depth=0, status="Normal", size=Size(800, 600), handle=1)
+    return DesktopState(apps=background, active_app=active, screenshot=None, tree_state=tree_state)
+
+
+class TestObservationBudget:
+    """Tests for the observation token budget."""
+
+    def test_within_budget_keeps_everything(self):
+        """Nothing is elided when the observation fits."""
+        state = make_state()
+        fitted = ObservationBudget(max_tokens=100000).fit(state, observation="Clicked.", fixed_chars=1000)
+
+        assert fitted.elided == []
+        assert fitted.informative_elements == state.tree_state.informative_elements_to_string()
+        assert fitted.interactive_elements == state.tree_state.interactive_elements_to_string()
+        assert fitted.apps == state.apps_to_string()
+
+    def test_informative_text_goes_first(self):
+        """A slightly oversized observation only loses informative elements."""
+        state = make_state()
+        full = ObservationBudget(max_tokens=100000).fit(state, observation="Clicked.", fixed_chars=1000).tokens
+
+        fitted = ObservationBudget(max_tokens=full - 200).fit(state, observation="Clicked.", fixed_chars=1000)
+
+        assert fitted.elided[0].endswith("informative elements")
+        assert len(fitted.elided) == 1
+        assert "informative elements omitted" in fitted.informative_elements
+        assert fitted.apps == state.apps_to_string()
+
+    def test_elements_go_last_and_keep_labels(self):
+        """Unnamed and background elements are dropped first and the kept ones keep their labels."""
+        state = make_state()
+
+        fitted = ObservationBudget(max_tokens=1200).fit(state, observation="Clicked.", fixed_chars=1000)
+
+        assert [note.split(" ", 1)[1] for note in fitted.elided] == ["informative elements", "background apps", "elements"]
+        assert "Label: 1 App Name: Notepad" in fitted.interactive_elements
+        assert "Control Name: ''" not in fitted.interactive_elements
+        assert "App Name: Explorer" not in fitted.interactive_elements
+
+    def test_action_response_is_truncated_as_last_resort(self):
+        """A huge action response is cut so the observation still fits."""
+        fitted = ObservationBudget(max_tokens=1000).fit(make_state(), observation="x" * 100000, fixed_chars=1000)
+
+        assert "characters omitted to fit the context budget" in fitted.observation
+        assert fitted.tokens <= 1000
+
+    @patch("darbot_windows_agent.agent.prompt.service.pg")
+    def test_observation_prompt_fits_budget(self, mock_pg):
+        """The rendered prompt stays within the budget."""
+        mock_pg.position.return_value = MagicMock(x=1, y=2)
+        budget = ObservationBudget(max_tokens=1500)
+
+        prompt = Prompt.observation_prompt("open notepad", AgentStep(max_steps=10), ToolResult(is_success=True, content="y" * 50000), make_state(), budget=budget)
+
+        assert len(prompt) <= 1500 * CHARS_PER_TOKEN
+        assert "Label: 1 App Name: Notepad" in prompt
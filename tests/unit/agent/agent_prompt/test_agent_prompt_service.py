@@ -4,13 +4,16 @@ from datetime import datetime
 from pathlib import Path
 
 # --- The module we are testing ---
-from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.prompt.service import Prompt, Template, load_template, load_text, system_info
+from langchain.prompts import PromptTemplate
+from importlib.resources import files
 
 # --- Import the actual classes to be mocked for autospeccing ---
 # This helps create higher-fidelity mocks.
 from darbot_windows_agent.agent.views import AgentData, AgentStep, Action
 from darbot_windows_agent.agent.registry.views import ToolResult
 from darbot_windows_agent.desktop.views import DesktopState, TreeState
+from darbot_windows_agent.tree.views import TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
 
 
 # #############################################################################
@@ -20,23 +23,23 @@ from darbot_windows_agent.desktop.views import DesktopState, TreeState
 
 @pytest.fixture
 def mock_prompt_template(mocker):
-    """Mocks both PromptTemplate and the 'files' utility it depends on."""
-    # Mock the template instance that will be returned by from_file/from_template
+    """Mocks the compiled templates returned by load_template."""
+    # Mock the template instance that will be returned by load_template
     mock_template_instance = mocker.MagicMock()
     mock_template_instance.format.return_value = "formatted prompt"
     
-    # Mock the class methods of PromptTemplate
     mocker.patch(
-        "darbot_windows_agent.agent.prompt.service.PromptTemplate.from_file",
+        "darbot_windows_agent.agent.prompt.service.load_template",
         return_value=mock_template_instance
     )
     mocker.patch(
-        "darbot_windows_agent.agent.prompt.service.PromptTemplate.from_template",
-        return_value=mock_template_instance
+        "darbot_windows_agent.agent.prompt.service.PREVIOUS_OBSERVATION_TEMPLATE",
+        mock_template_instance
     )
     
-    # Mock the file loader utility
-    mocker.patch("darbot_windows_agent.agent.prompt.service.files")
+    # The system prompt and system info are cached per process
+    Prompt.cached_system_prompt.cache_clear()
+    system_info.cache_clear()
     
     # Return the instance so we can inspect calls to .format()
     return mock_template_instance
@@ -72,6 +75,7 @@ def mock_agent_data(mocker):
     mock_action = mocker.MagicMock()
     mock_action.name = "click"
     mock_action.params = {"element_id": 1}
+    mock_action.id = None
 
     # Create the main autospecced mock for AgentData
     agent_data = mocker.create_autospec(
@@ -80,28 +84,26 @@ def mock_agent_data(mocker):
         evaluate="This is the evaluation.",
         memory="This is the memory.",
         thought="This is the thought.",
-        action=mock_action  # Assign our configured mock_action
+        action=mock_action,  # Assign our configured mock_action
+        actions=[]
     )
     return agent_data
 
 @pytest.fixture
-def mock_desktop_state(mocker):
-    """Provides a consistent, mocked DesktopState object with autospec."""
-
-    # Step 1: Create a mock for the nested TreeState object.
-    mock_tree_state = mocker.create_autospec(TreeState, instance=True)
-    mock_tree_state.interactive_elements_to_string.return_value = "Interactive: [Button 'Save']"
-    mock_tree_state.informative_elements_to_string.return_value = "Informative: [Text 'Hello World']"
-    mock_tree_state.scrollable_elements_to_string.return_value = "Scrollable: [Pane 'Main']"
+def tree_state():
+    """Provides a TreeState with one element of each kind."""
+    return TreeState(
+        interactive_nodes=[TreeElementNode("Save", "Button", "''", BoundingBox(0, 0, 10, 10, 10, 10), Center(5, 5), "Notepad")],
+        informative_nodes=[TextElementNode("Hello World", "Notepad")],
+        scrollable_nodes=[ScrollElementNode("Main", "Pane", "Notepad", BoundingBox(0, 0, 100, 100, 100, 100), Center(50, 50), False, True)],
+    )
 
-    # Step 2: Create the main DesktopState mock.
+@pytest.fixture
+def mock_desktop_state(mocker, tree_state):
+    """Provides a consistent, mocked DesktopState object with autospec."""
     desktop_state = mocker.create_autospec(DesktopState, instance=True)
+    desktop_state.tree_state = tree_state
 
-    # Step 3: Attach the nested mock as an attribute to the main mock.
-    # After fixing the real class, autospec will now allow this.
-    desktop_state.tree_state = mock_tree_state
-
-    # Step 4: Configure the methods on the main mock.
     desktop_state.active_app_to_string.return_value = "Active App: Notepad"
     desktop_state.apps_to_string.return_value = "Open Apps: [Notepad, Chrome]"
     
@@ -129,6 +131,7 @@ class TestPrompt:
             'current_datetime': 'Saturday, July 05, 2025',
             'instructions': 'Review the document\nSummarize its contents',
             'tools_prompt': 'tools_prompt_text',
+            'output_format': load_text('output_xml.md'),
             'download_directory': 'C:/Users/test_user/Downloads',
             'os': 'Windows',
             'browser': 'chrome',
@@ -140,6 +143,16 @@ class TestPrompt:
         mock_prompt_template.format.assert_called_once_with(**expected_format_args)
         assert result == "formatted prompt"
 
+    def test_system_prompt_tools_mode(self, mock_prompt_template, mock_system_info):
+        """
+        Tests that the tools mode asks for the short fields and a native tool call instead of action tags.
+        """
+        Prompt.system_prompt("chrome", "tools_prompt_text", 100, [], action_mode="tools")
+
+        output_format = mock_prompt_template.format.call_args.kwargs['output_format']
+        assert output_format == load_text('output_tools.md')
+        assert "<action_name>" not in output_format and "<thought>" in output_format
+
     def test_action_prompt(self, mock_prompt_template, mock_agent_data):
         """
         Tests `action_prompt` correctly formats agent data.
@@ -154,27 +167,22 @@ class TestPrompt:
             'evaluate': "This is the evaluation.",
             'memory': "This is the memory.",
             'thought': "This is the thought.",
-            'action_name': "click",
-            'action_input': {"element_id": 1}
+            'actions': "<action_name>click</action_name>\n    <action_input>{'element_id': 1}</action_input>"
         }
         mock_prompt_template.format.assert_called_once_with(**expected_format_args)
         assert result == "formatted prompt"
 
-    def test_previous_observation_prompt(self, mock_prompt_template, mocker):
+    def test_previous_observation_prompt(self, mock_prompt_template):
         """
         Tests `previous_observation_prompt` correctly formats the observation string.
         """
         # Arrange
-        # We need to mock dedent for this specific test
-        mock_dedent = mocker.patch("darbot_windows_agent.agent.prompt.service.dedent")
         observation_text = "The tool executed successfully."
 
         # Act
         result = Prompt.previous_observation_prompt(observation_text)
 
         # Assert
-        mock_dedent.assert_called_once()
-        # The template is created from the result of dedent, so we assert it was called with ANY string
         mock_prompt_template.format.assert_called_once_with(observation=observation_text)
         assert result == "formatted prompt"
 
@@ -212,9 +220,9 @@ class TestPrompt:
             'active_app': "Active App: Notepad",
             'cursor_location': '(100,200)',
             'apps': "Open Apps: [Notepad, Chrome]",
-            'interactive_elements': "Interactive: [Button 'Save']",
-            'informative_elements': "Informative: [Text 'Hello World']",
-            'scrollable_elements': "Scrollable: [Pane 'Main']",
+            'interactive_elements': mock_desktop_state.tree_state.write_interactive_elements,
+            'informative_elements': mock_desktop_state.tree_state.write_informative_elements,
+            'scrollable_elements': mock_desktop_state.tree_state.write_scrollable_elements,
             'query': "test query"
         }
         mock_prompt_template.format.assert_called_once_with(**expected_format_args)
@@ -228,10 +236,8 @@ class TestPrompt:
         agent_step = mocker.create_autospec(AgentStep, step_number=5, max_steps=20)
         tool_result = mocker.create_autospec(ToolResult, is_success=True, content="Done.", error=None)
         
-        # Override the default mock behavior for this specific test
-        mock_desktop_state.tree_state.interactive_elements_to_string.return_value = ""
-        mock_desktop_state.tree_state.informative_elements_to_string.return_value = ""
-        mock_desktop_state.tree_state.scrollable_elements_to_string.return_value = ""
+        # Override the default tree state for this specific test
+        mock_desktop_state.tree_state = TreeState()
 
         # Act
         result = Prompt.observation_prompt("test query", agent_step, tool_result, mock_desktop_state)
@@ -269,3 +275,49 @@ class TestPrompt:
         mock_prompt_template.format.assert_called_once_with(**expected_format_args)
         assert result == "formatted prompt"
 
+
+    def test_system_prompt_is_cached(self, mock_prompt_template, mock_system_info):
+        """
+        Tests `system_prompt` is rendered once per browser, tools, steps and instructions.
+        """
+        first = Prompt.system_prompt("chrome", "tools_prompt_text", 100, ["a"])
+        second = Prompt.system_prompt("chrome", "tools_prompt_text", 100, ["a"])
+        Prompt.system_prompt("edge", "tools_prompt_text", 100, ["a"])
+
+        assert first == second
+        assert mock_prompt_template.format.call_count == 2
+
+class TestTemplate:
+    """Tests the compiled Template used by the Prompt service."""
+
+    def test_format_matches_prompt_template(self):
+        text = "```xml\n<output>{observation}</output>\n<input>{{'a':'b'}}</input>\n```"
+        assert Template(text).format(observation="done") == PromptTemplate.from_template(text).format(observation="done")
+
+    @pytest.mark.parametrize("name", ["system.md", "action.md", "observation.md", "answer.md", "summary.md"])
+    def test_load_template_matches_prompt_template(self, name):
+        template = PromptTemplate.from_file(files('darbot_windows_agent.agent.prompt').joinpath(name))
+        values = {variable: f"<{variable}>" for variable in template.input_variables}
+        assert load_template(name).format(**values) == template.format(**values)
+
+    def test_load_template_is_cached(self):
+        assert load_template("action.md") is load_template("action.md")
+
+    def test_callable_values_write_into_the_buffer(self):
+        template = Template("Elements:\n{elements}\nEnd")
+        assert template.format(elements=lambda buffer: buffer.write("a\nb")) == "Elements:\na\nb\nEnd"
+
+    def test_observation_sections_render_like_the_string_helpers(self, tree_state):
+        template = Template("{interactive}|{informative}|{scrollable}")
+        result = template.format(
+            interactive=tree_state.write_interactive_elements,
+            informative=tree_state.write_informative_elements,
+            scrollable=tree_state.write_scrollable_elements,
+        )
+        expected = "|".join([
+            tree_state.interactive_elements_to_string(),
+            tree_state.informative_elements_to_string(),
+            tree_state.scrollable_elements_to_string(),
+        ])
+        assert result == expected
+        assert "Label: 1 App Name: Notepad ControlType: Pane Control Name: Main" in result
@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 from unittest.mock import ANY
 from textwrap import dedent
 
@@ -147,3 +148,48 @@ class TestRegistry:
         else:
             mock_langchain_tool.run.assert_not_called()
 
+    def test_aexecute_runs_tool_off_the_event_loop(self, registry_instance, mock_langchain_tool, mock_desktop):
+        """
+        Tests that `aexecute` returns the same result as `execute` and runs the tool in a worker thread.
+        """
+        import threading
+        threads = []
+        def run(tool_input):
+            threads.append(threading.current_thread())
+            return "Tool executed successfully"
+        mock_langchain_tool.run.side_effect = run
+
+        result = asyncio.run(registry_instance.aexecute("TestTool", desktop=mock_desktop, param1="value"))
+
+        assert result == ToolResult(is_success=True, content="Tool executed successfully")
+        assert threads and threads[0] is not threading.main_thread()
+
+    def test_tool_schemas_use_call_names(self):
+        """
+        Tests that the schemas for `bind_tools` carry provider-safe names and the tool arguments without `desktop`.
+        """
+        from darbot_windows_agent.agent.tools.service import click_tool, github_cli_tool
+        registry = Registry(tools=[click_tool, github_cli_tool])
+
+        schemas = registry.get_tool_schemas()
+
+        assert [schema["function"]["name"] for schema in schemas] == ["Click_Tool", "GitHub_CLI_Tool"]
+        assert "loc" in schemas[0]["function"]["parameters"]["properties"]
+        assert "desktop" not in schemas[0]["function"]["parameters"]["properties"]
+
+    def test_resolve_tool_calls(self):
+        """
+        Tests that native tool calls get their tool names back, actions parsed from text are left alone.
+        """
+        from darbot_windows_agent.agent.tools.service import click_tool
+        from darbot_windows_agent.agent.views import AgentData, Action
+        registry = Registry(tools=[click_tool])
+        agent_data = AgentData(
+            action=Action(name="Click_Tool", params={}, id="call_1"),
+            actions=[Action(name="Click_Tool", params={}, id="call_1"), Action(name="Click_Tool", params={})],
+        )
+
+        registry.resolve_tool_calls(agent_data)
+
+        assert agent_data.action.name == "Click Tool"
+        assert [action.name for action in agent_data.actions] == ["Click Tool", "Click_Tool"]
@@ -0,0 +1,72 @@
+import pytest
+
+from darbot_windows_agent.agent.router.service import ModelRouter
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.agent.views import AgentData, Action
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState
+
+def make_state(app_name="Notepad"):
+    active_app = App(name=app_name, depth=0, status="Maximized", size=Size(1920, 1080), handle=1)
+    return DesktopState(apps=[], active_app=active_app, screenshot=None, tree_state=TreeState())
+
+def make_data(*names, evaluate="Success - it worked", thought="Next step"):
+    actions = [Action(name=name, params={}) for name in names]
+    return AgentData(evaluate=evaluate, thought=thought, action=actions[-1], actions=actions if len(actions) > 1 else [])
+
+SUCCESS = ToolResult(is_success=True, content="Done")
+
+class TestModelRouter:
+    """
+    Tests for the ModelRouter in darbot_windows_agent.agent.router.service.
+    """
+
+    @pytest.fixture
+    def router(self):
+        return ModelRouter(fast_llm="fast", strong_llm="strong", pattern_repeats=2)
+
+    def step(self, router, agent_data, tool_result=SUCCESS, app_name="Notepad"):
+        decision = router.decide(make_state(app_name))
+        router.record_step(agent_data, tool_result)
+        return decision
+
+    def test_first_step_is_strong(self, router):
+        decision = router.decide(make_state())
+        assert (decision.tier, decision.reason) == ("strong", "first step of the task")
+        assert router.model(decision.tier) == "strong"
+
+    def test_failures_escalate(self, router):
+        self.step(router, make_data("Click Tool"), ToolResult(is_success=False, error="boom"))
+        assert router.decide(make_state()).reason == "previous action failed"
+        assert router.decide(make_state(), consecutive_failures=1).reason == "previous response failed"
+
+    def test_low_confidence_escalates(self, router):
+        self.step(router, make_data("Click Tool", thought=None))
+        assert router.decide(make_state()).tier == "strong"
+        self.step(router, make_data("Click Tool", evaluate="Failure - nothing happened"))
+        assert router.decide(make_state()).reason == "previous step judged a failure"
+
+    def test_new_app_escalates(self, router):
+        self.step(router, make_data("Click Tool", "Type Tool"))
+        decision = router.decide(make_state("Settings"))
+        assert (decision.tier, decision.reason) == ("strong", "first contact with Settings")
+
+    def test_step_after_batch_is_strong(self, router):
+        for _ in range(3):
+            self.step(router, make_data("Click Tool", "Type Tool"))
+        decision = router.decide(make_state())
+        assert (decision.tier, decision.reason) == ("strong", "checking the outcome of a batch of 2 actions")
+
+    def test_known_pattern_is_fast(self, router):
+        self.step(router, make_data("Key Tool"))
+        assert router.decide(make_state()).reason == "no routine signal"
+        router.record_step(make_data("Key Tool"), SUCCESS)
+        decision = router.decide(make_state())
+        assert (decision.tier, decision.reason) == ("fast", "repeating Key Tool in Notepad")
+        assert router.summary() == "Fast model used on 1 of 3 steps."
+
+    def test_reset_forgets_the_run(self, router):
+        self.step(router, make_data("Click Tool", "Type Tool"))
+        router.reset()
+        assert router.decide(make_state()).reason == "first step of the task"
+        assert len(router.decisions) == 1
@@ -0,0 +1,100 @@
+import pytest
+
+from darbot_windows_agent.agent.trajectory.service import TrajectoryStore, normalize_query, describe_step, resolve_step
+from darbot_windows_agent.agent.trajectory.views import Trajectory, TrajectoryStep, ElementDescriptor
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, BoundingBox, Center
+from darbot_windows_agent.agent.views import Action
+
+
+def make_state(app_name="Notepad", left=0):
+    """Builds a desktop state with a Save button and a text field, shifted horizontally by `left`."""
+    nodes = [
+        TreeElementNode("Save", "Button", "", BoundingBox(left, 0, left + 20, 20, 20, 20), Center(left + 10, 10), app_name),
+        TreeElementNode("Text Editor", "Edit", "", BoundingBox(left, 30, left + 200, 130, 200, 100), Center(left + 100, 80), app_name),
+    ]
+    app = App(name=app_name, depth=0, status="Normal", size=Size(800, 600), handle=1)
+    return DesktopState(apps=[], active_app=app, screenshot=None, tree_state=TreeState(interactive_nodes=nodes))
+
+
+class TestTrajectoryHelpers:
+    """Tests for recording and resolving trajectory steps."""
+
+    def test_normalize_query(self):
+        """Queries that only differ in case and whitespace share a trajectory."""
+        assert normalize_query("  Open   Notepad\n") == normalize_query("open notepad")
+
+    def test_describe_step_records_target_element(self):
+        """The element under the action location is recorded with the foreground app."""
+        step = describe_step(Action(name="Click Tool", params={"loc": (12, 11)}), make_state())
+
+        assert step.app_name == "Notepad"
+        assert step.element == ElementDescriptor(name="Save", control_type="Button", app_name="Notepad")
+
+    def test_describe_step_without_location(self):
+        """Actions without a location are recorded without an element."""
+        step = describe_step(Action(name="Key Tool", params={"key": "enter"}), make_state())
+
+        assert step.element is None
+
+    def test_resolve_step_moves_location_to_element(self):
+        """On replay the location follows the element when the window moved."""
+        step = describe_step(Action(name="Type Tool", params={"loc": (100, 80), "text": "hi"}), make_state())
+
+        action, reason = resolve_step(step, make_state(left=300))
+
+        assert action.params == {"loc": (400, 80), "text": "hi"}
+        assert reason == ""
+
+    @pytest.mark.parametrize("state, expected", [
+        (make_state(app_name="Calculator"), "expected Notepad in the foreground"),
+        (DesktopState(apps=[], active_app=make_state().active_app, screenshot=None, tree_state=TreeState()), "element 'Save' (Button) not found"),
+    ])
+    def test_resolve_step_fails_check(self, state, expected):
+        """A step whose app or element is gone cannot be replayed."""
+        step = describe_step(Action(name="Click Tool", params={"loc": (10, 10)}), make_state())
+
+        action, reason = resolve_step(step, state)
+
+        assert action is None
+        assert expected in reason
+
+
+class TestTrajectoryStore:
+    """Tests for the persisted trajectory store."""
+
+    @pytest.fixture
+    def trajectory(self):
+        return Trajectory(query="Save the file", app_name="Notepad", answer="Saved.", steps=[
+            TrajectoryStep(action=Action(name="Shortcut Tool", params={"shortcut": ["ctrl", "s"]}), app_name="Notepad"),
+        ])
+
+    def test_save_and_reload(self, tmp_path, trajectory):
+        """Saved trajectories are found again by query and app, also from a new store."""
+        path = tmp_path / "trajectories.json"
+        TrajectoryStore(path).save(trajectory)
+
+        store = TrajectoryStore(path)
+
+        assert store.find("save the  file", "Notepad") == trajectory
+        assert store.find("save the file", "Calculator") is None
+
+    def test_empty_trajectory_is_not_saved(self, tmp_path):
+        """Runs without any action are not worth replaying."""
+        store = TrajectoryStore(tmp_path / "trajectories.json")
+        store.save(Trajectory(query="hello", answer="Hi"))
+
+        assert store.find("hello", None) is None
+
+    def test_failed_replays_drop_trajectory(self, tmp_path, trajectory):
+        """A trajectory that keeps failing is dropped, a hit resets the count."""
+        store = TrajectoryStore(tmp_path / "trajectories.json", max_failures=2)
+        store.save(trajectory)
+
+        store.record_failure(trajectory)
+        store.record_hit(trajectory)
+        store.record_failure(trajectory)
+        assert store.find("Save the file", "Notepad") is not None
+
+        store.record_failure(trajectory)
+        assert store.find("Save the file", "Notepad") is None
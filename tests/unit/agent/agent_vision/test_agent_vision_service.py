@@ -0,0 +1,72 @@
+import pytest
+
+from darbot_windows_agent.agent.vision.service import VisionPolicy
+from darbot_windows_agent.agent.registry.views import ToolResult
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState, TreeElementNode, BoundingBox, Center
+
+def make_node(name):
+    return TreeElementNode(name, "Button", "''", BoundingBox(0, 0, 10, 10, 10, 10), Center(5, 5), "App")
+
+def make_state(names, app_name="Settings"):
+    active_app = App(name=app_name, depth=0, status="Maximized", size=Size(1920, 1080), handle=1)
+    return DesktopState(apps=[], active_app=active_app, screenshot=None, tree_state=TreeState(interactive_nodes=[make_node(name) for name in names]))
+
+class TestVisionPolicy:
+    """
+    Tests for the VisionPolicy in darbot_windows_agent.agent.vision.service.
+    """
+
+    @pytest.fixture
+    def policy(self):
+        return VisionPolicy(min_interactive_elements=3, max_unnamed_ratio=0.5)
+
+    @pytest.fixture
+    def success(self):
+        return ToolResult(is_success=True, content="Clicked")
+
+    def test_skips_vision_for_rich_tree(self, policy, success):
+        decision = policy.decide(make_state(["OK", "Cancel", "Apply", "Help"]), success)
+        assert decision.use_vision is False
+
+    def test_requested_by_agent(self, policy, success):
+        decision = policy.decide(make_state(["OK", "Cancel", "Apply"]), success, action_names=["Screenshot Tool", "Click Tool"])
+        assert decision.use_vision is True
+        assert decision.reason == "requested by the agent"
+
+    def test_previous_action_failed(self, policy):
+        decision = policy.decide(make_state(["OK", "Cancel", "Apply"]), ToolResult(is_success=False, error="boom"))
+        assert decision.use_vision is True
+        assert decision.reason == "previous action failed"
+
+    def test_canvas_app(self, policy, success):
+        decision = policy.decide(make_state(["OK", "Cancel", "Apply"], app_name="Untitled - Paint"), success)
+        assert decision.use_vision is True
+        assert "canvas" in decision.reason
+
+    def test_sparse_tree(self, policy, success):
+        decision = policy.decide(make_state(["OK"]), success)
+        assert decision.use_vision is True
+        assert "sparse" in decision.reason
+
+    def test_unnamed_elements(self, policy, success):
+        decision = policy.decide(make_state(["OK", "''", "''", "''"]), success)
+        assert decision.use_vision is True
+        assert "unnamed" in decision.reason
+
+    def test_empty_tree_without_minimum(self, success):
+        decision = VisionPolicy(min_interactive_elements=0).decide(make_state([]), success)
+        assert decision.use_vision is False
+
+    def test_summary(self, policy, success):
+        policy.decide(make_state(["OK"]), success)
+        policy.decide(make_state(["OK", "Cancel", "Apply"]), success)
+        assert policy.summary() == "Screenshots attached on 1 of 2 steps."
+
+    def test_reset_starts_a_new_summary(self, policy, success):
+        policy.decide(make_state(["OK"]), success)
+        policy.decide(make_state(["OK", "Cancel", "Apply"]), success)
+        policy.reset(keep=1)
+        assert policy.summary() == "Screenshots attached on 0 of 1 steps."
+        policy.reset()
+        assert policy.decisions == []
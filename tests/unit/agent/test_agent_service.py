@@ -1,18 +1,27 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.tools import BaseTool
 from termcolor import colored
 from textwrap import shorten
 
 from darbot_windows_agent.agent.service import Agent, logger
-from darbot_windows_agent.agent.views import AgentState, AgentStep, AgentResult
+from darbot_windows_agent.agent.views import AgentState, AgentStep, AgentResult, Action
 from darbot_windows_agent.agent.registry.views import ToolResult
 from darbot_windows_agent.desktop import Desktop
 from darbot_windows_agent.agent.registry.service import Registry
-from darbot_windows_agent.agent.prompt.service import Prompt
+from darbot_windows_agent.agent.prompt.service import Prompt, TOOLS_CALLING_PROMPT
 from darbot_windows_agent.agent.utils import extract_agent_data, image_message
+from darbot_windows_agent.agent.trajectory.service import TrajectoryStore
+from darbot_windows_agent.agent.trajectory.views import Trajectory, TrajectoryStep
+from darbot_windows_agent.agent.router.service import ModelRouter
+from darbot_windows_agent.agent.checkpoint.service import CheckpointStore
+from darbot_windows_agent.llm.fake import PrefixCheckingChatModel, ScriptedChatModel
+from darbot_windows_agent.tracing import Tracer
+from darbot_windows_agent.desktop.views import DesktopState, App, Size
+from darbot_windows_agent.tree.views import TreeState
 
 # Suppress logging during tests for cleaner output
 logger.setLevel(100)
@@ -56,6 +65,7 @@ def mock_agent_state():
     mock.agent_data = MagicMock(
         thought="Mock thought",
         action=MagicMock(name="MockTool", params={"param": "value"}),
+        actions=[],
     )
     return mock
 
@@ -157,6 +167,25 @@ class TestAgent:
             agent_data=mock_agent_data, messages=[mock_message]
         )
 
+    def test_reason_streaming_stops_after_action(self, agent_instance):
+        """Test that streaming stops consuming the response once the action is parsed."""
+        consumed = []
+        def chunks():
+            for text in ["<thought>Mock", " thought</thought>", "<action_name>Done Tool</action_name>",
+                         "<action_input>{'answer': 'ok'}</action_input>", "</output> trailing text"]:
+                consumed.append(text)
+                yield AIMessage(content=text)
+        agent_instance.streaming = True
+        agent_instance.llm.stream.return_value = chunks()
+
+        agent_instance.reason()
+
+        assert len(consumed) == 4
+        _, kwargs = agent_instance.agent_state.update_state.call_args
+        assert kwargs["agent_data"].thought == "Mock thought"
+        assert kwargs["agent_data"].action.params == {"answer": "ok"}
+        agent_instance.llm.invoke.assert_not_called()
+
     @patch("darbot_windows_agent.agent.service.Prompt")
     @patch("darbot_windows_agent.agent.service.image_message")
     @pytest.mark.parametrize("use_vision_flag", [True, False])
@@ -198,6 +227,56 @@ class TestAgent:
         )
         mock_image_message.assert_not_called()
 
+    def test_execute_actions_runs_batch_in_order(self, agent_instance):
+        """Test that a batch runs in order and reports every outcome."""
+        agent_instance.max_actions = 3
+        agent_instance.registry.tools_registry = {"Click Tool": None, "Type Tool": None, "Key Tool": None}
+        agent_instance.desktop.get_foreground_window.return_value = (1, "Notepad")
+        actions = [Action(name="Click Tool", params={"loc": (1, 2)}), Action(name="Type Tool", params={"text": "hi"}), Action(name="Key Tool", params={"key": "enter"})]
+
+        result = agent_instance.execute_actions(actions)
+
+        assert [call.kwargs["tool_name"] for call in agent_instance.registry.execute.call_args_list] == ["Click Tool", "Type Tool", "Key Tool"]
+        assert result.is_success is True
+        assert result.content.count("Tool executed") == 3
+
+    def test_execute_actions_aborts_on_failure(self, agent_instance):
+        """Test that the rest of the batch is skipped after a failed action."""
+        agent_instance.max_actions = 3
+        agent_instance.registry.tools_registry = {"Click Tool": None, "Type Tool": None, "Key Tool": None}
+        agent_instance.registry.execute.side_effect = [ToolResult(is_success=False, error="Element not found"), ToolResult(is_success=True, content="unused")]
+        actions = [Action(name="Click Tool", params={}), Action(name="Type Tool", params={}), Action(name="Key Tool", params={})]
+
+        result = agent_instance.execute_actions(actions)
+
+        agent_instance.registry.execute.assert_called_once()
+        assert result.is_success is False
+        assert "Skipped the remaining 2 actions" in result.error
+
+    def test_execute_actions_aborts_when_window_changes(self, agent_instance):
+        """Test that the batch stops when the foreground window changes between actions."""
+        agent_instance.max_actions = 3
+        agent_instance.registry.tools_registry = {"Click Tool": None, "Key Tool": None}
+        agent_instance.desktop.get_foreground_window.side_effect = [(1, "Notepad"), (2, "Save As")]
+        actions = [Action(name="Click Tool", params={}), Action(name="Key Tool", params={})]
+
+        result = agent_instance.execute_actions(actions)
+
+        agent_instance.registry.execute.assert_called_once()
+        assert result.is_success is True
+        assert "foreground window changed" in result.content
+
+    def test_validate_actions(self, agent_instance):
+        """Test that a batch is cut at the limit, at `Done Tool` and at unknown tools."""
+        agent_instance.max_actions = 2
+        agent_instance.registry.tools_registry = {"Click Tool": None, "Key Tool": None}
+        click, key = Action(name="Click Tool", params={}), Action(name="Key Tool", params={})
+
+        assert agent_instance.validate_actions([click, key, click])[0] == [click, key]
+        assert agent_instance.validate_actions([click, Action(name="Done Tool", params={})])[0] == [click]
+        assert agent_instance.validate_actions([click, Action(name="Unknown", params={})])[0] == [click]
+        assert agent_instance.validate_actions([click, key]) == ([click, key], None)
+
     @patch("darbot_windows_agent.agent.service.Prompt")
     def test_answer(self, mock_prompt, agent_instance):
         """Test the answer method's logic."""
@@ -295,6 +374,275 @@ class TestAgent:
         assert result.is_done is False
         assert result.error == "General Invoke Error"
 
+    @patch("darbot_windows_agent.agent.service.Prompt")
+    def test_ainvoke_task_done(self, mock_prompt, agent_instance):
+        """Test that ainvoke awaits the LLM and the Done Tool and returns the result."""
+        agent_instance.llm.ainvoke.return_value = agent_instance.llm.invoke.return_value
+        agent_instance.agent_state.is_done.return_value = True
+        agent_instance.agent_state.messages = [HumanMessage(content="prior")]
+        agent_instance.agent_state.update_state.side_effect = lambda **kwargs: agent_instance.agent_state.messages.extend(kwargs.get("messages") or [])
+        agent_instance.registry.aexecute.return_value = ToolResult(is_success=True, content="Task done")
+        mock_prompt.answer_prompt.return_value = "answer_prompt"
+
+        result = asyncio.run(agent_instance.ainvoke("test query"))
+
+        agent_instance.llm.ainvoke.assert_awaited_once()
+        agent_instance.llm.invoke.assert_not_called()
+        reasoned = agent_instance.agent_state.update_state.call_args_list[0].kwargs["agent_data"]
+        assert reasoned.action.name == "Done Tool"
+        agent_instance.registry.aexecute.assert_awaited_once()
+        assert result.is_done is True
+
+    @patch("darbot_windows_agent.agent.service.Prompt")
+    def test_ainvoke_action_path(self, mock_prompt, agent_instance):
+        """Test that ainvoke runs the action and the observation without blocking the loop."""
+        agent_instance.areason = AsyncMock()
+        agent_instance.aaction = AsyncMock()
+        agent_instance.agent_state.is_done.return_value = False
+        agent_instance.agent_step.is_last_step.side_effect = [False, True]
+
+        result = asyncio.run(agent_instance.ainvoke("test query"))
+
+        agent_instance.areason.assert_awaited_once()
+        agent_instance.aaction.assert_awaited_once()
+        agent_instance.agent_step.increment_step.assert_called_once()
+        assert result.error == "Maximum steps reached."
+
+    @patch("darbot_windows_agent.agent.service.Prompt")
+    def test_invoke_replays_cached_trajectory(self, mock_prompt, agent_instance):
+        """Test that a cached trajectory is replayed without calling the LLM."""
+        trajectory = Trajectory(query="test query", answer="Cached answer", steps=[
+            TrajectoryStep(action=Action(name="Key Tool", params={"key": "enter"})),
+        ])
+        agent_instance.trajectory_store = MagicMock(spec=TrajectoryStore)
+        agent_instance.trajectory_store.find.return_value = trajectory
+        agent_instance.desktop.desktop_state = None
+        agent_instance.desktop.get_state.return_value.active_app = None
+
+        result = agent_instance.invoke("test query")
+
+        agent_instance.llm.invoke.assert_not_called()
+        agent_instance.registry.execute.assert_called_once_with(tool_name="Key Tool", desktop=agent_instance.desktop, key="enter")
+        agent_instance.trajectory_store.record_hit.assert_called_once_with(trajectory)
+        assert result.content == "Cached answer"
+
+    @patch("darbot_windows_agent.agent.service.Prompt")
+    def test_replay_ends_session(self, mock_prompt, agent_instance):
+        """Test that a successful replay stops the recorder and the cursor watcher like a reasoned run."""
+        trajectory = Trajectory(query="test query", answer="Cached answer", steps=[
+            TrajectoryStep(action=Action(name="Key Tool", params={"key": "enter"})),
+        ])
+        agent_instance.trajectory_store = MagicMock(spec=TrajectoryStore)
+        agent_instance.trajectory_store.find.return_value = trajectory
+        agent_instance.desktop.desktop_state = None
+        agent_instance.desktop.get_state.return_value.active_app = None
+
+        with patch.object(agent_instance, "end_session", wraps=agent_instance.end_session) as end_session:
+            result = asyncio.run(agent_instance.ainvoke("test query"))
+
+        end_session.assert_called_once()
+        agent_instance.desktop.stop_recorder.assert_called_once()
+        assert result.content == "Cached answer"
+
+    @patch("darbot_windows_agent.agent.service.Prompt")
+    def test_invoke_falls_back_when_replay_fails(self, mock_prompt, agent_instance):
+        """Test that a failed replay hands over to the LLM with a report of what was replayed."""
+        trajectory = Trajectory(query="test query", answer="Cached answer", steps=[
+            TrajectoryStep(action=Action(name="Key Tool", params={"key": "enter"})),
+        ])
+        agent_instance.trajectory_store = MagicMock(spec=TrajectoryStore)
+        agent_instance.trajectory_store.find.return_value = trajectory
+        agent_instance.desktop.desktop_state = None
+        agent_instance.desktop.get_state.return_value.active_app = None
+        agent_instance.registry.execute.return_value = ToolResult(is_success=False, error="Key not found")
+        agent_instance.agent_step.is_last_step.return_value = True
+
+        agent_instance.invoke("test query")
+
+        agent_instance.trajectory_store.record_failure.assert_called_once_with(trajectory)
+        tool_result = mock_prompt.observation_prompt.call_args.kwargs["tool_result"]
+        assert "Replayed 0 of 1 steps" in tool_result.content
+
+    @patch("darbot_windows_agent.agent.service.Registry")
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_stable_layout_keeps_prefix(self, mock_desktop_class, mock_registry_class):
+        """Test that the stable layout only ever changes the last message between requests."""
+        desktop_state = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        mock_desktop_class.return_value.get_state.return_value = desktop_state
+        mock_registry_class.return_value.get_tools_prompt.return_value = "Mock Tools Prompt"
+        mock_registry_class.return_value.execute.return_value = ToolResult(is_success=True, content="Done something")
+        action = "<thought>t</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        done = "<thought>t</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"
+        llm = PrefixCheckingChatModel(responses=[action, action, action, done])
+        agent = Agent(llm=llm, message_layout="stable")
+
+        result = agent.invoke("press enter three times")
+
+        assert result.is_done is True
+        assert len(llm.requests) == 4
+        assert llm.unstable_requests() == []
+        assert agent.prefix_cache.requests == 4
+        assert agent.prefix_cache.ratio > 0.5
+
+    @patch("darbot_windows_agent.agent.service.Registry")
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_tracer_records_run_and_exports(self, mock_desktop_class, mock_registry_class, tmp_path):
+        """Test that a traced run records the LLM, tool and observe spans and writes a trace file."""
+        desktop_state = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        mock_desktop_class.return_value.get_state.return_value = desktop_state
+        mock_registry_class.return_value.get_tools_prompt.return_value = "Mock Tools Prompt"
+        mock_registry_class.return_value.execute.return_value = ToolResult(is_success=True, content="Done something")
+        action = "<thought>t</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        done = "<thought>t</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"
+        tracer = Tracer(output_dir=str(tmp_path))
+        agent = Agent(llm=PrefixCheckingChatModel(responses=[action, done]), tracer=tracer)
+
+        result = agent.invoke("press enter")
+
+        assert result.is_done is True, result.error
+        assert mock_desktop_class.call_args.kwargs["tracer"] is tracer
+        names = [span.name for span in tracer.spans]
+        assert names.count("reason") == 2 and names.count("observe") == 2
+        assert [span.args for span in tracer.spans if span.name == "tool"] == [{"tool": "Key Tool", "is_success": True}]
+        assert "input_tokens" in next(span for span in tracer.spans if span.name == "reason").args
+        assert len(list(tmp_path.glob("trace-*.json"))) == 1
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_tools_mode_uses_native_tool_calls(self, mock_desktop_class):
+        """Test that the tools mode binds the tool schemas, executes tool calls and answers each call with a tool message."""
+        mock_desktop_class.return_value.get_state.return_value = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        llm = ScriptedChatModel(responses=[
+            AIMessage(content="<evaluate>Neutral</evaluate><thought>press enter</thought>", tool_calls=[{"name": "Key_Tool", "args": {"key": "enter"}, "id": "call_1"}]),
+            AIMessage(content="<evaluate>Success</evaluate><thought>done</thought>", tool_calls=[{"name": "Done_Tool", "args": {"answer": "ok"}, "id": "call_2"}]),
+        ])
+        agent = Agent(llm=llm, action_mode="tools")
+        with patch.object(agent.registry, "execute", wraps=agent.registry.execute) as execute, \
+             patch("darbot_windows_agent.agent.tools.service.pg"):
+            result = agent.invoke("press enter")
+
+        assert (result.is_done, result.content) == (True, "ok")
+        assert execute.call_args_list[0].kwargs["tool_name"] == "Key Tool"
+        assert [tool["function"]["name"] for tool in llm.tools][:2] == ["Click_Tool", "Type_Tool"]
+        requests = llm.requests
+        system_prompt = requests[0][0].content
+        assert TOOLS_CALLING_PROMPT in system_prompt and "Tool Name:" not in system_prompt
+        action_message, tool_message = requests[1][2], requests[1][3]
+        assert action_message.tool_calls[0]["id"] == "call_1" and "<action_name>" not in action_message.content
+        assert isinstance(tool_message, ToolMessage) and tool_message.tool_call_id == "call_1"
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_router_sends_routine_steps_to_fast_model(self, mock_desktop_class):
+        """Test that the router starts on the strong model and hands a repeated action to the fast model."""
+        app = App(name="Notepad", depth=0, status="Maximized", size=Size(1920, 1080), handle=1)
+        desktop_state = DesktopState(apps=[], active_app=app, screenshot=None, tree_state=TreeState())
+        mock_desktop_class.return_value.get_state.return_value = desktop_state
+        mock_desktop_class.return_value.desktop_state = desktop_state
+        press_enter = "<evaluate>Success</evaluate><thought>press enter</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        strong = ScriptedChatModel(responses=[press_enter])
+        fast = ScriptedChatModel(responses=["<evaluate>Success</evaluate><thought>done</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"])
+        router = ModelRouter(fast_llm=fast)
+        agent = Agent(llm=strong, router=router)
+        with patch("darbot_windows_agent.agent.tools.service.pg"):
+            result = agent.invoke("press enter twice")
+
+        assert (result.is_done, result.content) == (True, "ok")
+        assert (strong.calls, fast.calls) == (2, 1)
+        assert [decision.tier for decision in router.decisions] == ["strong", "strong", "fast"]
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_resume_continues_from_checkpoint(self, mock_desktop_class, tmp_path):
+        """Test that a run stopped midway leaves a checkpoint and a new agent resumes it with a fresh observation."""
+        desktop_state = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        mock_desktop_class.return_value.get_state.return_value = desktop_state
+        mock_desktop_class.return_value.desktop_state = desktop_state
+        store = CheckpointStore(tmp_path, every=1)
+        press_enter = "<evaluate>Success</evaluate><thought>press enter</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        first = Agent(llm=ScriptedChatModel(responses=[press_enter]), max_steps=3, checkpoint_store=store)
+        with patch("darbot_windows_agent.agent.tools.service.pg"):
+            stopped = first.invoke("press enter until done")
+
+        assert stopped.error == "Maximum steps reached."
+        assert store.load().step_number == 2
+
+        llm = ScriptedChatModel(responses=["<evaluate>Success</evaluate><thought>done</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"])
+        second = Agent(llm=llm, max_steps=10, checkpoint_store=store)
+        result = second.resume()
+
+        assert (result.is_done, result.content) == (True, "ok")
+        request = llm.requests[0]
+        assert sum(isinstance(message, AIMessage) for message in request) == 2
+        assert "Resumed from a checkpoint at step 2 after a restart, the desktop is unchanged." in request[-1].content
+        assert store.load() is None
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_each_run_has_its_own_checkpoint(self, mock_desktop_class, tmp_path):
+        """Test that two runs of the same agent write two checkpoints instead of overwriting one."""
+        desktop_state = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        mock_desktop_class.return_value.get_state.return_value = desktop_state
+        mock_desktop_class.return_value.desktop_state = desktop_state
+        store = CheckpointStore(tmp_path, every=1)
+        press_enter = "<evaluate>Success</evaluate><thought>press enter</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        agent = Agent(llm=ScriptedChatModel(responses=[press_enter]), max_steps=3, checkpoint_store=store)
+        with patch("darbot_windows_agent.agent.tools.service.pg"):
+            agent.invoke("first task")
+            first_id = agent.agent_state.id
+            agent.invoke("second task")
+
+        assert first_id != agent.agent_state.id
+        assert store.load(first_id).query == "first task"
+        assert store.load(agent.agent_state.id).query == "second task"
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_vision_policy_counts_one_run(self, mock_desktop_class):
+        """Test that the vision decisions of a run start empty and a screenshot request anywhere in a batch is honoured."""
+        mock_desktop_class.return_value.get_state.return_value = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        batch = ("<evaluate>Success</evaluate><thought>look then press</thought>"
+            "<action_name>Screenshot Tool</action_name><action_input>{}</action_input>"
+            "<action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>")
+        done = "<evaluate>Success</evaluate><thought>done</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"
+        agent = Agent(llm=ScriptedChatModel(responses=[done, batch, done]), use_vision="auto", max_actions=2)
+        with patch("darbot_windows_agent.agent.tools.service.pg"), patch.object(agent, "execute_actions", return_value=ToolResult(is_success=True, content="ok")):
+            agent.invoke("first task")
+            agent.invoke("second task")
+
+        assert [decision.reason for decision in agent.vision_policy.decisions][-1] == "requested by the agent"
+        assert len(agent.vision_policy.decisions) == 2
+
+    def test_resume_without_checkpoint(self, agent_instance, tmp_path):
+        """Test that resuming without a checkpoint reports it instead of starting a run."""
+        agent_instance.checkpoint_store = CheckpointStore(tmp_path)
+
+        result = agent_instance.resume()
+
+        assert (result.is_done, result.error) == (False, "No checkpoint to resume from.")
+
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_events_and_cancel(self, mock_desktop_class):
+        """Test that every step is reported to the event handler and a cancel stops the run before the next step."""
+        mock_desktop_class.return_value.get_state.return_value = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        events = []
+        llm = ScriptedChatModel(responses=["<evaluate>Success</evaluate><thought>press enter</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"])
+        agent = Agent(llm=llm, event_handler=lambda kind, data: events.append((kind, data)))
+        agent.registry.execute = MagicMock(side_effect=lambda **kwargs: (agent.cancel(), ToolResult(is_success=True, content="Pressed"))[1])
+
+        result = agent.invoke("press enter forever")
+
+        assert result.error == "Cancelled."
+        assert [kind for kind, _ in events] == ["thought", "observation"]
+        assert events[0][1] == {"step": 0, "evaluate": "Success", "memory": None, "thought": "press enter", "actions": [{"name": "Key Tool", "params": {"key": "enter"}}]}
+        assert not agent.stop_event.is_set()
+
+    def test_chat_model_binds_tools_once(self, agent_instance):
+        """Test that the tools are bound once per model and the xml mode uses the model as is."""
+        assert agent_instance.chat_model() is agent_instance.llm
+        agent_instance.action_mode = "tools"
+        agent_instance.registry.get_tool_schemas.return_value = [{"type": "function"}]
+
+        bound = agent_instance.chat_model()
+
+        assert agent_instance.chat_model() is bound
+        agent_instance.llm.bind_tools.assert_called_once_with([{"type": "function"}])
+
     @patch("darbot_windows_agent.agent.service.Console")
     def test_print_response(self, mock_console, agent_instance):
         """Test print_response method."""
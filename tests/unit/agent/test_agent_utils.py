@@ -3,9 +3,9 @@ from unittest.mock import MagicMock, patch
 import ast
 import re
 
-from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from darbot_windows_agent.agent.views import AgentData, Action
-from darbot_windows_agent.agent.utils import read_file, extract_agent_data, image_message
+from darbot_windows_agent.agent.utils import read_file, extract_agent_data, image_message, AgentDataParser, ParseError
 
 class TestAgentUtils:
     """
@@ -67,23 +67,7 @@ class TestAgentUtils:
                 None,
                 None,
                 "no_params",
-                None,
-            ),
-            (
-                "no xml tags",
-                None,
-                None,
-                None,
-                None,
-                None,
-            ),
-            (
-                "<action_name>invalid_json</action_name><action_input>{invalid}</action_input>",
-                None,
-                None,
-                None,
-                "invalid_json",
-                "{invalid}",
+                {},
             ),
             (
                 "<action_name>empty_action</action_name><action_input></action_input>",
@@ -110,7 +94,7 @@ class TestAgentUtils:
         What is being tested:
             - Correct extraction of memory, evaluate, thought, action name, and action parameters.
             - Handling of missing tags (returns None).
-            - Handling of invalid JSON in action_input (returns raw string).
+            - Empty and null action inputs become empty parameters.
             - Correct instantiation of AgentData and Action objects.
         """
         mock_message = MagicMock(spec=BaseMessage)
@@ -129,6 +113,88 @@ class TestAgentUtils:
         else:
             assert agent_data.action is None
 
+    def test_extract_agent_data_batch(self):
+        """
+        Test that several action pairs are parsed in order into `actions`, the first one is also `action`.
+        """
+        mock_message = MagicMock(spec=BaseMessage)
+        mock_message.content = (
+            "<thought>fill the field</thought>"
+            "<action_name>Click Tool</action_name><action_input>{'loc': (10, 20)}</action_input>"
+            "<action_name>Type Tool</action_name><action_input>{'loc': (10, 20), 'text': 'hi'}</action_input>"
+            "<action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        )
+
+        agent_data = extract_agent_data(mock_message)
+
+        assert agent_data.action.name == "Click Tool"
+        assert [action.name for action in agent_data.actions] == ["Click Tool", "Type Tool", "Key Tool"]
+        assert agent_data.actions[1].params == {"loc": (10, 20), "text": "hi"}
+
+    @pytest.mark.parametrize(
+        "message_content, expected_action_params",
+        [
+            ("<action_name>Key Tool</action_name><action_input>{\"key\": \"enter\", \"hold\": false, \"delay\": null}</action_input>", {"key": "enter", "hold": False, "delay": None}),
+            ("<action_name>Key Tool</action_name><action_input>```json\n{\"key\": \"enter\"}\n```</action_input>", {"key": "enter"}),
+            ("<action_name>Key Tool</action_name><action_input>'key': 'enter'</action_input>", {"key": "enter"}),
+            ("<action_name>Click Tool</action_name><action_input>{'loc': [1, 2]</action_input>", {"loc": [1, 2]}),
+            ("<action_name>Type Tool</action_name><action_input>{'text': 'true or false'}</action_input>", {"text": "true or false"}),
+            ("```xml\n<output>\n<thought>go</thought>\n<action_name>Key Tool</action_name>\n<action_input>{'key': 'enter'}\n</output>\n```", {"key": "enter"}),
+            ("<thought>go<action_name>Key Tool<action_input>{'key': 'enter'}", {"key": "enter"}),
+            ("<action_name>Type Tool</action_name><action_input>{'text': 'Use <thought> here'}</action_input>", {"text": "Use <thought> here"}),
+            ("<thought>then <action_name> opens</thought><action_name>Type Tool</action_name><action_input>{'text': '</thought>'}</action_input>", {"text": "</thought>"}),
+        ],
+    )
+    def test_extract_agent_data_repairs(self, message_content, expected_action_params):
+        """
+        Test that common malformed outputs are repaired locally instead of failing the step.
+
+        What is being tested:
+            - JSON literals, code fences, missing outer braces and unclosed brackets in action_input.
+            - Unclosed tags that end at the next tag, at `</output>` or at the end of the response.
+            - Tag-like text inside a value that has its closing tag.
+        """
+        agent_data = extract_agent_data(AIMessage(content=message_content))
+
+        assert agent_data.action.params == expected_action_params
+
+    @pytest.mark.parametrize(
+        "message_content, expected_error",
+        [
+            ("no xml tags", "has no <action_name>"),
+            ("<action_name>Click Tool</action_name><action_input>{invalid}</action_input>", r"<action_input> of Click Tool is not a valid dictionary literal \(only literal values"),
+            ("<action_name>Click Tool</action_name><action_input>{'loc': }</action_input>", "at line 1, column"),
+            ("<action_name>Click Tool</action_name><action_input>[1, 2]</action_input>", "must be a dictionary of parameters, got list"),
+            ("<action_input>{}</action_input><action_name>Click Tool</action_name>", "without an <action_name>"),
+        ],
+    )
+    def test_extract_agent_data_errors(self, message_content, expected_error):
+        """
+        Test that outputs that cannot be repaired raise a ParseError naming the problem.
+        """
+        with pytest.raises(ParseError, match=expected_error):
+            extract_agent_data(AIMessage(content=message_content))
+
+    def test_extract_agent_data_tool_calls(self):
+        """
+        Test that native tool calls become the actions, with the short fields still read from the text.
+
+        What is being tested:
+            - Tool calls keep their ids and take the place of the action tags.
+            - Arguments the provider could not parse are repaired like an action_input.
+        """
+        message = AIMessage(
+            content="<evaluate>Success</evaluate><thought>type the name</thought>",
+            tool_calls=[{"name": "Click_Tool", "args": {"loc": [1, 2]}, "id": "call_1"}],
+            invalid_tool_calls=[{"name": "Type_Tool", "args": "{\"loc\": [1, 2], \"text\": \"hi\", \"clear\": true", "id": "call_2", "error": None}],
+        )
+
+        agent_data = extract_agent_data(message)
+
+        assert agent_data.thought == "type the name"
+        assert (agent_data.action.name, agent_data.action.id) == ("Click_Tool", "call_1")
+        assert agent_data.actions[1].params == {"loc": [1, 2], "text": "hi", "clear": True}
+
     @patch("darbot_windows_agent.agent.utils.HumanMessage")
     def test_image_message(self, mock_human_message):
         """
@@ -150,3 +216,47 @@ class TestAgentUtils:
             ]
         )
 
+
+
+class TestAgentDataParser:
+    """
+    Tests for the incremental `AgentDataParser` used when streaming responses.
+    """
+
+    def test_feed_reports_tags_as_they_close(self):
+        """
+        Test that tags are reported in the chunk that closes them, even when the closing tag is split.
+        """
+        parser = AgentDataParser()
+        assert parser.feed("<thought>open the") == []
+        assert parser.feed(" app</tho") == []
+        assert parser.feed("ught><action_name>Launch Tool</action_name>") == ["thought", "action_name"]
+        assert parser.get("thought") == "open the app"
+        assert not parser.is_action_ready()
+        assert parser.feed("<action_input>{'name': 'notepad'}</action_input>") == ["action_input"]
+        assert parser.is_action_ready()
+
+    def test_parsed_text_matches_extract_agent_data(self):
+        """
+        Test that the accumulated text parses to the same AgentData as the full response.
+        """
+        text = "<evaluate>Success</evaluate><memory>mem</memory><thought>t</thought><action_name>Click Tool</action_name><action_input>{'loc': (1, 2)}</action_input>"
+        parser = AgentDataParser()
+        for index in range(0, len(text), 7):
+            parser.feed(text[index:index + 7])
+        assert parser.text == text
+        message = MagicMock(spec=BaseMessage)
+        message.content = parser.text
+        assert extract_agent_data(message).action.params == {"loc": (1, 2)}
+
+    def test_batch_waits_for_all_actions(self):
+        """
+        Test that with batching the action is only ready once the output closes or the limit is reached.
+        """
+        parser = AgentDataParser(max_actions=3)
+        parser.feed("<action_name>Click Tool</action_name><action_input>{}</action_input>")
+        assert not parser.is_action_ready()
+        parser.feed("<action_name>Key Tool</action_name><action_input>{}</action_input>")
+        assert not parser.is_action_ready()
+        parser.feed("</output>")
+        assert parser.is_action_ready()
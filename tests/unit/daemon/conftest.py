@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from darbot_windows_agent.agent.views import AgentResult
+
+
+class FakeAgent:
+    """An agent that emits a step per query word and can be held or cancelled mid run."""
+
+    def __init__(self):
+        self.event_handler = None
+        self.stop_event = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        self.queries = []
+
+    def cancel(self):
+        self.stop_event.set()
+        self.release.set()
+
+    def invoke(self, query):
+        self.queries.append(query)
+        self.started.set()
+        if query == "boom":
+            raise RuntimeError("desktop gone")
+        for step, word in enumerate(query.split()):
+            self.event_handler("thought", {"step": step, "thought": word})
+        self.release.wait(5)
+        if self.stop_event.is_set():
+            self.stop_event.clear()
+            return AgentResult(is_done=False, error="Cancelled.")
+        return AgentResult(is_done=True, content=query.upper())
+
+
+@pytest.fixture
+def agent():
+    """A fake agent shared by the daemon tests."""
+    return FakeAgent()
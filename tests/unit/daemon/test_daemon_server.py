@@ -0,0 +1,117 @@
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from darbot_windows_agent.daemon.client import DaemonClient, DaemonError
+from darbot_windows_agent.daemon.server import DaemonServer
+from darbot_windows_agent.daemon.service import AgentDaemon
+
+
+@pytest.fixture
+def serve(agent):
+    servers = []
+    def serve(**options):
+        daemon = AgentDaemon(agent)
+        daemon.start()
+        server = DaemonServer(daemon, port=0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, daemon))
+        return server
+    yield serve
+    for server, daemon in servers:
+        server.shutdown()
+        server.server_close()
+        daemon.stop(timeout=5)
+
+
+@pytest.fixture
+def server(serve):
+    return serve(token="secret")
+
+
+def raw_request(server, method, path, body=None, headers=None):
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    connection.request(method, path, body=body, headers={"Authorization": "Bearer secret"} | (headers or {}))
+    response = connection.getresponse()
+    status, data = response.status, json.loads(response.read())
+    connection.close()
+    return status, data
+
+
+class TestDaemonServer:
+    """Tests for the local HTTP API of the daemon."""
+
+    def test_submit_stream_and_status(self, server):
+        """A submitted task streams its events until it finishes and reports its result."""
+        client = DaemonClient(server.url, token="secret")
+
+        task = client.submit("open notepad")
+        events = list(client.events(task["id"]))
+
+        assert task["status"] == "queued"
+        assert [event["kind"] for event in events] == ["status", "thought", "thought", "status"]
+        assert events[-1]["status"] == "done"
+        assert client.status(task["id"])["content"] == "OPEN NOTEPAD"
+        assert list(client.events(task["id"], after=3)) == events[3:]
+
+    def test_cancel_running_task(self, server, agent):
+        """Cancelling over the API stops the running task."""
+        client = DaemonClient(server.url, token="secret")
+        agent.release.clear()
+        task = client.submit("hold")
+        agent.started.wait(5)
+
+        client.cancel(task["id"])
+
+        assert list(client.events(task["id"]))[-1]["status"] == "cancelled"
+
+    def test_run_waits_for_the_result(self, server):
+        """run submits a task and returns its final status."""
+        assert DaemonClient(server.url, token="secret").run("type hello")["content"] == "TYPE HELLO"
+
+    def test_rejects_missing_token(self, server):
+        """Requests without the token are refused."""
+        with pytest.raises(DaemonError) as error:
+            DaemonClient(server.url, token_file=None).health()
+
+        assert error.value.status == 401
+
+    def test_generates_private_token(self, serve, tmp_path):
+        """Without a token one is generated, written for the user only and picked up by the client."""
+        token_file = tmp_path / "daemon.token"
+
+        server = serve(token_file=token_file)
+
+        assert token_file.read_text() == server.token
+        if sys.platform != "win32":
+            assert os.stat(token_file).st_mode & 0o777 == 0o600
+        assert DaemonClient(server.url, token_file=token_file).health()["status"] == "ok"
+
+    @pytest.mark.parametrize("headers, status", [
+        ({"Content-Type": "text/plain"}, 415),
+        ({"Content-Type": "application/json", "Origin": "https://example.com"}, 403),
+        ({"Content-Type": "application/json", "Host": "attacker.example:8765"}, 403),
+    ])
+    def test_rejects_browser_requests(self, server, agent, headers, status):
+        """Simple cross-site posts, requests with an Origin and rebound hosts queue nothing."""
+        body = json.dumps({"query": "open notepad"})
+
+        assert raw_request(server, "POST", "/tasks", body, headers)[0] == status
+        assert agent.queries == []
+        assert server.agent_daemon.stats()["tasks"] == 0
+
+    def test_errors(self, server):
+        """Bad bodies and unknown tasks are reported with their status code."""
+        client = DaemonClient(server.url, token="secret")
+
+        with pytest.raises(DaemonError, match="non-empty"):
+            client.call("POST", "/tasks", {"query": ""})
+        with pytest.raises(DaemonError) as error:
+            client.status("abc123")
+        assert error.value.status == 404
+        assert client.health()["queued"] == 0
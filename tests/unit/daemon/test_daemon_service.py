@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+import pytest
+
+from darbot_windows_agent.agent.service import Agent
+from darbot_windows_agent.daemon.service import AgentDaemon, Task
+from darbot_windows_agent.desktop.views import DesktopState
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+from darbot_windows_agent.tree.views import TreeState
+
+
+@pytest.fixture
+def daemon(agent):
+    daemon = AgentDaemon(agent)
+    daemon.start()
+    yield daemon
+    daemon.stop(timeout=5)
+
+
+def wait_finished(task: Task) -> Task:
+    while not task.is_finished:
+        task.wait_events(len(task.events), timeout=5)
+    return task
+
+
+class TestAgentDaemon:
+    """Tests for the task queue of the AgentDaemon."""
+
+    def test_runs_tasks_in_order_with_events(self, daemon, agent):
+        """Tasks run one after another and record their step events and final status."""
+        first, second = daemon.submit("open notepad"), daemon.submit("type hello")
+
+        wait_finished(first), wait_finished(second)
+
+        assert agent.queries == ["open notepad", "type hello"]
+        assert (first.status, first.content) == ("done", "OPEN NOTEPAD")
+        assert [event["kind"] for event in first.events] == ["status", "thought", "thought", "status"]
+        assert [event["seq"] for event in first.events] == [0, 1, 2, 3]
+        assert first.events[1]["thought"] == "open"
+
+    def test_cancel_queued_task_skips_it(self, daemon, agent):
+        """A cancelled queued task never reaches the agent."""
+        agent.release.clear()
+        running = daemon.submit("hold")
+        queued = daemon.submit("skipped")
+        agent.started.wait(5)
+
+        assert daemon.cancel(queued.id).status == "cancelled"
+        agent.release.set()
+        wait_finished(running)
+        daemon.submit("after")
+        wait_finished(daemon.submit("last"))
+
+        assert "skipped" not in agent.queries
+
+    def test_cancel_running_task_stops_the_agent(self, daemon, agent):
+        """Cancelling the running task asks the agent to stop before its next step."""
+        agent.release.clear()
+        task = daemon.submit("hold")
+        agent.started.wait(5)
+
+        daemon.cancel(task.id)
+
+        assert wait_finished(task).status == "cancelled"
+        assert not agent.stop_event.is_set()
+
+    def test_agent_exception_fails_the_task(self, daemon):
+        """An exception from the agent fails the task without stopping the worker."""
+        failed = wait_finished(daemon.submit("boom"))
+        done = wait_finished(daemon.submit("still works"))
+
+        assert (failed.status, failed.error) == ("failed", "desktop gone")
+        assert done.status == "done"
+
+    def test_prunes_finished_tasks(self, agent):
+        """Only the latest finished tasks are kept."""
+        daemon = AgentDaemon(agent, keep_finished=1)
+        daemon.start()
+        tasks = [wait_finished(daemon.submit(f"task {index}")) for index in range(3)]
+        daemon.submit("one more")
+        daemon.stop(timeout=5)
+
+        assert daemon.get(tasks[0].id) is None
+        assert daemon.get(tasks[2].id) is tasks[2]
+
+    @patch("darbot_windows_agent.agent.tools.service.pg")
+    @patch("darbot_windows_agent.agent.service.Desktop")
+    def test_warm_agent_starts_each_task_fresh(self, mock_desktop_class, mock_pg):
+        """Every task on the warm agent gets the whole step budget and starts counting at step zero."""
+        mock_desktop_class.return_value.get_state.return_value = DesktopState(apps=[], active_app=None, screenshot=None, tree_state=TreeState())
+        press_enter = "<evaluate>Success</evaluate><thought>press enter</thought><action_name>Key Tool</action_name><action_input>{'key': 'enter'}</action_input>"
+        done = "<evaluate>Success</evaluate><thought>done</thought><action_name>Done Tool</action_name><action_input>{'answer': 'ok'}</action_input>"
+        agent = Agent(llm=ScriptedChatModel(responses=[press_enter, press_enter, done, press_enter, press_enter, done]), max_steps=5)
+        daemon = AgentDaemon(agent)
+        daemon.start()
+        first = wait_finished(daemon.submit("press enter twice"))
+        second = wait_finished(daemon.submit("press enter twice again"))
+        daemon.stop(timeout=5)
+
+        assert (first.status, second.status) == ("done", "done")
+        assert [event["step"] for event in second.events if event["kind"] == "thought"] == [0, 1, 2]
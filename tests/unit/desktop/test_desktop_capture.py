@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from darbot_windows_agent.desktop.capture import Frame, MSSCapture, get_capture_backend
+from darbot_windows_agent.tree.views import BoundingBox
+
+np = pytest.importorskip("numpy")
+
+class TestFrame:
+    """
+    Tests for the raw buffer Frame in darbot_windows_agent.desktop.capture.
+    """
+
+    @pytest.fixture
+    def frame(self):
+        pixels = np.zeros((100, 200, 4), dtype=np.uint8)
+        pixels[..., 2] = 255  # Red in BGRA order
+        return Frame(pixels=pixels, left=10, top=20)
+
+    def test_dimensions(self, frame):
+        assert frame.width == 200
+        assert frame.height == 100
+
+    def test_to_image_converts_bgra_to_rgb(self, frame):
+        image = frame.to_image()
+        assert image.mode == "RGB"
+        assert image.size == (200, 100)
+        assert image.getpixel((0, 0)) == (255, 0, 0)
+
+class TestCaptureBackend:
+    """
+    Tests for capture backend selection.
+    """
+
+    def test_default_backend_is_none(self):
+        assert get_capture_backend("pyautogui") is None
+
+    def test_mss_backend_requires_mss(self):
+        with patch("darbot_windows_agent.desktop.capture.MSS_AVAILABLE", False):
+            with pytest.raises(ImportError):
+                get_capture_backend("mss")
+
+    def test_mss_grab_wraps_raw_buffer(self):
+        shot = MagicMock(width=4, height=2, raw=bytes(range(32)))
+        handle = MagicMock()
+        handle.grab.return_value = shot
+        with patch("darbot_windows_agent.desktop.capture.MSS_AVAILABLE", True), \
+             patch("darbot_windows_agent.desktop.capture.mss", create=True) as mock_mss:
+            mock_mss.mss.return_value = handle
+            frame = MSSCapture().grab(BoundingBox(left=5, top=6, right=9, bottom=8, width=4, height=2))
+        handle.grab.assert_called_once_with({"left": 5, "top": 6, "width": 4, "height": 2})
+        assert frame.pixels.shape == (2, 4, 4)
+        assert (frame.left, frame.top) == (5, 6)
@@ -0,0 +1,58 @@
+import pytest
+from unittest.mock import MagicMock
+from PIL import Image
+
+from darbot_windows_agent.desktop.recorder import FrameRecorder
+from darbot_windows_agent.desktop.views import RecorderConfig
+
+class TestFrameRecorder:
+    """
+    Tests for the background FrameRecorder in darbot_windows_agent.desktop.recorder.
+    """
+
+    @pytest.fixture
+    def mock_desktop(self):
+        mock = MagicMock()
+        mock.capture_screenshot.return_value = Image.new("RGB", (40, 20), color=(0, 0, 0))
+        return mock
+
+    @pytest.fixture
+    def recorder(self, mock_desktop):
+        return FrameRecorder(mock_desktop, RecorderConfig(fps=100, size=3, scale=0.25, quiet_period=0.0))
+
+    def test_record_fills_ring_buffer(self, recorder, mock_desktop):
+        for _ in range(5):
+            recorder.record()
+        assert len(recorder.frames()) == 3
+        mock_desktop.capture_screenshot.assert_called_with(scale=0.25)
+
+    def test_motion_between_frames(self, recorder, mock_desktop):
+        first = recorder.record()
+        assert first.motion == 1.0
+        assert recorder.record().motion == 0.0
+        mock_desktop.capture_screenshot.return_value = Image.new("RGB", (40, 20), color=(255, 255, 255))
+        assert recorder.record().motion == 1.0
+
+    def test_frame_pair(self, recorder):
+        before = recorder.record()
+        after = recorder.record()
+        assert recorder.frame_pair(before.timestamp) == (before, after)
+        assert recorder.frame_before(before.timestamp - 1) is None
+
+    def test_is_settled(self, recorder, mock_desktop):
+        assert recorder.is_settled() is False
+        recorder.record()
+        assert recorder.is_settled() is False  # The first frame counts as motion
+        recorder.record()
+        assert recorder.is_settled() is True
+        assert recorder.is_settled(since=recorder.latest().timestamp + 1) is False
+
+    def test_start_stop_and_wait_until_settled(self, recorder):
+        recorder.start()
+        try:
+            assert recorder.is_running()
+            assert recorder.wait_until_settled(timeout=2.0) is True
+        finally:
+            recorder.stop()
+        assert not recorder.is_running()
+        assert recorder.wait_until_settled(timeout=0.1) is False
@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import patch
+from PIL import Image
+
+from darbot_windows_agent.desktop.utils import resample_image
+from darbot_windows_agent.desktop.views import VisionConfig
+
+class TestResampleImage:
+    """
+    Tests for the resampling tiers in darbot_windows_agent.desktop.utils.
+    """
+
+    @pytest.fixture
+    def image(self):
+        return Image.new("RGB", (400, 200), color=(10, 20, 30))
+
+    @pytest.mark.parametrize("tier", ["fast", "balanced", "best"])
+    @pytest.mark.parametrize("scale, expected_size", [(0.5, (200, 100)), (0.7, (280, 140)), (0.25, (100, 50))])
+    def test_output_size(self, image, tier, scale, expected_size):
+        assert resample_image(image, scale=scale, tier=tier).size == expected_size
+
+    def test_no_upscaling(self, image):
+        assert resample_image(image, scale=1.0) is image
+
+    def test_fast_tier_uses_reduce_for_integer_factors(self, image):
+        with patch.object(Image.Image, "resize") as mock_resize:
+            result = resample_image(image, scale=0.5, tier="fast")
+        mock_resize.assert_not_called()
+        assert result.size == (200, 100)
+
+    @pytest.mark.parametrize("tier, expected_filter", [("balanced", Image.Resampling.BILINEAR), ("best", Image.Resampling.LANCZOS)])
+    def test_tier_filters(self, image, tier, expected_filter):
+        with patch.object(Image.Image, "resize", return_value=image) as mock_resize:
+            resample_image(image, scale=0.7, tier=tier)
+        assert mock_resize.call_args.kwargs["resample"] == expected_filter
+
+    def test_default_tier_is_best(self, image):
+        with patch.object(Image.Image, "resize", return_value=image) as mock_resize:
+            resample_image(image, scale=0.7)
+        assert mock_resize.call_args.kwargs["resample"] == Image.Resampling.LANCZOS
+        assert VisionConfig().resample == "best"
+
+    @pytest.mark.parametrize("scale", [0.5, 0.25])
+    def test_fast_tier_averages_boxes(self, scale):
+        # A one pixel checkerboard averages to grey, nearest neighbour sampling would keep black or white pixels
+        checkerboard = Image.new("L", (8, 8))
+        checkerboard.putdata([255 * ((x + y) % 2) for y in range(8) for x in range(8)])
+        pixels = list(resample_image(checkerboard, scale=scale, tier="fast").getdata())
+        assert all(96 <= pixel <= 160 for pixel in pixels)
+
+    def test_unknown_tier(self, image):
+        with pytest.raises(ValueError, match="Unknown resample tier"):
+            resample_image(image, scale=0.5, tier="ultra")
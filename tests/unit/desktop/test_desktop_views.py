@@ -3,7 +3,7 @@ from typing import Literal, Optional
 from dataclasses import dataclass, field
 from unittest.mock import MagicMock
 
-from darbot_windows_agent.desktop.views import App, Size, DesktopState
+from darbot_windows_agent.desktop.views import App, Size, DesktopState, VisionConfig
 from darbot_windows_agent.tree.views import TreeState, TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
 
 class TestDesktopViews:
@@ -91,3 +91,11 @@ class TestDesktopViews:
         state = DesktopState(apps=apps, active_app=None, screenshot=None, tree_state=mock_tree_state)
         assert state.apps_to_string() == expected_string
 
+
+    def test_vision_config_defaults(self):
+        """
+        Test VisionConfig defaults to a full screen capture at half scale.
+        """
+        config = VisionConfig()
+        assert config.capture_mode == "screen"
+        assert config.scale == 0.5
@@ -0,0 +1,168 @@
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from darbot_windows_agent.github.auth import GitHubAuth
+from darbot_windows_agent.github.credentials import CredentialCache, GitHubCredentials
+from darbot_windows_agent.github.models import ModelSelector
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def credentials(authenticated=True, token="token"):
+    return GitHubCredentials(authenticated=authenticated, token=token, status="Logged in", checked_at=0.0)
+
+
+class TestCredentialCache:
+    """Tests for the cached GitHub CLI credentials."""
+
+    def test_probes_once_per_ttl(self):
+        """Fresh credentials are served from the cache."""
+        clock = FakeClock()
+        cache = CredentialCache(ttl=300, probe=credentials, clock=clock)
+
+        assert cache.get().token == "token"
+        clock.now = 299
+        assert cache.get().token == "token"
+
+        assert cache.probes == 1
+
+    def test_stale_entry_served_during_refresh(self):
+        """An expired entry is returned at once while a background probe replaces it."""
+        clock = FakeClock()
+        release = threading.Event()
+        tokens = iter(["old", "new"])
+
+        def probe():
+            token = next(tokens)
+            if token == "new":
+                release.wait(5)
+            return credentials(token=token)
+
+        cache = CredentialCache(ttl=300, probe=probe, clock=clock)
+        cache.get()
+        clock.now = 301
+
+        assert cache.get().token == "old"
+        release.set()
+        cache.refreshing.join(5)
+        assert cache.get().token == "new"
+
+    def test_negative_results_expire_sooner(self):
+        """Not being logged in is rechecked after the negative TTL."""
+        clock = FakeClock()
+        cache = CredentialCache(ttl=300, negative_ttl=30, probe=lambda: credentials(authenticated=False, token=""), clock=clock)
+        cache.get()
+        clock.now = 31
+
+        cache.get()
+        cache.refreshing.join(5)
+
+        assert cache.probes == 2
+
+    def test_concurrent_callers_share_one_probe(self):
+        """Callers that arrive while the first probe runs wait for it instead of probing again."""
+        release = threading.Event()
+
+        def probe():
+            release.wait(5)
+            return credentials()
+
+        cache = CredentialCache(probe=probe)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(results) == 8
+        assert cache.probes == 1
+
+    def test_invalidate_discards_running_probe(self):
+        """A probe started before an invalidation does not fill the cache, the next call probes again."""
+        started, release = threading.Event(), threading.Event()
+        tokens = iter(["before", "after"])
+
+        def probe():
+            token = next(tokens)
+            if token == "before":
+                started.set()
+                release.wait(5)
+            return credentials(token=token)
+
+        cache = CredentialCache(probe=probe)
+        cache.prefetch()
+        started.wait(5)
+        cache.invalidate()
+        release.set()
+
+        assert cache.refresh().token == "after"
+        assert cache.probes == 2
+
+    def test_importing_credentials_stays_light(self):
+        """The credentials can be probed before the agent, the desktop or langchain are imported."""
+        code = "import sys, darbot_windows_agent.github.credentials; print(sorted(m for m in ('langchain', 'langchain_core', 'darbot_windows_agent.desktop', 'darbot_windows_agent.github.models') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+        assert result.stdout.strip() == "[]", result.stderr
+
+    def test_probe_errors_are_cached_as_unauthenticated(self):
+        """A failing probe reports the error instead of raising it."""
+        def probe():
+            raise OSError("boom")
+
+        result = CredentialCache(probe=probe).get()
+
+        assert result.authenticated is False
+        assert "boom" in result.status
+
+
+class TestGitHubAuthCache:
+    """Tests for GitHubAuth and the model selector reading the shared cache."""
+
+    @pytest.fixture
+    def gh(self, monkeypatch):
+        monkeypatch.setattr(GitHubAuth, "cache", CredentialCache())
+        def run(args, **kwargs):
+            stdout = "ghp_token\n" if args[1:] == ["auth", "token"] else "Logged in to github.com"
+            return subprocess.CompletedProcess(args, 0, stdout=stdout, stderr="")
+        # Both modules call the same subprocess.run, the probe and the login go through this mock
+        with patch("darbot_windows_agent.github.credentials.subprocess.run", side_effect=run) as mock_run:
+            yield mock_run
+
+    def test_status_and_token_share_one_probe(self, gh):
+        """The status and the token come from the same two gh calls."""
+        assert GitHubAuth.is_authenticated() is True
+        assert GitHubAuth.get_token() == "ghp_token"
+        assert "Logged in" in GitHubAuth.status()
+
+        assert gh.call_count == 2
+
+    def test_model_menu_probes_gh_once(self, gh):
+        """Listing the models checks the GitHub CLI once for all GitHub models."""
+        models = ModelSelector().list_available_models()
+
+        github_models = [model for model in models if model["provider"] == "github_copilot"]
+        assert len(github_models) == 3
+        assert all(model["available"] for model in github_models)
+        assert gh.call_count == 2
+
+    def test_login_invalidates_cache(self, gh):
+        """The credentials are probed again after a login."""
+        GitHubAuth.is_authenticated()
+
+        GitHubAuth.login()
+        GitHubAuth.is_authenticated()
+
+        assert [call.args[0][1:3] for call in gh.call_args_list].count(["auth", "status"]) == 2
@@ -0,0 +1,68 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from darbot_windows_agent.github.models import ModelSelector, ModelConfig
+from darbot_windows_agent.github.providers import ProviderRegistry, PROVIDERS, ENTRY_POINT_GROUP
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+
+
+class TestProviderRegistry:
+    """Tests for the lazy provider registry."""
+
+    def test_builtin_providers_are_registered(self):
+        """Every provider used by the built in models has a factory."""
+        providers = {config.provider for config in ModelSelector.AVAILABLE_MODELS.values()}
+
+        assert all(PROVIDERS.get(provider) is not None for provider in providers)
+
+    def test_loads_entry_points_once(self):
+        """Unknown providers are loaded from the entry points and cached."""
+        factory = MagicMock()
+        entry_point = MagicMock()
+        entry_point.load.return_value = factory
+        registry = ProviderRegistry()
+        with patch("darbot_windows_agent.github.providers.entry_points", return_value=[entry_point]) as entry_points:
+            assert registry.get("custom") is factory
+            assert registry.get("custom") is factory
+
+        entry_points.assert_called_once_with(group=ENTRY_POINT_GROUP, name="custom")
+
+    def test_unknown_provider(self):
+        """A provider without factory or entry point resolves to None."""
+        with patch("darbot_windows_agent.github.providers.entry_points", return_value=[]):
+            assert ProviderRegistry().get("missing") is None
+
+    def test_importing_models_skips_provider_sdks(self):
+        """Importing the model selector does not import any provider SDK."""
+        code = "import sys, darbot_windows_agent.github.models; print(sorted(m for m in ('langchain_openai', 'langchain_google_genai', 'langchain_groq', 'langchain_ollama') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+        assert result.stdout.strip() == "[]", result.stderr
+
+
+class TestModelSelectorProviders:
+    """Tests for creating models through the provider registry."""
+
+    @pytest.fixture
+    def custom_model(self, monkeypatch):
+        monkeypatch.setitem(ModelSelector.AVAILABLE_MODELS, "custom-small", ModelConfig(name="small", display_name="Small", provider="custom", requires_api_key=True, api_key_env="CUSTOM_API_KEY"))
+        monkeypatch.setitem(PROVIDERS.providers, "custom", lambda config, api_key: ScriptedChatModel(responses=[f"{config.name}:{api_key}"]))
+
+    @patch("darbot_windows_agent.github.models.GitHubAuth")
+    def test_create_llm_uses_registered_factory(self, mock_auth, custom_model, monkeypatch):
+        """The factory gets the config and the API key from the environment."""
+        monkeypatch.setenv("CUSTOM_API_KEY", "key")
+
+        llm = ModelSelector().create_llm("custom-small")
+
+        assert llm.responses == ["small:key"]
+
+    @patch("darbot_windows_agent.github.models.GitHubAuth")
+    def test_missing_api_key(self, mock_auth, custom_model, monkeypatch):
+        """A model that needs a missing API key is not created."""
+        monkeypatch.delenv("CUSTOM_API_KEY", raising=False)
+
+        assert ModelSelector().create_llm("custom-small") is None
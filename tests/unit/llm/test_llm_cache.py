@@ -0,0 +1,175 @@
+import pytest
+import asyncio
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+
+from darbot_windows_agent.llm.cache import CachedChatModel, ResponseCache, CacheMissError, cache_key
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Provides a response cache in a temporary directory."""
+    store = ResponseCache(tmp_path / "responses.db")
+    yield store
+    store.close()
+
+
+def fake_llm(*responses):
+    return GenericFakeChatModel(messages=iter(responses))
+
+
+class TestCacheKey:
+    """Tests for the normalized cache key."""
+
+    def test_whitespace_and_ids_do_not_change_key(self):
+        """Surrounding whitespace and message ids are not part of the key."""
+        first = [SystemMessage(content="system"), HumanMessage(content="hi ", id="1")]
+        second = [SystemMessage(content="system\n"), HumanMessage(content="hi", id="2")]
+        assert cache_key(first, {}) == cache_key(second, {})
+
+    def test_volatile_prompt_fields_do_not_change_key(self):
+        """The date, cursor location and step number are masked, the rest of the observation still counts."""
+        def messages(date, cursor, step, query="open notepad"):
+            observation = f"Current step: {step}\n\nCursor Location: {cursor}\n{query}"
+            return [SystemMessage(content=f"The current date is {date}.\n\nsystem"), HumanMessage(content=[{"type": "text", "text": observation}])]
+        recorded = cache_key(messages("Monday, October 19, 2026", "(10,20)", 0), {})
+        assert cache_key(messages("Tuesday, October 20, 2026", "(-5,300)", 3), {}) == recorded
+        assert cache_key(messages("Monday, October 19, 2026", "(10,20)", 0, query="open paint"), {}) != recorded
+
+    def test_images_and_params_change_key(self):
+        """Different screenshots or model parameters give different keys."""
+        def message(image):
+            return [HumanMessage(content=[{"type": "text", "text": "state"}, {"type": "image_url", "image_url": image}])]
+        assert cache_key(message("data:image/png;base64,AAAA"), {}) != cache_key(message("data:image/png;base64,BBBB"), {})
+        assert cache_key(message("data:image/png;base64,AAAA"), {"temperature": 0}) != cache_key(message("data:image/png;base64,AAAA"), {"temperature": 1})
+
+
+class TestResponseCache:
+    """Tests for the on-disk response store."""
+
+    def test_put_get_persists(self, tmp_path):
+        """Responses survive reopening the database."""
+        path = tmp_path / "responses.db"
+        store = ResponseCache(path)
+        store.put("key", AIMessage(content="answer"))
+        store.close()
+
+        reopened = ResponseCache(path)
+        assert reopened.get("key").content == "answer"
+        assert reopened.get("missing") is None
+        assert (reopened.hits, reopened.misses) == (1, 1)
+        reopened.close()
+
+    def test_evicts_least_recently_used_entries(self, tmp_path):
+        """The least recently read entry is evicted first once the entry cap is exceeded."""
+        store = ResponseCache(tmp_path / "responses.db", max_entries=2)
+        store.put("a", AIMessage(content="a"))
+        store.put("b", AIMessage(content="b"))
+        store.get("a")
+        store.put("c", AIMessage(content="c"))
+
+        assert len(store) == 2
+        assert store.get("b") is None
+        assert store.get("a") is not None
+        store.close()
+
+    def test_evicts_by_size(self, tmp_path):
+        """Entries are evicted until the stored responses fit the byte cap."""
+        store = ResponseCache(tmp_path / "responses.db", max_bytes=1000)
+        for key in "abcd":
+            store.put(key, AIMessage(content=key * 300))
+
+        assert len(store) < 4
+        assert store.get("d") is not None
+        store.close()
+
+
+class TestCachedChatModel:
+    """Tests for the caching chat model wrapper."""
+
+    def test_read_through(self, store):
+        """A repeated request is served from the cache."""
+        model = CachedChatModel(llm=fake_llm("first", "second"), store=store)
+        messages = [HumanMessage(content="open notepad")]
+
+        assert model.invoke(messages).content == "first"
+        assert model.invoke(messages).content == "first"
+        assert store.hits == 1
+
+    def test_record_mode_always_calls_model(self, store):
+        """Record mode refreshes the stored response on every call."""
+        model = CachedChatModel(llm=fake_llm("first", "second"), store=store, mode="record")
+        messages = [HumanMessage(content="open notepad")]
+
+        model.invoke(messages)
+        assert model.invoke(messages).content == "second"
+        assert CachedChatModel(llm=fake_llm(), store=store, mode="replay").invoke(messages).content == "second"
+
+    def test_replay_mode_raises_on_miss(self, store):
+        """Replay mode never calls the model."""
+        model = CachedChatModel(llm=fake_llm("unused"), store=store, mode="replay")
+
+        with pytest.raises(CacheMissError):
+            model.invoke([HumanMessage(content="never recorded")])
+
+    def test_replay_hits_after_date_changes(self, store):
+        """A trajectory recorded on one day replays on the next one."""
+        CachedChatModel(llm=fake_llm("recorded"), store=store, mode="record").invoke([SystemMessage(content="The current date is Monday, October 19, 2026."), HumanMessage(content="open notepad")])
+
+        replay = CachedChatModel(llm=fake_llm(), store=store, mode="replay")
+        assert replay.invoke([SystemMessage(content="The current date is Tuesday, October 20, 2026."), HumanMessage(content="open notepad")]).content == "recorded"
+
+    def test_ainvoke_shares_entries(self, store):
+        """Async calls read and write the same entries as sync calls."""
+        model = CachedChatModel(llm=fake_llm("first", "second"), store=store)
+        messages = [HumanMessage(content="open notepad")]
+
+        model.invoke(messages)
+        assert asyncio.run(model.ainvoke(messages)).content == "first"
+
+    def test_stream_closed_early_is_recorded_as_partial(self, store):
+        """A stream closed early is recorded for streams, invoke still needs a complete response."""
+        model = CachedChatModel(llm=fake_llm("one two three", "four five six", "seven"), store=store)
+        messages = [HumanMessage(content="partial")]
+
+        assert "".join(chunk.content for chunk in model.stream([HumanMessage(content="full")])) == "one two three"
+        chunks = model.stream(messages)
+        first = next(chunks).content
+        chunks.close()
+
+        replay = CachedChatModel(llm=fake_llm(), store=store, mode="replay")
+        assert "".join(chunk.content for chunk in replay.stream(messages)) == first
+        with pytest.raises(CacheMissError):
+            replay.invoke(messages)
+        assert model.invoke(messages).content == "seven"
+        assert replay.invoke(messages).content == "seven"
+
+    def test_stream_hit_keeps_tool_calls(self, store):
+        """A cached response with tool calls streams them back as tool call chunks."""
+        call = {"name": "click", "args": {"x": 1, "y": 2}, "id": "call_1"}
+        model = CachedChatModel(llm=ScriptedChatModel(responses=[AIMessage(content="", tool_calls=[call])]), store=store)
+        messages = [HumanMessage(content="click it")]
+        model.invoke(messages)
+
+        chunks = list(CachedChatModel(llm=model.llm, store=store, mode="replay").stream(messages))
+
+        merged = chunks[0]
+        for chunk in chunks[1:]:
+            merged += chunk
+        assert [(tool_call["name"], tool_call["args"]) for tool_call in merged.tool_calls] == [("click", {"x": 1, "y": 2})]
+
+    def test_bind_tools_delegates_and_keys_on_tools(self, store):
+        """Binding tools binds the wrapped model and keeps answers with and without tools apart."""
+        llm = ScriptedChatModel(responses=["plain", "with tools"])
+        model = CachedChatModel(llm=llm, store=store)
+        tool = {"type": "function", "function": {"name": "noop", "description": "Does nothing", "parameters": {"type": "object", "properties": {}}}}
+        messages = [HumanMessage(content="open notepad")]
+
+        assert model.invoke(messages).content == "plain"
+        bound = model.bind_tools([tool])
+        assert bound.invoke(messages).content == "with tools"
+        assert bound.invoke(messages).content == "with tools"
+
+        assert llm.tools == [tool]
+        assert model.tools == [] and len(store) == 2
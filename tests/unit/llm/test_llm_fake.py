@@ -0,0 +1,27 @@
+from langchain_core.messages import HumanMessage
+
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+
+
+class TestScriptedChatModel:
+    """Tests for the deterministic scripted chat model."""
+
+    def test_answers_in_order_and_repeats_the_last(self):
+        """Responses follow the script, the last one repeats once it runs out."""
+        llm = ScriptedChatModel(responses=["first", "second"])
+
+        answers = [llm.invoke([HumanMessage(content="hi")]).content for _ in range(3)]
+
+        assert answers == ["first", "second", "second"]
+        assert llm.calls == 3
+
+    def test_latency_is_accounted_in_elapsed(self):
+        """The configured latency shows up in the time spent inside the model."""
+        llm = ScriptedChatModel(responses=["ok"], latency=0.02)
+
+        message = llm.invoke([HumanMessage(content="hello world")])
+
+        assert llm.elapsed >= 0.02
+        assert message.usage_metadata["output_tokens"] == 0
+        llm.reset()
+        assert (llm.calls, llm.elapsed) == (0, 0.0)
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from darbot_windows_agent.llm.fake import ScriptedChatModel
+from darbot_windows_agent.llm.hedge import HedgedChatModel, CircuitBreaker, LatencyTracker, AllProvidersFailedError
+
+
+class FailingChatModel(BaseChatModel):
+    """A provider that always raises."""
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "failing-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        self.calls += 1
+        raise ConnectionError("provider unavailable")
+
+
+MESSAGES = [HumanMessage(content="hi")]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def half_open(breaker):
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = time.monotonic() - breaker.cooldown
+
+
+class TestCircuitBreaker:
+    """Tests for the per provider circuit breaker."""
+
+    def test_opens_after_threshold_and_probes_after_cooldown(self):
+        """Consecutive failures open the circuit, after the cooldown a single probe goes through."""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10.0, clock=lambda: now[0])
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        now[0] = 10.0
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens(self):
+        """A failing probe opens the circuit again for another cooldown."""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=5.0, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 5.0
+        assert breaker.allow()
+
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+
+
+class TestLatencyTracker:
+    """Tests for the rolling latency percentile."""
+
+    def test_nearest_rank_percentile(self):
+        """The percentile uses the nearest rank over the kept latencies."""
+        tracker = LatencyTracker(window=10)
+        assert tracker.percentile(0.9) is None
+        for latency in range(1, 11):
+            tracker.record(float(latency))
+
+        assert tracker.percentile(0.9) == 9.0
+        assert tracker.percentile(0.5) == 5.0
+
+
+class TestHedgedChatModel:
+    """Tests for hedged and fallback requests across providers."""
+
+    def test_primary_answers_without_hedging(self):
+        """A fast primary answers alone and the backup is never called."""
+        primary = ScriptedChatModel(responses=["primary"])
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[primary, backup], names=["primary", "backup"], hedge_delay=1.0)
+
+        assert llm.invoke(MESSAGES).content == "primary"
+        assert backup.calls == 0
+        assert llm.stats.wins == {"primary": 1, "backup": 0}
+
+    def test_slow_primary_is_hedged(self):
+        """The backup is fired once the primary exceeds the hedge delay and the first answer wins."""
+        primary = ScriptedChatModel(responses=["primary"], latency=0.5)
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[primary, backup], names=["primary", "backup"], hedge_delay=0.05)
+
+        assert llm.invoke(MESSAGES).content == "backup"
+        assert llm.stats.hedges == 1
+
+    def test_hedges_at_the_primary_percentile(self):
+        """Once enough latencies are known the hedge fires at their percentile instead of the default delay."""
+        primary = ScriptedChatModel(responses=["primary"], latency=0.01)
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[primary, backup], hedge_delay=60.0, min_samples=3)
+        for _ in range(3):
+            llm.invoke(MESSAGES)
+
+        assert llm.hedge_after(0) < 1.0
+        primary.latency = 0.5
+        assert llm.invoke(MESSAGES).content == "backup"
+
+    def test_falls_back_in_order_on_errors(self):
+        """A failing provider passes the request on to the next one right away."""
+        failing = FailingChatModel()
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[failing, backup], names=["failing", "backup"], hedge_delay=60.0)
+
+        assert llm.invoke(MESSAGES).content == "backup"
+        assert llm.stats.fallbacks == 1
+
+    def test_times_out_and_falls_back(self):
+        """A provider that exceeds the timeout counts as failed and the next one is tried."""
+        slow = ScriptedChatModel(responses=["slow"], latency=0.5)
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[slow, backup], names=["slow", "backup"], hedge_delay=60.0, timeout=0.05)
+
+        assert llm.invoke(MESSAGES).content == "backup"
+        assert llm.breaker("slow").failures == 1
+
+    def test_open_circuit_skips_provider(self):
+        """A provider whose circuit is open is not called until its cooldown ends."""
+        failing = FailingChatModel()
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[failing, backup], names=["failing", "backup"], failure_threshold=2, hedge_delay=60.0)
+        for _ in range(3):
+            llm.invoke(MESSAGES)
+
+        assert failing.calls == 2
+        assert llm.breaker("failing").state == "open"
+
+    def test_all_providers_failing_raises(self):
+        """The error names every provider that failed."""
+        llm = HedgedChatModel(llms=[FailingChatModel(), FailingChatModel()], names=["a", "b"])
+
+        with pytest.raises(AllProvidersFailedError, match="a: provider unavailable; b: provider unavailable"):
+            llm.invoke(MESSAGES)
+
+    def test_async_hedging(self):
+        """Async requests hedge the same way and the slow request is cancelled."""
+        primary = ScriptedChatModel(responses=["primary"], latency=0.5)
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[primary, backup], hedge_delay=0.05)
+
+        message = asyncio.run(llm.ainvoke(MESSAGES))
+
+        assert message.content == "backup"
+        assert llm.stats.hedges == 1
+
+    def test_stream_falls_back_before_first_chunk(self):
+        """Streaming moves on to the next provider when the first fails before emitting anything."""
+        llm = HedgedChatModel(llms=[FailingChatModel(), ScriptedChatModel(responses=["streamed"])])
+
+        chunks = list(llm.stream(MESSAGES))
+
+        assert "".join(chunk.content for chunk in chunks) == "streamed"
+        assert llm.stats.fallbacks == 1
+
+    def test_bind_tools_binds_every_provider_and_shares_state(self):
+        """Binding tools binds each provider while keeping the breakers and stats."""
+        primary = ScriptedChatModel(responses=["primary"])
+        backup = ScriptedChatModel(responses=["backup"])
+        llm = HedgedChatModel(llms=[primary, backup])
+        tool = {"type": "function", "function": {"name": "noop", "parameters": {}}}
+
+        bound = llm.bind_tools([tool])
+        bound.invoke(MESSAGES)
+
+        assert primary.tools == [tool] and backup.tools == [tool]
+        assert bound.stats is llm.stats
+
+    def test_unused_backup_keeps_its_probe(self):
+        """A half open backup that is never started keeps its probe for a later request."""
+        llm = HedgedChatModel(llms=[ScriptedChatModel(responses=["primary"]), ScriptedChatModel(responses=["backup"])], names=["primary", "backup"], hedge_delay=60.0)
+        half_open(llm.breaker("backup"))
+
+        llm.invoke(MESSAGES)
+
+        assert llm.breaker("backup").allow()
+
+    def test_losing_hedge_latency_is_recorded(self):
+        """The slow provider that lost a hedge still adds its latency once it returns."""
+        primary = ScriptedChatModel(responses=["primary"], latency=0.3)
+        llm = HedgedChatModel(llms=[primary, ScriptedChatModel(responses=["backup"])], hedge_delay=0.05)
+
+        assert llm.invoke(MESSAGES).content == "backup"
+
+        assert wait_for(lambda: llm._latencies[0].percentile(1.0) is not None)
+        assert llm._latencies[0].percentile(1.0) >= 0.3
+
+    def test_async_losing_hedge_latency_is_recorded(self):
+        """Async losers are left to finish in the background instead of being cancelled."""
+        primary = ScriptedChatModel(responses=["primary"], latency=0.3)
+        llm = HedgedChatModel(llms=[primary, ScriptedChatModel(responses=["backup"])], hedge_delay=0.05)
+
+        async def run():
+            message = await llm.ainvoke(MESSAGES)
+            await asyncio.sleep(0.5)
+            return message
+
+        assert asyncio.run(run()).content == "backup"
+        assert llm._latencies[0].percentile(1.0) >= 0.3
+
+    def test_closed_stream_counts_as_success(self):
+        """A stream the consumer closes after its first chunk closes the circuit and resets the failures."""
+        llm = HedgedChatModel(llms=[ScriptedChatModel(responses=["primary"]), ScriptedChatModel(responses=["backup"])], names=["primary", "backup"])
+        breaker = llm.breaker("primary")
+        half_open(breaker)
+
+        stream = llm.stream(MESSAGES)
+        assert next(stream).content == "primary"
+        stream.close()
+
+        assert breaker.state == "closed"
+        assert breaker.failures == 0
+        assert llm.stats.wins["primary"] == 1
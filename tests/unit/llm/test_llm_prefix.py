@@ -0,0 +1,64 @@
+import pytest
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+from darbot_windows_agent.llm.prefix import with_cache_hints, supports_cache_hints, cached_input_tokens, PrefixCacheStats, CACHE_CONTROL
+from darbot_windows_agent.llm.fake import PrefixCheckingChatModel
+
+
+class TestCacheHints:
+    """Tests for provider cache breakpoints."""
+
+    def test_marks_system_and_last_stable_message(self):
+        """The system prompt and the message before the volatile tail get a breakpoint, the originals are untouched."""
+        messages = [SystemMessage(content="system"), HumanMessage(content="task"), AIMessage(content="action"), HumanMessage(content="state")]
+
+        hinted = with_cache_hints(messages)
+
+        assert hinted[0].content == [{"type": "text", "text": "system", "cache_control": CACHE_CONTROL}]
+        assert hinted[2].content == [{"type": "text", "text": "action", "cache_control": CACHE_CONTROL}]
+        assert hinted[1] is messages[1] and hinted[3] is messages[3]
+        assert messages[0].content == "system"
+
+    def test_only_anthropic_needs_hints(self):
+        """Providers that cache prefixes automatically get no hints."""
+        assert supports_cache_hints(PrefixCheckingChatModel(responses=["ok"])) is False
+        assert supports_cache_hints(None) is False
+
+
+class TestPrefixCacheStats:
+    """Tests for prefix-hit reporting from response metadata."""
+
+    def test_records_usage_metadata(self):
+        """Cached and total input tokens are accumulated from the usage metadata."""
+        stats = PrefixCacheStats()
+        response = AIMessage(content="ok", usage_metadata={"input_tokens": 100, "output_tokens": 1, "total_tokens": 101, "input_token_details": {"cache_read": 80}})
+
+        assert stats.record(response) == pytest.approx(0.8)
+        assert stats.record(AIMessage(content="no usage")) is None
+        assert cached_input_tokens(response) == (80, 100)
+        assert (stats.requests, stats.ratio) == (1, pytest.approx(0.8))
+
+
+class TestPrefixCheckingChatModel:
+    """Tests for the local fake model that simulates a prompt cache."""
+
+    def test_reports_shared_prefix_as_cached(self):
+        """The messages shared with the previous request are reported as cache reads."""
+        model = PrefixCheckingChatModel(responses=["first", "second"])
+        system = SystemMessage(content="s" * 400)
+
+        first = model.invoke([system, HumanMessage(content="state 1")])
+        second = model.invoke([system, HumanMessage(content="state 2")])
+
+        assert first.usage_metadata["input_token_details"]["cache_read"] == 0
+        assert second.usage_metadata["input_token_details"]["cache_read"] > 0
+        assert second.content == "second"
+
+    def test_detects_rewritten_history(self):
+        """A request that changes an earlier message is reported as unstable."""
+        model = PrefixCheckingChatModel(responses=["ok"])
+        model.invoke([SystemMessage(content="system"), HumanMessage(content="task"), HumanMessage(content="state 1")])
+        model.invoke([SystemMessage(content="system"), HumanMessage(content="task"), AIMessage(content="a"), HumanMessage(content="state 2")])
+        model.invoke([SystemMessage(content="system"), HumanMessage(content="rewritten"), AIMessage(content="a"), HumanMessage(content="state 3")])
+
+        assert model.unstable_requests() == [2]
@@ -0,0 +1,102 @@
+import json
+import threading
+
+from darbot_windows_agent.tracing import Tracer, Span
+
+
+class TestTracer:
+    """Tests for the span tracer and its Chrome trace export."""
+
+    def test_span_records_duration_and_args(self):
+        """A span keeps its name, category and the args filled in while it ran."""
+        tracer = Tracer()
+
+        with tracer.span("reason", category="llm", step=1) as span:
+            span["output_tokens"] = 42
+
+        [recorded] = tracer.spans
+        assert (recorded.name, recorded.category) == ("reason", "llm")
+        assert recorded.args == {"step": 1, "output_tokens": 42}
+        assert recorded.duration >= 0
+        assert recorded.thread_id == threading.get_ident()
+
+    def test_span_is_recorded_when_the_block_raises(self):
+        """A failing block still shows up on the timeline."""
+        tracer = Tracer()
+
+        try:
+            with tracer.span("tool", category="tool"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+        assert [span.name for span in tracer.spans] == ["tool"]
+
+    def test_disabled_tracer_records_nothing(self):
+        """A disabled tracer still yields the args so callers need no branches."""
+        tracer = Tracer(enabled=False)
+
+        with tracer.span("tree") as span:
+            span["nodes"] = 3
+
+        assert tracer.spans == []
+
+    def test_chrome_trace_has_complete_events_per_thread(self):
+        """Spans from worker threads get their own track with a thread name."""
+        tracer = Tracer()
+
+        def traverse():
+            with tracer.span("traverse", category="tree", app="Notepad"):
+                pass
+
+        with tracer.span("get_state", category="desktop"):
+            thread = threading.Thread(target=traverse, name="Worker")
+            thread.start()
+            thread.join()
+
+        trace = tracer.to_chrome_trace()
+
+        complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        metadata = {event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"}
+        assert {event["name"] for event in complete} == {"get_state", "traverse"}
+        assert len({event["tid"] for event in complete}) == 2
+        assert "Worker" in metadata
+        assert all({"ts", "dur", "pid", "cat"} <= event.keys() for event in complete)
+
+    def test_export_writes_a_file_per_run(self, tmp_path):
+        """Export writes JSON that loads back into the trace events."""
+        tracer = Tracer(output_dir=str(tmp_path / "traces"))
+        with tracer.span("capture", category="vision"):
+            pass
+
+        path = tracer.export()
+
+        assert path.parent == tmp_path / "traces"
+        assert json.loads(path.read_text(encoding="utf-8"))["traceEvents"][-1]["name"] == "capture"
+
+    def test_summary_percentiles(self):
+        """Percentiles are nearest rank per span name, slowest total first."""
+        tracer = Tracer()
+        for duration in range(1, 101):
+            tracer.spans.append(make_span("reason", duration * 1000))
+        tracer.spans.append(make_span("settle", 500))
+
+        reason, settle = tracer.summary()
+
+        assert (reason.name, reason.count, reason.p50, reason.p90, reason.p99, reason.max) == ("reason", 100, 50.0, 90.0, 99.0, 100.0)
+        assert settle.total == 0.5
+        assert tracer.summary_to_string().splitlines()[1].startswith("reason")
+
+    def test_reset_clears_spans(self):
+        """Each run starts from an empty timeline."""
+        tracer = Tracer()
+        with tracer.span("observe"):
+            pass
+
+        tracer.reset()
+
+        assert tracer.spans == []
+
+
+def make_span(name, duration):
+    return Span(name=name, category="agent", start=0, duration=duration, thread_id=1, thread_name="MainThread")
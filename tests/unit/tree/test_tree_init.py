@@ -89,7 +89,7 @@ class TestTree:
         )
         state = tree_instance.get_state()
 
-        self.mock_sleep.assert_called_once_with(0.5)
+        mock_desktop.settle.assert_called_once_with(0.5)
         self.mock_get_root_control.assert_called_once()
         tree_instance.get_appwise_nodes.assert_called_once_with(node=root_control_mock)
         assert isinstance(state, TreeState)
@@ -216,3 +216,23 @@ class TestTree:
 
         assert screenshot_result == mock_screenshot
         assert nodes_result == mock_nodes
+
+    def test_annotated_screenshot_with_region(self, tree_instance, mock_desktop):
+        mock_draw = self.MockImageDraw.Draw.return_value
+        mock_executor = self.MockThreadPoolExecutor.return_value.__enter__.return_value
+        mock_executor.map.side_effect = lambda func, *iterables: [func(*args) for args in zip(*iterables)]
+        mock_draw.textlength.return_value = 10
+
+        region = BoundingBox(left=100, top=100, right=600, bottom=500, width=500, height=400)
+        nodes = [
+            TreeElementNode("outside", "Button", "", BoundingBox(0, 0, 50, 50, 50, 50), Center(25, 25), "Taskbar"),
+            TreeElementNode("inside", "Button", "", BoundingBox(110, 120, 210, 170, 100, 50), Center(160, 145), "App")
+        ]
+
+        tree_instance.annotated_screenshot(nodes, scale=1.0, region=region)
+
+        mock_desktop.get_screenshot.assert_called_once_with(scale=1.0, region=region, padding=20)
+        # Only the node inside the region is drawn, shifted into the crop and keeping its original label
+        mock_draw.rectangle.assert_any_call((30, 40, 130, 90), outline=ANY, width=2)
+        assert mock_draw.text.call_count == 1
+        assert mock_draw.text.call_args.args[1] == "1"